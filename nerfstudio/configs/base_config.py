@@ -61,7 +61,8 @@ class MachineConfig(PrintableConfig):
     seed: int = 42
     """random seed initialization"""
     num_devices: int = 1
-    """total number of devices (e.g., gpus) available for train/eval"""
+    """total number of devices (e.g., gpus) available for train/eval. With device_type cpu, the number of gloo
+    processes to train with, which split the cores of the machine."""
     num_machines: int = 1
     """total number of distributed machines available (for DDP)"""
     machine_rank: int = 0
@@ -119,6 +120,13 @@ class LoggingConfig(PrintableConfig):
         "basic" - prints speed of all decorated functions at the end of a program.
         "pytorch" - same as basic, but it also traces few training steps.
     """
+    profiler_history_size: int = 10000
+    """number of most recent durations kept per profiled function to compute percentiles"""
+    steps_per_profiler_export: int = 0
+    """number of steps between exports of the profiler stats (JSON) and timeline (Chrome trace) to the log
+    directory; 0 only exports at the end of training"""
+    profiler_trace_steps: Tuple[int, ...] = (12, 17)
+    """training steps to trace when using the "pytorch" profiler"""
 
 
 # Viewer related configs
@@ -40,7 +40,7 @@ from nerfstudio.data.dataparsers.sitcoms3d_dataparser import Sitcoms3DDataParser
 from nerfstudio.data.datasets.depth_dataset import DepthDataset
 from nerfstudio.data.datasets.sdf_dataset import SDFDataset
 from nerfstudio.data.datasets.semantic_dataset import SemanticDataset
-from nerfstudio.engine.optimizers import AdamOptimizerConfig, RAdamOptimizerConfig
+from nerfstudio.engine.optimizers import AdamOptimizerConfig, LazyAdamOptimizerConfig, RAdamOptimizerConfig
 from nerfstudio.engine.schedulers import (
     CosineDecaySchedulerConfig,
     ExponentialDecaySchedulerConfig,
@@ -635,7 +635,8 @@ method_configs["splatfacto"] = TrainerConfig(
         },
         "quats": {"optimizer": AdamOptimizerConfig(lr=0.001, eps=1e-15), "scheduler": None},
         "camera_opt": {
-            "optimizer": AdamOptimizerConfig(lr=1e-4, eps=1e-15),
+            # a step renders a single camera, so most rows of the pose adjustments have no gradient
+            "optimizer": LazyAdamOptimizerConfig(lr=1e-4, eps=1e-15),
             "scheduler": ExponentialDecaySchedulerConfig(
                 lr_final=5e-7, max_steps=30000, warmup_steps=1000, lr_pre_warmup=0
             ),
@@ -695,7 +696,8 @@ method_configs["splatfacto-big"] = TrainerConfig(
         },
         "quats": {"optimizer": AdamOptimizerConfig(lr=0.001, eps=1e-15), "scheduler": None},
         "camera_opt": {
-            "optimizer": AdamOptimizerConfig(lr=1e-4, eps=1e-15),
+            # a step renders a single camera, so most rows of the pose adjustments have no gradient
+            "optimizer": LazyAdamOptimizerConfig(lr=1e-4, eps=1e-15),
             "scheduler": ExponentialDecaySchedulerConfig(
                 lr_final=5e-7, max_steps=30000, warmup_steps=1000, lr_pre_warmup=0
             ),
@@ -726,7 +728,9 @@ method_configs["papr"] = TrainerConfig(
         model=PAPRModelConfig(
             eval_num_rays_per_chunk=1 << 15,
             average_init_density=0.01,
+            early_ray_termination_threshold=0.9999,
         ),
+        prefetch_train_batches=True,
     ),
     optimizers={
         # TODO: change optimizers and schedulers.
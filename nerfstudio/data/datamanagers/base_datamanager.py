@@ -60,6 +60,7 @@ from nerfstudio.data.utils.dataloaders import CacheDataloader, FixedIndicesEvalD
 from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.model_components.ray_generators import RayGenerator
+from nerfstudio.utils import comms
 from nerfstudio.utils.misc import IterableWrapper, get_orig_class
 from nerfstudio.utils.rich_utils import CONSOLE
 
@@ -318,6 +319,9 @@ class VanillaDataManagerConfig(DataManagerConfig):
     train_num_times_to_repeat_images: int = -1
     """When not training on all images, number of iterations before picking new
     images. If -1, never pick new images."""
+    shard_train_images: bool = True
+    """When training on multiple processes, whether each rank only samples rays from its own disjoint subset of the
+    training images instead of from all of them."""
     eval_num_rays_per_batch: int = 1024
     """Number of rays per batch to use per eval iteration."""
     eval_num_images_to_sample_from: int = -1
@@ -480,6 +484,22 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             fisheye_crop_radius=fisheye_crop_radius,
         )
 
+    def get_train_image_indices(self) -> List[int]:
+        """Returns the indices of the training images this process samples rays from.
+
+        With multiple processes and ``shard_train_images``, the images are split round-robin across the ranks so that
+        every rank renders different pixels and the averaged gradients cover the whole training set.
+        """
+        assert self.train_dataset is not None
+        indices = list(range(len(self.train_dataset)))
+        world_size = comms.get_world_size()
+        if not self.config.shard_train_images or world_size == 1:
+            return indices
+        if len(indices) < world_size:
+            CONSOLE.print("[bold yellow]Fewer training images than ranks, every rank samples from all images.")
+            return indices
+        return indices[comms.get_rank() :: world_size]
+
     def setup_train(self):
         """Sets up the data loaders for training"""
         assert self.train_dataset is not None
@@ -493,6 +513,7 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             pin_memory=True,
             collate_fn=self.config.collate_fn,
             exclude_batch_keys_from_device=self.exclude_batch_keys_from_device,
+            image_indices=self.get_train_image_indices(),
         )
         self.iter_train_image_dataloader = iter(self.train_image_dataloader)
         self.train_pixel_sampler = self._get_pixel_sampler(self.train_dataset, self.config.train_num_rays_per_batch)
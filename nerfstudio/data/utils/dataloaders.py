@@ -18,10 +18,11 @@ Code for sampling images from a dataset of images.
 
 # for multithreading
 import concurrent.futures
+import dataclasses
 import multiprocessing
 import random
 from abc import abstractmethod
-from typing import Any, Callable, Dict, List, Optional, Sized, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Sized, Tuple, TypeVar, Union
 
 import torch
 from rich.progress import track
@@ -34,6 +35,9 @@ from nerfstudio.data.datasets.base_dataset import InputDataset
 from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
 from nerfstudio.utils.misc import get_dict_to_torch
 from nerfstudio.utils.rich_utils import CONSOLE
+from nerfstudio.utils.tensor_dataclass import TensorDataclass
+
+T = TypeVar("T")
 
 
 class CacheDataloader(DataLoader):
@@ -46,6 +50,8 @@ class CacheDataloader(DataLoader):
         num_times_to_repeat_images: How often to collate new images. -1 to never pick new images.
         device: Device to perform computation.
         collate_fn: The function we will use to collate our training data
+        image_indices: Indices of the dataset images to sample from, e.g. the shard of the current rank. None for all
+            images.
     """
 
     def __init__(
@@ -56,6 +62,7 @@ class CacheDataloader(DataLoader):
         device: Union[torch.device, str] = "cpu",
         collate_fn: Callable[[Any], Any] = nerfstudio_collate,
         exclude_batch_keys_from_device: Optional[List[str]] = None,
+        image_indices: Optional[Sequence[int]] = None,
         **kwargs,
     ):
         if exclude_batch_keys_from_device is None:
@@ -64,9 +71,12 @@ class CacheDataloader(DataLoader):
         assert isinstance(self.dataset, Sized)
 
         super().__init__(dataset=dataset, **kwargs)  # This will set self.dataset
+        self.image_indices = list(range(len(self.dataset))) if image_indices is None else list(image_indices)
         self.num_times_to_repeat_images = num_times_to_repeat_images
-        self.cache_all_images = (num_images_to_sample_from == -1) or (num_images_to_sample_from >= len(self.dataset))
-        self.num_images_to_sample_from = len(self.dataset) if self.cache_all_images else num_images_to_sample_from
+        self.cache_all_images = (num_images_to_sample_from == -1) or (
+            num_images_to_sample_from >= len(self.image_indices)
+        )
+        self.num_images_to_sample_from = len(self.image_indices) if self.cache_all_images else num_images_to_sample_from
         self.device = device
         self.collate_fn = collate_fn
         self.num_workers = kwargs.get("num_workers", 0)
@@ -77,19 +87,19 @@ class CacheDataloader(DataLoader):
 
         self.cached_collated_batch = None
         if self.cache_all_images:
-            CONSOLE.print(f"Caching all {len(self.dataset)} images.")
-            if len(self.dataset) > 500:
+            CONSOLE.print(f"Caching all {len(self.image_indices)} images.")
+            if len(self.image_indices) > 500:
                 CONSOLE.print(
                     "[bold yellow]Warning: If you run out of memory, try reducing the number of images to sample from."
                 )
             self.cached_collated_batch = self._get_collated_batch()
         elif self.num_times_to_repeat_images == -1:
             CONSOLE.print(
-                f"Caching {self.num_images_to_sample_from} out of {len(self.dataset)} images, without resampling."
+                f"Caching {self.num_images_to_sample_from} out of {len(self.image_indices)} images, without resampling."
             )
         else:
             CONSOLE.print(
-                f"Caching {self.num_images_to_sample_from} out of {len(self.dataset)} images, "
+                f"Caching {self.num_images_to_sample_from} out of {len(self.image_indices)} images, "
                 f"resampling every {self.num_times_to_repeat_images} iters."
             )
 
@@ -100,7 +110,7 @@ class CacheDataloader(DataLoader):
         """Returns a list of batches from the dataset attribute."""
 
         assert isinstance(self.dataset, Sized)
-        indices = random.sample(range(len(self.dataset)), k=self.num_images_to_sample_from)
+        indices = random.sample(self.image_indices, k=self.num_images_to_sample_from)
         batch_list = []
         results = []
 
@@ -251,3 +261,102 @@ class RandIndicesEvalDataloader(EvalDataloader):
         image_idx = random.randint(0, len(self.cameras) - 1)
         camera, batch = self.get_camera(image_idx)
         return camera, batch
+
+
+def _record_stream(value: Any, stream: torch.cuda.Stream) -> None:
+    """Marks all CUDA tensors in a (nested) batch as used on the given stream."""
+    if isinstance(value, torch.Tensor):
+        if value.is_cuda:
+            value.record_stream(stream)
+    elif isinstance(value, TensorDataclass):
+        for field in dataclasses.fields(value):
+            _record_stream(getattr(value, field.name), stream)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _record_stream(item, stream)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _record_stream(item, stream)
+
+
+def iter_prefetched(iterable: Iterable[T]) -> Iterator[T]:
+    """Iterates over ``iterable`` while the next item is loaded on a background thread.
+
+    Useful to overlap loading, e.g. reading and decoding eval images, with the processing of the current item.
+    """
+    iterator = iter(iterable)
+    end = object()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as executor:
+        pending = executor.submit(next, iterator, end)
+        while True:
+            item = pending.result()
+            if item is end:
+                return
+            pending = executor.submit(next, iterator, end)
+            yield item
+
+
+class BatchPrefetcher:
+    """Prepares the batch of the next step on a background thread while the current step runs.
+
+    Pixel sampling, ray generation and the host to device copy of the batch then overlap with the forward and
+    backward pass instead of running on the critical path. Any function with the signature of
+    ``DataManager.next_train`` can be wrapped, so this works with all datamanagers. On CUDA the batch is prepared
+    on a side stream, and the tensors in ``transfer_keys`` are copied to the device from pinned memory.
+
+    Since the next batch is prepared before the callbacks of the next step run, changes to the datamanager made
+    by callbacks, e.g. the number of rays per batch, take effect one step later.
+
+    Args:
+        next_fn: function returning the inputs and batch of a step
+        device: device the batches are used on
+        transfer_keys: batch entries to move to the device ahead of time
+    """
+
+    def __init__(
+        self,
+        next_fn: Callable[[int], Tuple[Any, Dict]],
+        device: Union[torch.device, str],
+        transfer_keys: Tuple[str, ...] = ("image", "mask"),
+    ):
+        self.next_fn = next_fn
+        self.device = torch.device(device)
+        self.transfer_keys = transfer_keys
+        self.stream = torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch_prefetcher")
+        self._pending: Optional[Tuple[int, concurrent.futures.Future]] = None
+
+    def _prepare(self, step: int) -> Tuple[Tuple[Any, Dict], Optional[torch.cuda.Event]]:
+        if self.stream is None:
+            return self.next_fn(step), None
+        with torch.cuda.stream(self.stream):
+            inputs, batch = self.next_fn(step)
+            batch = dict(batch)
+            for key in self.transfer_keys:
+                value = batch.get(key)
+                if isinstance(value, torch.Tensor) and not value.is_cuda:
+                    batch[key] = value.pin_memory().to(self.device, non_blocking=True)
+            ready = torch.cuda.Event()
+            ready.record(self.stream)
+        return (inputs, batch), ready
+
+    def next(self, step: int) -> Tuple[Any, Dict]:
+        """Returns the batch of the given step and starts preparing the batch of the following step.
+
+        Args:
+            step: current training step
+        """
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == step:
+            result, ready = pending[1].result()
+        else:
+            if pending is not None:
+                # the datamanager is not thread safe, so never prepare two batches at once
+                pending[1].result()
+            result, ready = self._prepare(step)
+        if ready is not None:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_event(ready)
+            _record_stream(result, current_stream)
+        self._pending = (step + 1, self._executor.submit(self._prepare, step + 1))
+        return result
@@ -0,0 +1,293 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Checkpoint serialization helpers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+import torch
+
+CHECKPOINT_PATTERN = re.compile(r"^step-(\d+)\.ckpt$")
+SHARDED_CHECKPOINT_VERSION = 1
+SHARD_KEY = "__shard__"
+SHARDS_DIRNAME = "shards"
+
+
+def get_checkpoint_path(checkpoint_dir: Path, step: int) -> Path:
+    """Returns the path of the checkpoint saved at the given step."""
+    return checkpoint_dir / f"step-{step:09d}.ckpt"
+
+
+def get_latest_checkpoint_step(checkpoint_dir: Path) -> int:
+    """Returns the step of the most recent checkpoint in a directory.
+
+    Only complete checkpoints are considered, partially written temporary files are ignored.
+
+    Args:
+        checkpoint_dir: directory containing the checkpoints
+    """
+    steps = [int(match.group(1)) for match in map(CHECKPOINT_PATTERN.match, os.listdir(checkpoint_dir)) if match]
+    if not steps:
+        raise FileNotFoundError(f"No checkpoints found in {checkpoint_dir}")
+    return max(steps)
+
+
+def snapshot_state(state: Any) -> Any:
+    """Copies all tensors of a (nested) state dict to host memory.
+
+    The copy decouples the snapshot from the live parameters, so training can continue to update them in place
+    while the snapshot is serialized.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return type(state)((key, snapshot_state(value)) for key, value in state.items())
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot_state(value) for value in state)
+    return state
+
+
+def atomic_save(state: Any, path: Path) -> None:
+    """Saves with ``torch.save`` to a temporary file and renames it to ``path`` once it is complete.
+
+    A crash during the write therefore never leaves a truncated file at ``path``.
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _tensor_digest(tensor: torch.Tensor) -> str:
+    """Content hash of a tensor, including its dtype and shape."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{tensor.dtype}{tuple(tensor.shape)}".encode())
+    digest.update(tensor.contiguous().reshape(-1).view(torch.uint8).numpy().data)
+    return digest.hexdigest()
+
+
+def get_state_digest(state: Any) -> str:
+    """Content hash of a (nested) state dict, e.g. the state dict of a model.
+
+    Tensors are hashed by value, so the digest is the same for every copy of the same weights, independent of the
+    device they live on or the file they were loaded from.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+
+    def update(value: Any) -> None:
+        if isinstance(value, torch.Tensor):
+            digest.update(_tensor_digest(value.detach().cpu()).encode())
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                digest.update(repr(key).encode())
+                update(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                update(item)
+        else:
+            digest.update(repr(value).encode())
+
+    update(state)
+    return digest.hexdigest()
+
+
+def save_sharded(state: Any, path: Path, min_shard_bytes: int = 4096) -> None:
+    """Saves a checkpoint as a small manifest at ``path`` plus one content-addressed file per tensor.
+
+    Tensors are stored in a ``shards`` directory next to the manifest and named by the hash of their content, so
+    tensors that did not change since a previous checkpoint, e.g. frozen embeddings or converged camera
+    optimizer parameters, reuse the existing file instead of being written again. Tensors smaller than
+    ``min_shard_bytes`` are kept inline in the manifest. Load with :func:`read_checkpoint`.
+
+    Args:
+        state: (nested) state dict to save, all tensors must be on the CPU
+        path: path of the manifest
+        min_shard_bytes: tensors with fewer bytes are stored in the manifest itself
+    """
+    shard_dir = path.parent / SHARDS_DIRNAME
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shards: Set[str] = set()
+
+    def to_manifest(value: Any) -> Any:
+        if isinstance(value, torch.Tensor):
+            if value.numel() * value.element_size() < min_shard_bytes:
+                return value
+            digest = _tensor_digest(value)
+            shard_path = shard_dir / f"{digest}.pt"
+            if digest not in shards and not shard_path.exists():
+                if value.untyped_storage().nbytes() > value.numel() * value.element_size():
+                    # views would otherwise serialize their whole storage
+                    value = value.clone()
+                atomic_save(value, shard_path)
+            shards.add(digest)
+            return {SHARD_KEY: digest}
+        if isinstance(value, dict):
+            return type(value)((key, to_manifest(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return type(value)(to_manifest(item) for item in value)
+        return value
+
+    manifest = {
+        "sharded_checkpoint_version": SHARDED_CHECKPOINT_VERSION,
+        "state": to_manifest(state),
+        "shards": sorted(shards),
+    }
+    atomic_save(manifest, path)
+
+
+def load_tensors(path: Path, mmap: bool = True) -> Any:
+    """``torch.load`` onto the CPU, memory-mapping the file when possible.
+
+    With ``mmap`` the tensor data is only read from disk once a tensor is used, so entries that are never accessed,
+    e.g. optimizer states when loading for inference, never take up memory. Memory mapping requires torch>=2.1
+    and a file written with the zipfile serialization (the default since torch 1.6), otherwise this falls back to
+    reading the whole file.
+    """
+    if mmap:
+        try:
+            return torch.load(path, map_location="cpu", mmap=True)
+        except (TypeError, RuntimeError):
+            pass
+    return torch.load(path, map_location="cpu")
+
+
+class LazyCheckpoint(Mapping):
+    """Read-only view of a sharded checkpoint that loads the shards of a top-level entry on first access.
+
+    Loading only the ``"pipeline"`` entry, as done for evaluation, therefore never reads the optimizer state.
+    """
+
+    def __init__(self, manifest: Dict[str, Any], shard_dir: Path, mmap: bool = True) -> None:
+        self._state: Dict[str, Any] = manifest["state"]
+        self._shard_dir = shard_dir
+        self._mmap = mmap
+        self._loaded: Dict[str, Any] = {}
+
+    def _resolve(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            if set(value.keys()) == {SHARD_KEY}:
+                return load_tensors(self._shard_dir / f"{value[SHARD_KEY]}.pt", mmap=self._mmap)
+            return type(value)((key, self._resolve(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._resolve(item) for item in value)
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._loaded:
+            self._loaded[key] = self._resolve(self._state[key])
+        return self._loaded[key]
+
+    def __contains__(self, key: object) -> bool:
+        # the default implementation would load the entry
+        return key in self._state
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._state)
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+
+def is_sharded(checkpoint: Any) -> bool:
+    """Returns whether a loaded checkpoint file is the manifest of a sharded checkpoint."""
+    return isinstance(checkpoint, dict) and "sharded_checkpoint_version" in checkpoint
+
+
+def read_checkpoint(path: Path, mmap: bool = True) -> Mapping:
+    """Loads a checkpoint written with either :func:`atomic_save` or :func:`save_sharded`.
+
+    Sharded checkpoints are returned as a :class:`LazyCheckpoint`. In both cases the tensors are memory-mapped
+    (see :func:`load_tensors`), so only the entries that are used are read into memory.
+
+    Args:
+        path: path of the checkpoint
+        mmap: whether to memory-map the tensor data
+    """
+    checkpoint = load_tensors(path, mmap=mmap)
+    if is_sharded(checkpoint):
+        return LazyCheckpoint(checkpoint, path.parent / SHARDS_DIRNAME, mmap=mmap)
+    return checkpoint
+
+
+def remove_unreferenced_shards(checkpoint_dir: Path) -> None:
+    """Deletes shards that are not referenced by any checkpoint in the directory."""
+    shard_dir = checkpoint_dir / SHARDS_DIRNAME
+    if not shard_dir.exists():
+        return
+    referenced: Set[str] = set()
+    for path in checkpoint_dir.iterdir():
+        if CHECKPOINT_PATTERN.match(path.name):
+            checkpoint = load_tensors(path)
+            if is_sharded(checkpoint):
+                referenced.update(checkpoint["shards"])
+    for shard_path in shard_dir.glob("*.pt"):
+        if shard_path.stem not in referenced:
+            shard_path.unlink()
+
+
+class AsyncCheckpointWriter:
+    """Serializes checkpoints on a background thread.
+
+    At most one checkpoint is in flight: saving while the previous checkpoint is still being written waits for it
+    first, so snapshots never pile up in host memory.
+
+    Args:
+        save_fn: function writing a snapshot to a path, e.g. :func:`atomic_save` or :func:`save_sharded`
+    """
+
+    def __init__(self, save_fn: Callable[[Any, Path], None] = atomic_save) -> None:
+        self.save_fn = save_fn
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint_writer")
+        self._pending: Optional[Future] = None
+
+    def save(self, get_state: Callable[[], Any], path: Path, on_saved: Optional[Callable[[], None]] = None) -> None:
+        """Snapshots the state and writes it in the background.
+
+        Args:
+            get_state: function returning the state to save, called on the calling thread
+            path: path to publish the checkpoint at
+            on_saved: function to call on the writer thread once the checkpoint is published
+        """
+        self.wait()
+        state = snapshot_state(get_state())
+
+        def write() -> None:
+            self.save_fn(state, path)
+            if on_saved is not None:
+                on_saved()
+
+        self._pending = self._executor.submit(write)
+
+    def wait(self) -> None:
+        """Blocks until the pending checkpoint is written, re-raising any error of the write."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self) -> None:
+        """Waits for the pending checkpoint and stops the writer thread."""
+        self.wait()
+        self._executor.shutdown()
@@ -0,0 +1,144 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Convergence based early stopping and evaluation cadence.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional, Type, Union
+
+import torch
+import torch.distributed as dist
+
+from nerfstudio.configs.base_config import InstantiateConfig
+from nerfstudio.utils import comms, writer
+
+
+@dataclass
+class EarlyStoppingConfig(InstantiateConfig):
+    """Configuration of the early stopping controller"""
+
+    _target: Type = field(default_factory=lambda: EarlyStopping)
+    """target class to instantiate"""
+    enable: bool = False
+    """Whether to stop training once the train loss and the eval PSNR stop improving."""
+    steps_per_check: int = 1000
+    """Number of steps between convergence checks."""
+    min_num_iterations: int = 5000
+    """Training never stops before this many iterations."""
+    patience: int = 3
+    """Number of consecutive checks without improvement after which training stops."""
+    loss_ema_decay: float = 0.99
+    """Decay of the exponential moving average of the train loss, applied every step."""
+    psnr_ema_decay: float = 0.5
+    """Decay of the exponential moving average of the eval PSNR, applied every evaluation. Single eval images are
+    noisy, so their PSNR is smoothed as well."""
+    min_relative_loss_improvement: float = 0.01
+    """Minimum relative decrease of the smoothed train loss since the best check to count as an improvement."""
+    min_psnr_improvement: float = 0.05
+    """Minimum increase of the smoothed eval PSNR in dB since the best check to count as an improvement."""
+    max_eval_interval_multiplier: int = 8
+    """Evaluations are spaced twice as far apart after every check without improvement, up to this multiple of the
+    configured steps_per_eval_* intervals. An improvement halves the spacing again."""
+
+
+class EarlyStopping:
+    """Decides when training has converged from the smoothed train loss and eval PSNR.
+
+    Args:
+        config: configuration of the controller
+    """
+
+    def __init__(self, config: EarlyStoppingConfig) -> None:
+        self.config = config
+        self.loss_ema: Optional[torch.Tensor] = None
+        self.psnr_ema: Optional[float] = None
+        self.best_loss = float("inf")
+        self.best_psnr = float("-inf")
+        self.num_checks_without_improvement = 0
+        self.eval_interval_multiplier = 1
+
+    def update_train_loss(self, loss: torch.Tensor) -> None:
+        """Adds the train loss of a step to the moving average. The average stays on the device of the loss, so this
+        does not synchronize with the GPU."""
+        loss = loss.detach().float()
+        if self.loss_ema is None:
+            self.loss_ema = loss.clone()
+        else:
+            self.loss_ema.lerp_(loss, 1 - self.config.loss_ema_decay)
+
+    def update_eval_psnr(self, psnr: Union[float, torch.Tensor]) -> None:
+        """Adds the PSNR of an evaluation to the moving average."""
+        psnr = float(psnr)
+        if self.psnr_ema is None:
+            self.psnr_ema = psnr
+        else:
+            decay = self.config.psnr_ema_decay
+            self.psnr_ema = decay * self.psnr_ema + (1 - decay) * psnr
+
+    def get_eval_interval(self, steps_per_eval: int) -> int:
+        """Returns the current spacing of an evaluation that is configured to run every ``steps_per_eval`` steps."""
+        return steps_per_eval * self.eval_interval_multiplier
+
+    def _improved(self) -> bool:
+        """Compares the smoothed metrics with the best ones seen at previous checks and records new bests."""
+        improved = False
+        if self.loss_ema is not None:
+            loss = self.loss_ema.item()
+            if loss < self.best_loss * (1 - self.config.min_relative_loss_improvement):
+                self.best_loss = loss
+                improved = True
+        if self.psnr_ema is not None and self.psnr_ema > self.best_psnr + self.config.min_psnr_improvement:
+            self.best_psnr = self.psnr_ema
+            improved = True
+        return improved
+
+    def check(self, step: int) -> bool:
+        """Runs a convergence check if one is due at this step and returns whether training should stop.
+
+        With multiple processes the decision of the main process is used on all of them, so that they stop at the
+        same step.
+
+        Args:
+            step: current training step
+        """
+        if step == 0 or step % self.config.steps_per_check != 0:
+            return False
+        if self._improved():
+            self.num_checks_without_improvement = 0
+            self.eval_interval_multiplier = max(1, self.eval_interval_multiplier // 2)
+        else:
+            self.num_checks_without_improvement += 1
+            self.eval_interval_multiplier = min(
+                self.config.max_eval_interval_multiplier, self.eval_interval_multiplier * 2
+            )
+        should_stop = (
+            step >= self.config.min_num_iterations and self.num_checks_without_improvement >= self.config.patience
+        )
+        if comms.get_world_size() > 1:
+            device = self.loss_ema.device if self.loss_ema is not None else "cpu"
+            decision = torch.tensor([float(should_stop), float(self.eval_interval_multiplier)], device=device)
+            dist.broadcast(decision, src=0)
+            should_stop, self.eval_interval_multiplier = bool(decision[0]), int(decision[1])
+
+        writer.put_scalar(
+            name="Early Stopping/checks without improvement", scalar=self.num_checks_without_improvement, step=step
+        )
+        writer.put_scalar(
+            name="Early Stopping/eval interval multiplier", scalar=self.eval_interval_multiplier, step=step
+        )
+        return should_stop
@@ -18,8 +18,9 @@ Optimizers class.
 
 from __future__ import annotations
 
+import math
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
 
 import torch
 from torch.cuda.amp.grad_scaler import GradScaler
@@ -62,6 +63,112 @@ class AdamOptimizerConfig(OptimizerConfig):
     """The weight decay to use."""
 
 
+class LazyAdam(torch.optim.Optimizer):
+    """Adam that only updates the rows of a parameter that received a gradient.
+
+    Rows are the slices along the first dimension, e.g. the embedding of one image or the pose adjustment of one
+    camera. Rows with an all-zero gradient, such as the embeddings of images that are not part of the batch, keep
+    their values and moment estimates instead of being moved by stale momentum, and only the touched rows are read
+    and written. Every row counts its own steps for the bias correction. If all rows have a gradient, the update is
+    the same as the one of ``torch.optim.Adam``.
+
+    Args:
+        params: parameters to optimize
+        lr: learning rate
+        betas: decay rates of the first and second moment estimates
+        eps: term added to the denominator for numerical stability
+        weight_decay: L2 penalty, applied to the updated rows only
+    """
+
+    def __init__(
+        self,
+        params: Iterable[Union[torch.Tensor, Dict[str, Any]]],
+        lr: float = 1e-3,
+        betas: Tuple[float, float] = (0.9, 0.999),
+        eps: float = 1e-8,
+        weight_decay: float = 0.0,
+    ) -> None:
+        super().__init__(params, {"lr": lr, "betas": betas, "eps": eps, "weight_decay": weight_decay})
+
+    @staticmethod
+    def _get_touched_rows(grad: torch.Tensor) -> Optional[torch.Tensor]:
+        """Indices of the rows with a non-zero gradient, None if all rows are touched."""
+        if grad.dim() == 0:
+            return None
+        touched = grad.reshape(grad.shape[0], -1).ne(0).any(dim=1)
+        if touched.all():
+            return None
+        return touched.nonzero()[:, 0]
+
+    @staticmethod
+    def _get_bias_correction(step: torch.Tensor, beta: float) -> torch.Tensor:
+        """Returns 1 - beta**step, in the expm1 form that keeps the digits 1 - beta loses in single precision."""
+        if beta == 0:
+            return torch.ones_like(step)
+        return -torch.expm1(step * math.log(beta))
+
+    @torch.no_grad()
+    def step(self, closure: Optional[Callable[[], float]] = None) -> Optional[float]:  # type: ignore
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            for param in group["params"]:
+                if param.grad is None:
+                    continue
+                if param.grad.is_sparse:
+                    raise RuntimeError("LazyAdam does not support sparse gradients, use dense embeddings instead.")
+                state = self.state[param]
+                if not state:
+                    state["step"] = torch.zeros(param.shape[:1], device=param.device)
+                    state["exp_avg"] = torch.zeros_like(param, memory_format=torch.preserve_format)
+                    state["exp_avg_sq"] = torch.zeros_like(param, memory_format=torch.preserve_format)
+                elif state["step"].shape != param.shape[:1]:
+                    # state of a dense optimizer, e.g. when resuming a checkpoint trained with Adam
+                    state["step"] = state["step"].to(param.device, torch.float32).expand(param.shape[:1]).clone()
+
+                rows = self._get_touched_rows(param.grad)
+                if rows is None:
+                    value, grad = param, param.grad
+                    exp_avg, exp_avg_sq, step = state["exp_avg"], state["exp_avg_sq"], state["step"]
+                elif len(rows) == 0:
+                    continue
+                else:
+                    value, grad = param[rows], param.grad[rows]
+                    exp_avg, exp_avg_sq, step = state["exp_avg"][rows], state["exp_avg_sq"][rows], state["step"][rows]
+
+                if group["weight_decay"] != 0:
+                    grad = grad.add(value, alpha=group["weight_decay"])
+                step += 1
+                exp_avg.lerp_(grad, 1 - beta1)
+                exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+                # per-row bias corrections, broadcast over the remaining dimensions
+                step_shape = step.shape + (1,) * (value.dim() - step.dim())
+                bias_correction1 = self._get_bias_correction(step, beta1).view(step_shape)
+                bias_correction2 = self._get_bias_correction(step, beta2).view(step_shape)
+                denom = (exp_avg_sq / bias_correction2).sqrt_().add_(group["eps"])
+                value.addcdiv_(exp_avg / bias_correction1, denom, value=-group["lr"])
+
+                if rows is not None:
+                    param[rows] = value
+                    state["exp_avg"][rows] = exp_avg
+                    state["exp_avg_sq"][rows] = exp_avg_sq
+                    state["step"][rows] = step
+        return loss
+
+
+@dataclass
+class LazyAdamOptimizerConfig(OptimizerConfig):
+    """Adam that only updates the rows with a gradient, for per-image or per-camera parameters"""
+
+    _target: Type = LazyAdam
+    weight_decay: float = 0
+    """The weight decay to use."""
+
+
 @dataclass
 class RAdamOptimizerConfig(OptimizerConfig):
     """Basic optimizer config with RAdam"""
@@ -20,13 +20,12 @@ from __future__ import annotations
 
 import dataclasses
 import functools
-import os
 import time
 from collections import defaultdict
 from dataclasses import dataclass, field
 from pathlib import Path
 from threading import Lock
-from typing import DefaultDict, Dict, List, Literal, Optional, Tuple, Type, cast
+from typing import Any, DefaultDict, Dict, List, Literal, Optional, Tuple, Type, cast
 
 import torch
 import viser
@@ -37,6 +36,16 @@ from torch.cuda.amp.grad_scaler import GradScaler
 
 from nerfstudio.configs.experiment_config import ExperimentConfig
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes, TrainingCallbackLocation
+from nerfstudio.engine.checkpoints import (
+    AsyncCheckpointWriter,
+    atomic_save,
+    get_checkpoint_path,
+    get_latest_checkpoint_step,
+    read_checkpoint,
+    remove_unreferenced_shards,
+    save_sharded,
+)
+from nerfstudio.engine.early_stopping import EarlyStopping, EarlyStoppingConfig
 from nerfstudio.engine.optimizers import Optimizers
 from nerfstudio.pipelines.base_pipeline import VanillaPipeline
 from nerfstudio.utils import profiler, writer
@@ -65,6 +74,9 @@ class TrainerConfig(ExperimentConfig):
     """Number of steps between single eval images."""
     steps_per_eval_all_images: int = 25000
     """Number of steps between eval all images."""
+    cache_all_image_evals: bool = False
+    """Whether to store the per image results of the all-image evaluations in an eval_cache directory of the
+    experiment. Evaluations of unchanged weights, e.g. after resuming from a checkpoint, then reuse them."""
     max_num_iterations: int = 1000000
     """Maximum number of iterations to run."""
     mixed_precision: bool = False
@@ -73,6 +85,13 @@ class TrainerConfig(ExperimentConfig):
     """Use gradient scaler even if the automatic mixed precision is disabled."""
     save_only_latest_checkpoint: bool = True
     """Whether to only save the latest checkpoint or all checkpoints."""
+    async_checkpoint_save: bool = True
+    """Whether to write checkpoints on a background thread. The state is still snapshotted to host memory before
+    training continues, so the checkpoint always corresponds to the step it was saved at."""
+    checkpoint_format: Literal["monolithic", "sharded"] = "monolithic"
+    """How to store checkpoints. "monolithic" writes one file per step. "sharded" writes a small manifest per step and
+    stores every tensor once in a content-addressed file shared between steps, which keeps disk use low with
+    save_only_latest_checkpoint=False when many tensors stay unchanged."""
     # optional parameters if we want to resume training
     load_dir: Optional[Path] = None
     """Optionally specify a pre-trained model directory to load from."""
@@ -86,8 +105,15 @@ class TrainerConfig(ExperimentConfig):
     """Optionally log gradients during training"""
     gradient_accumulation_steps: Dict[str, int] = field(default_factory=lambda: {})
     """Number of steps to accumulate gradients over. Contains a mapping of {param_group:num}"""
+    num_micro_batches: int = 1
+    """Number of micro-batches to split the training batch of each step into. Forward and backward run on one
+    micro-batch at a time and the optimizers step once on the accumulated gradients, so large batches fit into
+    limited memory. Unlike gradient_accumulation_steps, all micro-batches come from the batch of the same step."""
     start_paused: bool = False
     """Whether to start the training in a paused state."""
+    early_stopping: EarlyStoppingConfig = field(default_factory=EarlyStoppingConfig)
+    """Stops training before max_num_iterations once the train loss and eval PSNR plateau, and spaces evaluations
+    further apart while they do."""
 
 
 class Trainer:
@@ -140,6 +166,14 @@ class Trainer:
         # directory to save checkpoints
         self.checkpoint_dir: Path = config.get_checkpoint_dir()
         CONSOLE.log(f"Saving checkpoints to: {self.checkpoint_dir}")
+        self.save_checkpoint_fn = save_sharded if config.checkpoint_format == "sharded" else atomic_save
+        self.checkpoint_writer: Optional[AsyncCheckpointWriter] = (
+            AsyncCheckpointWriter(self.save_checkpoint_fn) if config.async_checkpoint_save else None
+        )
+
+        self.early_stopping: Optional[EarlyStopping] = (
+            config.early_stopping.setup() if config.early_stopping.enable else None
+        )
 
         self.viewer_state = None
 
@@ -257,19 +291,24 @@ class Trainer:
                         self.pipeline.train()
 
                         # training callbacks before the training iteration
-                        for callback in self.callbacks:
-                            callback.run_callback_at_location(
-                                step, location=TrainingCallbackLocation.BEFORE_TRAIN_ITERATION
-                            )
+                        with profiler.time_function("callbacks"):
+                            for callback in self.callbacks:
+                                callback.run_callback_at_location(
+                                    step, location=TrainingCallbackLocation.BEFORE_TRAIN_ITERATION
+                                )
 
                         # time the forward pass
                         loss, loss_dict, metrics_dict = self.train_iteration(step)
 
                         # training callbacks after the training iteration
-                        for callback in self.callbacks:
-                            callback.run_callback_at_location(
-                                step, location=TrainingCallbackLocation.AFTER_TRAIN_ITERATION
-                            )
+                        with profiler.time_function("callbacks"):
+                            for callback in self.callbacks:
+                                callback.run_callback_at_location(
+                                    step, location=TrainingCallbackLocation.AFTER_TRAIN_ITERATION
+                                )
+
+                if self.early_stopping is not None:
+                    self.early_stopping.update_train_loss(loss)
 
                 # Skip the first two steps to avoid skewed timings that break the viewer rendering speed estimate.
                 if step > 1:
@@ -282,7 +321,8 @@ class Trainer:
                         avg_over_steps=True,
                     )
 
-                self._update_viewer_state(step)
+                with profiler.time_function("viewer_update"):
+                    self._update_viewer_state(step)
 
                 # a batch of train rays
                 if step_check(step, self.config.logging.steps_per_log, run_at_zero=True):
@@ -307,6 +347,11 @@ class Trainer:
                     self.save_checkpoint(step)
 
                 writer.write_out_storage()
+                profiler.export_profile(step)
+
+                if self.early_stopping is not None and self.early_stopping.check(step):
+                    CONSOLE.print(f"Training converged at step {step}, stopping early.")
+                    break
 
         # save checkpoint at the end of training, and write out any remaining events
         self._after_train()
@@ -326,6 +371,8 @@ class Trainer:
         self.training_state = "completed"  # used to update the webui state
         # save checkpoint at the end of training
         self.save_checkpoint(self.step)
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.wait()
         # write out any remaining events (e.g., total train time)
         writer.write_out_storage()
         table = Table(
@@ -426,10 +473,10 @@ class Trainer:
             if load_step is None:
                 print("Loading latest Nerfstudio checkpoint from load_dir...")
                 # NOTE: this is specific to the checkpoint name format
-                load_step = sorted(int(x[x.find("-") + 1 : x.find(".")]) for x in os.listdir(load_dir))[-1]
-            load_path: Path = load_dir / f"step-{load_step:09d}.ckpt"
+                load_step = get_latest_checkpoint_step(load_dir)
+            load_path: Path = get_checkpoint_path(load_dir, load_step)
             assert load_path.exists(), f"Checkpoint {load_path} does not exist"
-            loaded_state = torch.load(load_path, map_location="cpu")
+            loaded_state = read_checkpoint(load_path)
             self._start_step = loaded_state["step"] + 1
             # load the checkpoints for pipeline, optimizers, and gradient scalar
             self.pipeline.load_pipeline(loaded_state["pipeline"], loaded_state["step"])
@@ -440,7 +487,7 @@ class Trainer:
             CONSOLE.print(f"Done loading Nerfstudio checkpoint from {load_path}")
         elif load_checkpoint is not None:
             assert load_checkpoint.exists(), f"Checkpoint {load_checkpoint} does not exist"
-            loaded_state = torch.load(load_checkpoint, map_location="cpu")
+            loaded_state = read_checkpoint(load_checkpoint)
             self._start_step = loaded_state["step"] + 1
             # load the checkpoints for pipeline, optimizers, and gradient scalar
             self.pipeline.load_pipeline(loaded_state["pipeline"], loaded_state["step"])
@@ -463,9 +510,10 @@ class Trainer:
         if not self.checkpoint_dir.exists():
             self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
         # save the checkpoint
-        ckpt_path: Path = self.checkpoint_dir / f"step-{step:09d}.ckpt"
-        torch.save(
-            {
+        ckpt_path: Path = get_checkpoint_path(self.checkpoint_dir, step)
+
+        def get_state() -> Dict[str, Any]:
+            return {
                 "step": step,
                 "pipeline": self.pipeline.module.state_dict()  # type: ignore
                 if hasattr(self.pipeline, "module")
@@ -473,15 +521,53 @@ class Trainer:
                 "optimizers": {k: v.state_dict() for (k, v) in self.optimizers.optimizers.items()},
                 "schedulers": {k: v.state_dict() for (k, v) in self.optimizers.schedulers.items()},
                 "scalers": self.grad_scaler.state_dict(),
-            },
-            ckpt_path,
-        )
-        # possibly delete old checkpoints
-        if self.config.save_only_latest_checkpoint:
+            }
+
+        def delete_old_checkpoints() -> None:
             # delete every other checkpoint in the checkpoint folder
             for f in self.checkpoint_dir.glob("*.ckpt"):
                 if f != ckpt_path:
                     f.unlink()
+            remove_unreferenced_shards(self.checkpoint_dir)
+
+        on_saved = delete_old_checkpoints if self.config.save_only_latest_checkpoint else None
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.save(get_state, ckpt_path, on_saved=on_saved)
+        else:
+            self.save_checkpoint_fn(get_state(), ckpt_path)
+            if on_saved is not None:
+                on_saved()
+
+    def forward_backward_micro_batches(self, step: int, device_type: str) -> TRAIN_INTERATION_OUTPUT:
+        """Runs forward and backward on each micro-batch of the training batch, accumulating the gradients.
+
+        The loss of every micro-batch is weighted by its share of the rays, so the accumulated gradients match the
+        ones of the whole batch. The returned losses and metrics are averaged over the micro-batches with the same
+        weights.
+
+        Args:
+            step: Current training step.
+            device_type: Device type to autocast on.
+        """
+        loss_dict: Dict[str, torch.Tensor] = {}
+        metrics_dict: Dict[str, Any] = {}
+        micro_batches = self.pipeline.get_train_micro_batch_loss_dicts(step, self.config.num_micro_batches)
+        while True:
+            with torch.autocast(device_type=device_type, enabled=self.mixed_precision):
+                micro_batch = next(micro_batches, None)
+                if micro_batch is None:
+                    break
+                _, micro_loss_dict, micro_metrics_dict, weight = micro_batch
+                micro_loss = functools.reduce(torch.add, micro_loss_dict.values())
+            with profiler.time_function("backward"):
+                self.grad_scaler.scale(micro_loss * weight).backward()  # type: ignore
+            for totals, values in ((loss_dict, micro_loss_dict), (metrics_dict, micro_metrics_dict)):
+                for key, value in values.items():
+                    if isinstance(value, torch.Tensor):
+                        value = value.detach()
+                    totals[key] = totals.get(key, 0) + value * weight
+        loss = functools.reduce(torch.add, loss_dict.values())
+        return loss, loss_dict, metrics_dict
 
     @profiler.time_function
     def train_iteration(self, step: int) -> TRAIN_INTERATION_OUTPUT:
@@ -498,16 +584,21 @@ class Trainer:
         cpu_or_cuda_str: str = self.device.split(":")[0]
         cpu_or_cuda_str = "cpu" if cpu_or_cuda_str == "mps" else cpu_or_cuda_str
 
-        with torch.autocast(device_type=cpu_or_cuda_str, enabled=self.mixed_precision):
-            _, loss_dict, metrics_dict = self.pipeline.get_train_loss_dict(step=step)
-            loss = functools.reduce(torch.add, loss_dict.values())
-        self.grad_scaler.scale(loss).backward()  # type: ignore
+        if self.config.num_micro_batches > 1:
+            loss, loss_dict, metrics_dict = self.forward_backward_micro_batches(step, cpu_or_cuda_str)
+        else:
+            with torch.autocast(device_type=cpu_or_cuda_str, enabled=self.mixed_precision):
+                _, loss_dict, metrics_dict = self.pipeline.get_train_loss_dict(step=step)
+                loss = functools.reduce(torch.add, loss_dict.values())
+            with profiler.time_function("backward"):
+                self.grad_scaler.scale(loss).backward()  # type: ignore
         needs_step = [
             group
             for group in self.optimizers.parameters.keys()
             if step % self.gradient_accumulation_steps[group] == self.gradient_accumulation_steps[group] - 1
         ]
-        self.optimizers.optimizer_scaler_step_some(self.grad_scaler, needs_step)
+        with profiler.time_function("optimizer_step"):
+            self.optimizers.optimizer_scaler_step_some(self.grad_scaler, needs_step)
 
         if self.config.log_gradients:
             total_grad = 0
@@ -529,6 +620,13 @@ class Trainer:
         # Merging loss and metrics dict into a single output.
         return loss, loss_dict, metrics_dict  # type: ignore
 
+    def get_eval_interval(self, steps_per_eval: int) -> int:
+        """Returns the number of steps between evaluations that are configured to run every ``steps_per_eval`` steps,
+        spaced further apart by early stopping while the metrics plateau."""
+        if self.early_stopping is None:
+            return steps_per_eval
+        return self.early_stopping.get_eval_interval(steps_per_eval)
+
     @check_eval_enabled
     @profiler.time_function
     def eval_iteration(self, step: int) -> None:
@@ -538,7 +636,7 @@ class Trainer:
             step: Current training step.
         """
         # a batch of eval rays
-        if step_check(step, self.config.steps_per_eval_batch):
+        if step_check(step, self.get_eval_interval(self.config.steps_per_eval_batch)):
             _, eval_loss_dict, eval_metrics_dict = self.pipeline.get_eval_loss_dict(step=step)
             eval_loss = functools.reduce(torch.add, eval_loss_dict.values())
             writer.put_scalar(name="Eval Loss", scalar=eval_loss, step=step)
@@ -546,7 +644,7 @@ class Trainer:
             writer.put_dict(name="Eval Metrics Dict", scalar_dict=eval_metrics_dict, step=step)
 
         # one eval image
-        if step_check(step, self.config.steps_per_eval_image):
+        if step_check(step, self.get_eval_interval(self.config.steps_per_eval_image)):
             with TimeWriter(writer, EventName.TEST_RAYS_PER_SEC, write=False) as test_t:
                 metrics_dict, images_dict = self.pipeline.get_eval_image_metrics_and_images(step=step)
             writer.put_time(
@@ -556,11 +654,16 @@ class Trainer:
                 avg_over_steps=True,
             )
             writer.put_dict(name="Eval Images Metrics", scalar_dict=metrics_dict, step=step)
+            if self.early_stopping is not None and "psnr" in metrics_dict:
+                self.early_stopping.update_eval_psnr(metrics_dict["psnr"])
             group = "Eval Images"
             for image_name, image in images_dict.items():
                 writer.put_image(name=group + "/" + image_name, image=image, step=step)
 
         # all eval images
-        if step_check(step, self.config.steps_per_eval_all_images):
-            metrics_dict = self.pipeline.get_average_eval_image_metrics(step=step)
+        if step_check(step, self.get_eval_interval(self.config.steps_per_eval_all_images)):
+            cache_dir = self.base_dir / "eval_cache" if self.config.cache_all_image_evals else None
+            metrics_dict = self.pipeline.get_average_eval_image_metrics(step=step, cache_dir=cache_dir)
             writer.put_dict(name="Eval Images Metrics Dict (all images)", scalar_dict=metrics_dict, step=step)
+            if self.early_stopping is not None and "psnr" in metrics_dict:
+                self.early_stopping.update_eval_psnr(metrics_dict["psnr"])
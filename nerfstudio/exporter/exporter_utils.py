@@ -18,14 +18,16 @@ Export utils such as structs, point cloud generation, and rendering code.
 
 from __future__ import annotations
 
+import copy
+import itertools
 import sys
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pymeshlab
 import torch
-from jaxtyping import Float
+from jaxtyping import Bool, Float, Int
 from rich.progress import BarColumn, Progress, TaskProgressColumn, TextColumn, TimeRemainingColumn
 from torch import Tensor
 
@@ -196,9 +198,31 @@ def generate_point_cloud(
         if ind is not None:
             view_directions = view_directions[ind]
 
+    normals_tensor = None
+    if normal_output_name is not None:
+        normals_tensor = torch.cat(normals, dim=0)
+        if ind is not None:
+            # mask out normals for points that were removed with remove_outliers
+            normals_tensor = normals_tensor[ind]
+    _set_point_cloud_normals(pcd, view_directions, normals_tensor, estimate_normals, reorient_normals)
+
+    return pcd
+
+
+def _set_point_cloud_normals(
+    pcd: o3d.geometry.PointCloud,
+    view_directions: Float[Tensor, "num_points 3"],
+    normals: Optional[Float[Tensor, "num_points 3"]],
+    estimate_normals: bool,
+    reorient_normals: bool,
+) -> None:
+    """Sets the normals of a point cloud from the model outputs or by estimating them, and optionally flips them to
+    face the cameras the points were seen from."""
+    import open3d as o3d
+
     # either estimate_normals or normal_output_name, not both
     if estimate_normals:
-        if normal_output_name is not None:
+        if normals is not None:
             CONSOLE.rule("Error", style="red")
             CONSOLE.print("Cannot estimate normals and use normal_output_name at the same time", justify="center")
             sys.exit(1)
@@ -206,20 +230,218 @@ def generate_point_cloud(
         pcd.estimate_normals()
         print("\033[A\033[A")
         CONSOLE.print("[bold green]:white_check_mark: Estimating Point Cloud Normals")
-    elif normal_output_name is not None:
-        normals = torch.cat(normals, dim=0)
-        if ind is not None:
-            # mask out normals for points that were removed with remove_outliers
-            normals = normals[ind]
+    elif normals is not None:
         pcd.normals = o3d.utility.Vector3dVector(normals.double().cpu().numpy())
 
     # re-orient the normals
     if reorient_normals:
         normals = torch.from_numpy(np.array(pcd.normals)).float()
-        mask = torch.sum(view_directions * normals, dim=-1) > 0
+        mask = torch.sum(view_directions.cpu() * normals, dim=-1) > 0
         normals[mask] *= -1
         pcd.normals = o3d.utility.Vector3dVector(normals.double().cpu().numpy())
 
+
+class VoxelGrid:
+    """Sparse voxel grid that averages the attributes of the points added to each voxel.
+
+    The points of each call to :meth:`add` are reduced to their voxels and buffered, and the buffer is merged into the
+    occupied voxels once it outgrows them. Memory is therefore proportional to the number of occupied voxels, and adding
+    points takes time proportional to their number on average. Voxels are kept sorted by key, so the result does not
+    depend on the order the points are added in.
+
+    Args:
+        voxel_size: Edge length of the voxels.
+        num_attributes: Number of values averaged per point besides its position.
+        device: Device to accumulate on.
+    """
+
+    KEY_BITS = 21
+    """Bits of each voxel coordinate in the voxel keys."""
+
+    def __init__(self, voxel_size: float, num_attributes: int, device: Union[torch.device, str] = "cpu") -> None:
+        if voxel_size <= 0:
+            raise ValueError(f"Voxel size must be positive, got {voxel_size}")
+        self.voxel_size = voxel_size
+        self.keys = torch.empty(0, dtype=torch.long, device=device)
+        self.sums = torch.empty((0, 3 + num_attributes), dtype=torch.float64, device=device)
+        self.counts = torch.empty(0, dtype=torch.long, device=device)
+        self._buffer: List[Tuple[Tensor, Tensor, Tensor]] = []
+        self._num_buffered = 0
+
+    def contains(self, points: Float[Tensor, "num_points 3"]) -> Bool[Tensor, "num_points"]:
+        """Returns which points are close enough to the origin for their voxel to have a key, non-finite points never
+        are."""
+        coords = torch.floor(points / self.voxel_size) + 2 ** (self.KEY_BITS - 1)
+        # a margin of one voxel keeps the keys of the neighbours of every voxel valid
+        return torch.all((coords >= 1) & (coords <= 2**self.KEY_BITS - 2), dim=-1)
+
+    def get_keys(self, points: Float[Tensor, "num_points 3"]) -> Int[Tensor, "num_points"]:
+        """Returns the keys of the voxels containing points, which pack the voxel coordinates offset to be positive."""
+        if not torch.all(self.contains(points)):
+            raise ValueError("Points are too far from the origin for the voxel size, crop them or use larger voxels")
+        coords = torch.floor(points / self.voxel_size).long() + 2 ** (self.KEY_BITS - 1)
+        return (coords[:, 0] << (2 * self.KEY_BITS)) | (coords[:, 1] << self.KEY_BITS) | coords[:, 2]
+
+    @staticmethod
+    def _reduce(keys: Tensor, sums: Tensor, counts: Tensor) -> Tuple[Tensor, Tensor, Tensor]:
+        """Sums the entries with the same key, sorted by key."""
+        keys, inverse = torch.unique(keys, return_inverse=True)
+        reduced_sums = torch.zeros((len(keys), sums.shape[1]), dtype=sums.dtype, device=sums.device)
+        reduced_counts = torch.zeros(len(keys), dtype=counts.dtype, device=counts.device)
+        return keys, reduced_sums.index_add_(0, inverse, sums), reduced_counts.index_add_(0, inverse, counts)
+
+    def add(
+        self, points: Float[Tensor, "num_points 3"], attributes: Float[Tensor, "num_points num_attributes"]
+    ) -> None:
+        """Adds points and their attributes to the grid."""
+        values = torch.cat([points, attributes], dim=-1).to(self.sums)
+        self._buffer.append(
+            self._reduce(self.get_keys(points).to(self.keys.device), values, torch.ones_like(values[:, 0]).long())
+        )
+        self._num_buffered += len(self._buffer[-1][0])
+        if self._num_buffered > max(len(self.keys), 1 << 16):
+            self._merge()
+
+    def _merge(self) -> None:
+        """Merges the buffered voxels into the occupied voxels."""
+        if self._buffer:
+            keys, sums, counts = zip((self.keys, self.sums, self.counts), *self._buffer)
+            self.keys, self.sums, self.counts = self._reduce(torch.cat(keys), torch.cat(sums), torch.cat(counts))
+            self._buffer = []
+            self._num_buffered = 0
+
+    def get_voxels(
+        self,
+    ) -> Tuple[Int[Tensor, "num_voxels"], Float[Tensor, "num_voxels 3"], Float[Tensor, "num_voxels num_attributes"]]:
+        """Returns the sorted keys of the occupied voxels with the mean position and attributes of their points."""
+        self._merge()
+        means = (self.sums / self.counts[:, None]).float()
+        return self.keys, means[:, :3], means[:, 3:]
+
+    def get_neighbor_counts(self, chunk_size: int = 1 << 18) -> Int[Tensor, "num_voxels"]:
+        """Returns the number of occupied voxels among the 26 neighbours of each occupied voxel.
+
+        Args:
+            chunk_size: Number of voxels looked up at once.
+        """
+        self._merge()
+        offsets = torch.tensor(
+            [
+                (dx << (2 * self.KEY_BITS)) + (dy << self.KEY_BITS) + dz
+                for dx, dy, dz in itertools.product((-1, 0, 1), repeat=3)
+                if (dx, dy, dz) != (0, 0, 0)
+            ],
+            device=self.keys.device,
+        )
+        neighbor_counts = []
+        for start in range(0, len(self.keys), chunk_size):
+            neighbor_keys = self.keys[start : start + chunk_size, None] + offsets
+            indices = torch.searchsorted(self.keys, neighbor_keys).clamp(max=len(self.keys) - 1)
+            neighbor_counts.append((self.keys[indices] == neighbor_keys).sum(dim=-1))
+        return torch.cat(neighbor_counts) if neighbor_counts else torch.zeros_like(self.keys)
+
+
+def generate_point_cloud_from_frames(
+    pipeline: Pipeline,
+    voxel_size: float = 0.002,
+    downscale_factor: int = 1,
+    remove_outliers: bool = True,
+    estimate_normals: bool = False,
+    reorient_normals: bool = False,
+    rgb_output_name: str = "rgb",
+    depth_output_name: str = "depth",
+    normal_output_name: Optional[str] = None,
+    crop_obb: Optional[OrientedBox] = None,
+    std_ratio: float = 2.0,
+) -> o3d.geometry.PointCloud:
+    """Generate a point cloud from a nerf by rendering every training image in full.
+
+    The depth of each image is back-projected along its rays and the points are averaged per voxel as the images are
+    rendered, so memory is bounded by the number of occupied voxels and the same model always gives the same points.
+
+    Args:
+        pipeline: Pipeline to evaluate with.
+        voxel_size: Edge length of the voxels the points are averaged in.
+        downscale_factor: Downscale the images starting from the resolution used for training.
+        remove_outliers: Whether to remove voxels with few occupied neighbours.
+        estimate_normals: Whether to estimate normals.
+        reorient_normals: Whether to re-orient the normals based on the view direction.
+        rgb_output_name: Name of the RGB output.
+        depth_output_name: Name of the depth output.
+        normal_output_name: Name of the normal output.
+        crop_obb: Box outside of which points are dropped.
+        std_ratio: Remove voxels whose number of occupied neighbours is this many standard deviations below the mean.
+
+    Returns:
+        Point cloud.
+    """
+    assert pipeline.datamanager.train_dataset is not None
+    cameras = copy.deepcopy(pipeline.datamanager.train_dataset.cameras)
+    cameras.rescale_output_resolution(1.0 / downscale_factor)
+    voxel_grid = VoxelGrid(voxel_size, 9 if normal_output_name is not None else 6, device=pipeline.device)
+    num_out_of_range = 0
+
+    progress = Progress(
+        TextColumn(":cloud: Computing Point Cloud :cloud:"),
+        BarColumn(),
+        TaskProgressColumn(show_speed=True),
+        ItersPerSecColumn(suffix="fps"),
+        TimeRemainingColumn(elapsed_when_finished=True, compact=True),
+        console=CONSOLE,
+    )
+    with progress:
+        for camera_idx in progress.track(range(cameras.size), description=""):
+            ray_bundle = cameras.generate_rays(camera_indices=camera_idx).to(pipeline.device)
+            with torch.no_grad():
+                outputs = pipeline.model.get_outputs_for_camera_ray_bundle(ray_bundle)
+            for output_name, option in [
+                (rgb_output_name, "rgb_output_name"),
+                (depth_output_name, "depth_output_name"),
+                (normal_output_name, "normal_output_name"),
+            ]:
+                if output_name is not None and output_name not in outputs:
+                    CONSOLE.rule("Error", style="red")
+                    CONSOLE.print(f"Could not find {output_name} in the model outputs", justify="center")
+                    CONSOLE.print(f"Please set --{option} to one of: {outputs.keys()}", justify="center")
+                    sys.exit(1)
+            rgba = pipeline.model.get_rgba_image(outputs, rgb_output_name).reshape(-1, 4)
+            points = (ray_bundle.origins + ray_bundle.directions * outputs[depth_output_name]).reshape(-1, 3)
+            attributes = [rgba[:, :3], ray_bundle.directions.reshape(-1, 3)]
+            if normal_output_name is not None:
+                normal = outputs[normal_output_name].reshape(-1, 3)
+                assert (
+                    torch.min(normal) >= 0.0 and torch.max(normal) <= 1.0
+                ), "Normal values from method output must be in [0, 1]"
+                attributes.append((normal * 2.0) - 1.0)
+
+            # Filter points with opacity lower than 0.5
+            mask = rgba[:, -1] > 0.5
+            if crop_obb is not None:
+                mask &= crop_obb.within(points)
+            in_range = voxel_grid.contains(points)
+            num_out_of_range += int((mask & ~in_range).sum())
+            mask &= in_range
+            voxel_grid.add(points[mask], torch.cat(attributes, dim=-1)[mask])
+
+    if num_out_of_range > 0:
+        CONSOLE.print(
+            f"Dropped {num_out_of_range} points too far from the origin for a voxel size of {voxel_size}, "
+            "use larger voxels or a crop box to keep them"
+        )
+    _, points, attributes = voxel_grid.get_voxels()
+    if remove_outliers:
+        neighbor_counts = voxel_grid.get_neighbor_counts().float()
+        mask = neighbor_counts >= neighbor_counts.mean() - std_ratio * neighbor_counts.std(unbiased=False)
+        CONSOLE.print(f"Removed {len(mask) - int(mask.sum())} outlier voxels")
+        points, attributes = points[mask], attributes[mask]
+
+    import open3d as o3d
+
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points.double().cpu().numpy())
+    pcd.colors = o3d.utility.Vector3dVector(attributes[:, :3].clamp(0.0, 1.0).double().cpu().numpy())
+    normals = torch.nn.functional.normalize(attributes[:, 6:], dim=-1) if normal_output_name is not None else None
+    _set_point_cloud_normals(pcd, attributes[:, 3:6], normals, estimate_normals, reorient_normals)
     return pcd
 
 
@@ -0,0 +1,361 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compressed, spatially sorted storage of Gaussian splats.
+
+The Gaussians are sorted along a Morton curve and split into chunks of CHUNK_SIZE neighbouring Gaussians. A chunk
+stores the range of the positions, log scales, colors and higher order spherical harmonics of its Gaussians, and each
+Gaussian stores its attributes quantized to the ranges of its chunk. The file is a binary PLY file with the elements
+
+- ``chunk``: float ``min_*`` and ``max_*`` properties of the ranges of each chunk,
+- ``vertex``: uint ``packed_position`` (11, 10 and 11 bits), ``packed_rotation`` (index of the largest component in
+  2 bits and the three other components in 10 bits each), ``packed_scale`` (11, 10 and 11 bits) and ``packed_color``
+  (8 bits for each of red, green, blue and opacity),
+- ``sh``: one uchar ``f_rest_*`` property per higher order spherical harmonics coefficient, in the order of the full
+  precision PLY export, only present if the Gaussians have them.
+
+A Gaussian takes 16 bytes plus one byte per higher order coefficient, instead of 248 bytes in a full precision PLY with
+degree 3 spherical harmonics. As the chunks are independent, the file is decoded a block of chunks at a time.
+"""
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import torch
+from jaxtyping import Float, Int
+from torch import Tensor
+
+from nerfstudio.models.splatfacto import SplatfactoModel
+
+CHUNK_SIZE = 256
+"""Number of neighbouring Gaussians that share quantization ranges."""
+
+SH_C0 = 0.28209479177387814
+"""Zeroth order spherical harmonics basis function, converts the DC coefficients to colors."""
+
+PLY_PROPERTY_DTYPES = {
+    "char": "i1",
+    "uchar": "u1",
+    "short": "<i2",
+    "ushort": "<u2",
+    "int": "<i4",
+    "uint": "<u4",
+    "float": "<f4",
+    "double": "<f8",
+}
+"""Numpy dtypes of the PLY property types."""
+
+_POSITION_BITS = (11, 10, 11)
+_SCALE_BITS = (11, 10, 11)
+_ROTATION_BITS = (2, 10, 10, 10)
+_COLOR_BITS = (8, 8, 8, 8)
+_SH_BITS = 8
+_VERTEX_PROPERTIES = ("packed_position", "packed_rotation", "packed_scale", "packed_color")
+
+
+def _get_chunk_properties(with_sh: bool) -> List[str]:
+    """Returns the names of the ranges stored per chunk."""
+    groups = [("x", "y", "z"), ("scale_x", "scale_y", "scale_z"), ("r", "g", "b")]
+    if with_sh:
+        groups.append(("sh",))
+    return [f"{bound}_{name}" for group in groups for bound in ("min", "max") for name in group]
+
+
+def get_morton_order(positions: Float[Tensor, "num_points 3"], bits: int = 21) -> Int[Tensor, "num_points"]:
+    """Returns the permutation that sorts points along a Morton (Z-order) curve through their bounding box.
+
+    Args:
+        positions: points to sort
+        bits: resolution of the curve along each axis
+    """
+    low = positions.amin(dim=0)
+    extent = (positions.amax(dim=0) - low).clamp(min=1e-12)
+    coords = torch.round((positions - low) / extent * (2**bits - 1)).long()
+    codes = torch.zeros(len(positions), dtype=torch.long, device=positions.device)
+    for bit in range(bits):
+        for axis in range(3):
+            codes |= ((coords[:, axis] >> bit) & 1) << (3 * bit + 2 - axis)
+    return torch.argsort(codes, stable=True)
+
+
+def _quantize(values: Tensor, low: Tensor, high: Tensor, bits: Sequence[int]) -> Tensor:
+    """Maps each column of values in [low, high] to integers with the number of bits of that column."""
+    levels = torch.tensor([2**num_bits - 1 for num_bits in bits], device=values.device)
+    normalized = (values - low) / (high - low).clamp(min=1e-12)
+    return torch.round(normalized.clamp(0.0, 1.0) * levels).long()
+
+
+def _dequantize(quantized: Tensor, low: Tensor, high: Tensor, bits: Sequence[int]) -> Tensor:
+    """Inverse of :func:`_quantize`."""
+    levels = torch.tensor([2**num_bits - 1 for num_bits in bits], device=quantized.device)
+    return low + quantized.float() / levels * (high - low)
+
+
+def _pack(fields: Tensor, bits: Sequence[int]) -> Tensor:
+    """Packs the integer columns of fields into one integer, the first column in the highest bits."""
+    packed = torch.zeros_like(fields[:, 0])
+    for field, num_bits in zip(fields.unbind(dim=-1), bits):
+        packed = (packed << num_bits) | field
+    return packed
+
+
+def _unpack(packed: Tensor, bits: Sequence[int]) -> Tensor:
+    """Inverse of :func:`_pack`."""
+    fields = []
+    for num_bits in reversed(bits):
+        fields.append(packed & (2**num_bits - 1))
+        packed = packed >> num_bits
+    return torch.stack(fields[::-1], dim=-1)
+
+
+def _encode_rotations(quats: Float[Tensor, "num_points 4"]) -> Int[Tensor, "num_points"]:
+    """Packs normalized quaternions as the index of their largest component and their three other components, which
+    lie in [-sqrt(1/2), sqrt(1/2)] once the sign of the quaternion makes the largest component positive."""
+    quats = torch.nn.functional.normalize(quats, dim=-1)
+    largest = quats.abs().argmax(dim=-1)
+    quats = quats * torch.where(quats.gather(1, largest[:, None]) < 0, -1.0, 1.0)
+    others = quats[~torch.nn.functional.one_hot(largest, 4).bool()].reshape(-1, 3)
+    quantized = _quantize(others, torch.tensor(-math.sqrt(0.5)), torch.tensor(math.sqrt(0.5)), _ROTATION_BITS[1:])
+    return _pack(torch.cat([largest[:, None], quantized], dim=-1), _ROTATION_BITS)
+
+
+def _decode_rotations(packed: Int[Tensor, "num_points"]) -> Float[Tensor, "num_points 4"]:
+    """Inverse of :func:`_encode_rotations`."""
+    fields = _unpack(packed, _ROTATION_BITS)
+    others = _dequantize(fields[:, 1:], torch.tensor(-math.sqrt(0.5)), torch.tensor(math.sqrt(0.5)), _ROTATION_BITS[1:])
+    is_largest = torch.nn.functional.one_hot(fields[:, 0], 4).bool()
+    quats = torch.empty((len(packed), 4))
+    quats[is_largest] = torch.sqrt((1.0 - (others**2).sum(dim=-1)).clamp(min=0.0))
+    quats[~is_largest] = others.reshape(-1)
+    return quats
+
+
+def _get_chunk_ranges(values: Float[Tensor, "num_points dim"], per_dim: bool = True) -> Tuple[Tensor, Tensor]:
+    """Returns the minimum and maximum of values over each chunk, either per dimension or over all dimensions. The
+    number of values must be a multiple of CHUNK_SIZE."""
+    chunks = values.reshape(-1, CHUNK_SIZE, values.shape[-1])
+    dims = (1,) if per_dim else (1, 2)
+    return chunks.amin(dim=dims).reshape(len(chunks), -1), chunks.amax(dim=dims).reshape(len(chunks), -1)
+
+
+def _expand_chunk_ranges(low: Tensor, high: Tensor, count: int) -> Tuple[Tensor, Tensor]:
+    """Repeats the ranges of each chunk for each of its Gaussians."""
+    return low.repeat_interleave(CHUNK_SIZE, dim=0)[:count], high.repeat_interleave(CHUNK_SIZE, dim=0)[:count]
+
+
+def _get_header(num_chunks: int, count: int, num_sh: int) -> bytes:
+    """Returns the PLY header of a compressed file."""
+    lines = ["ply", "format binary_little_endian 1.0", f"element chunk {num_chunks}"]
+    lines += [f"property float {name}" for name in _get_chunk_properties(num_sh > 0)]
+    lines += [f"element vertex {count}"] + [f"property uint {name}" for name in _VERTEX_PROPERTIES]
+    if num_sh > 0:
+        lines += [f"element sh {count}"] + [f"property uchar f_rest_{i}" for i in range(num_sh)]
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def write_compressed_splat(filename: Path, gaussians: Dict[str, Tensor], chunks_per_block: int = 4096) -> None:
+    """Writes Gaussians to a compressed PLY file, in Morton order.
+
+    Args:
+        filename: file to write
+        gaussians: "means", "scales" (log scales), "quats" (wxyz), "opacities" (logits) and "shs_0" of every Gaussian
+            in the layout of the splatfacto parameters, and optionally "shs_rest" of shape [num_points, num_coeffs, 3]
+        chunks_per_block: number of chunks encoded at once, bounds the memory used
+    """
+    count = len(gaussians["means"])
+    if count == 0:
+        raise ValueError("Cannot write an empty splat")
+    order = get_morton_order(gaussians["means"])
+    num_chunks = math.ceil(count / CHUNK_SIZE)
+    has_sh = "shs_rest" in gaussians and gaussians["shs_rest"].shape[1] > 0
+    num_sh = gaussians["shs_rest"][0].numel() if has_sh else 0
+    num_chunk_properties = len(_get_chunk_properties(has_sh))
+
+    with open(filename, "wb") as ply_file:
+        header = _get_header(num_chunks, count, num_sh)
+        ply_file.write(header)
+        # every element has fixed size records, so each block is written at its offset in all elements
+        chunk_offset = len(header)
+        vertex_offset = chunk_offset + num_chunks * num_chunk_properties * 4
+        sh_offset = vertex_offset + count * len(_VERTEX_PROPERTIES) * 4
+
+        for first_chunk in range(0, num_chunks, chunks_per_block):
+            start = first_chunk * CHUNK_SIZE
+            block_chunks = min(chunks_per_block, num_chunks - first_chunk)
+            block_count = min(block_chunks * CHUNK_SIZE, count - start)
+            # the last chunk is padded with its last Gaussian, which leaves its ranges unchanged
+            padded_indices = torch.arange(start, start + block_chunks * CHUNK_SIZE, device=order.device)
+            indices = order[padded_indices.clamp(max=count - 1)]
+            block = {name: values[indices].detach().float() for name, values in gaussians.items()}
+            colors = block["shs_0"].reshape(-1, 3) * SH_C0 + 0.5
+            alphas = torch.sigmoid(block["opacities"].reshape(-1, 1))
+
+            ranges = [_get_chunk_ranges(block["means"]), _get_chunk_ranges(block["scales"]), _get_chunk_ranges(colors)]
+            positions = _quantize(block["means"], *_expand_chunk_ranges(*ranges[0], len(indices)), _POSITION_BITS)
+            scales = _quantize(block["scales"], *_expand_chunk_ranges(*ranges[1], len(indices)), _SCALE_BITS)
+            colors = _quantize(colors, *_expand_chunk_ranges(*ranges[2], len(indices)), _COLOR_BITS[:3])
+            alphas = _quantize(alphas, torch.tensor(0.0), torch.tensor(1.0), _COLOR_BITS[3:])
+            vertices = torch.stack(
+                [
+                    _pack(positions, _POSITION_BITS),
+                    _encode_rotations(block["quats"]),
+                    _pack(scales, _SCALE_BITS),
+                    _pack(torch.cat([colors, alphas], dim=-1), _COLOR_BITS),
+                ],
+                dim=-1,
+            )
+
+            if has_sh:
+                # transpose(1, 2) matches the coefficient order of the full precision export
+                shs_rest = block["shs_rest"].transpose(1, 2).reshape(len(indices), -1)
+                ranges.append(_get_chunk_ranges(shs_rest, per_dim=False))
+                shs_rest = _quantize(shs_rest, *_expand_chunk_ranges(*ranges[3], len(indices)), (_SH_BITS,))
+                ply_file.seek(sh_offset + start * num_sh)
+                shs_rest[:block_count].to(torch.uint8).cpu().numpy().tofile(ply_file)
+
+            chunks = torch.cat([bound for low_high in ranges for bound in low_high], dim=-1)
+            ply_file.seek(chunk_offset + first_chunk * num_chunk_properties * 4)
+            chunks.cpu().numpy().astype(PLY_PROPERTY_DTYPES["float"]).tofile(ply_file)
+            ply_file.seek(vertex_offset + start * len(_VERTEX_PROPERTIES) * 4)
+            vertices[:block_count].cpu().numpy().astype(PLY_PROPERTY_DTYPES["uint"]).tofile(ply_file)
+
+
+def read_ply_header(ply_file: BinaryIO) -> List[Tuple[str, int, np.dtype]]:
+    """Reads the header of a binary little endian PLY file and leaves the file at the start of the data.
+
+    Returns:
+        The name, the number of records and the dtype of the records of each element, in file order.
+    """
+    if ply_file.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    elements: List[Tuple[str, int, List[Tuple[str, str]]]] = []
+    for line in iter(ply_file.readline, b""):
+        words = line.decode().split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            return [(name, count, np.dtype(properties)) for name, count, properties in elements]
+        if words[0] == "format" and words[1] != "binary_little_endian":
+            raise ValueError(f"Unsupported PLY format {words[1]}")
+        if words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                raise ValueError("PLY list properties are not supported")
+            elements[-1][2].append((words[2], PLY_PROPERTY_DTYPES[words[1]]))
+    raise ValueError("PLY header is not terminated")
+
+
+def read_ply(filename: Path) -> Dict[str, np.ndarray]:
+    """Reads every element of a binary little endian PLY file into a structured array."""
+    with open(filename, "rb") as ply_file:
+        elements = read_ply_header(ply_file)
+        return {
+            name: np.frombuffer(ply_file.read(count * dtype.itemsize), dtype=dtype, count=count)
+            for name, count, dtype in elements
+        }
+
+
+def _decode_block(chunks: np.ndarray, vertices: np.ndarray, shs_rest: np.ndarray) -> Dict[str, Tensor]:
+    """Decodes the Gaussians of consecutive chunks."""
+    count = len(vertices)
+    chunks = torch.from_numpy(np.stack([chunks[name] for name in chunks.dtype.names], axis=-1))
+    vertices = torch.from_numpy(np.stack([vertices[name] for name in _VERTEX_PROPERTIES], axis=-1).astype(np.int64))
+    ranges = [_expand_chunk_ranges(*chunks[:, 6 * i : 6 * i + 6].split(3, dim=-1), count) for i in range(3)]
+    colors = _unpack(vertices[:, 3], _COLOR_BITS)
+    gaussians = {
+        "means": _dequantize(_unpack(vertices[:, 0], _POSITION_BITS), *ranges[0], _POSITION_BITS),
+        "scales": _dequantize(_unpack(vertices[:, 2], _SCALE_BITS), *ranges[1], _SCALE_BITS),
+        "quats": _decode_rotations(vertices[:, 1]),
+        "opacities": torch.logit(
+            _dequantize(colors[:, 3:], torch.tensor(0.0), torch.tensor(1.0), _COLOR_BITS[3:]), 1e-6
+        ),
+        "shs_0": (_dequantize(colors[:, :3], *ranges[2], _COLOR_BITS[:3]) - 0.5) / SH_C0,
+    }
+    if shs_rest.dtype.names:
+        shs_rest = torch.from_numpy(np.stack([shs_rest[name] for name in shs_rest.dtype.names], axis=-1))
+        shs_rest = _dequantize(shs_rest, *_expand_chunk_ranges(*chunks[:, 18:20].split(1, dim=-1), count), (_SH_BITS,))
+        gaussians["shs_rest"] = shs_rest.reshape(count, 3, -1).transpose(1, 2).contiguous()
+    return gaussians
+
+
+def iter_compressed_splat(filename: Path, chunks_per_block: int = 4096) -> Iterator[Dict[str, Tensor]]:
+    """Decodes a compressed PLY file a block of chunks at a time.
+
+    Args:
+        filename: file written by :func:`write_compressed_splat`
+        chunks_per_block: number of chunks decoded at once, bounds the memory used
+
+    Yields:
+        The Gaussians of each block on the CPU, with the keys and layouts taken by :func:`write_compressed_splat`.
+    """
+    with open(filename, "rb") as ply_file:
+        elements = {name: (count, dtype) for name, count, dtype in read_ply_header(ply_file)}
+        offsets = {}
+        offset = ply_file.tell()
+        for name, (count, dtype) in elements.items():
+            offsets[name] = offset
+            offset += count * dtype.itemsize
+        if "chunk" not in elements or "vertex" not in elements or elements["vertex"][1].names != _VERTEX_PROPERTIES:
+            raise ValueError(f"{filename} is not a compressed splat")
+        num_chunks, chunk_dtype = elements["chunk"]
+        count, vertex_dtype = elements["vertex"]
+        sh_dtype = elements["sh"][1] if "sh" in elements else np.dtype([])
+
+        def read_records(name: str, dtype: np.dtype, first: int, num: int) -> np.ndarray:
+            ply_file.seek(offsets[name] + first * dtype.itemsize)
+            return np.frombuffer(ply_file.read(num * dtype.itemsize), dtype=dtype, count=num)
+
+        for first_chunk in range(0, num_chunks, chunks_per_block):
+            block_chunks = min(chunks_per_block, num_chunks - first_chunk)
+            start = first_chunk * CHUNK_SIZE
+            block_count = min(block_chunks * CHUNK_SIZE, count - start)
+            yield _decode_block(
+                read_records("chunk", chunk_dtype, first_chunk, block_chunks),
+                read_records("vertex", vertex_dtype, start, block_count),
+                read_records("sh", sh_dtype, start, block_count) if "sh" in elements else np.empty(0, sh_dtype),
+            )
+
+
+def read_compressed_splat(filename: Path) -> Dict[str, Tensor]:
+    """Decodes all Gaussians of a compressed PLY file, see :func:`iter_compressed_splat`."""
+    blocks = list(iter_compressed_splat(filename))
+    return {name: torch.cat([block[name] for block in blocks]) for name in blocks[0]}
+
+
+def load_gaussians(model: SplatfactoModel, gaussians: Dict[str, Tensor]) -> None:
+    """Replaces the Gaussians of a model with Gaussians in the layout taken by :func:`write_compressed_splat`.
+
+    Args:
+        model: model to load the Gaussians into
+        gaussians: Gaussians to load, e.g. decoded by :func:`read_compressed_splat`. Missing "shs_rest" are set to zero.
+    """
+    shs_0 = gaussians["shs_0"]
+    features_rest = gaussians.get("shs_rest", torch.zeros((len(shs_0), *model.shs_rest.shape[1:])))
+    state = {
+        "gauss_params.means": gaussians["means"],
+        "gauss_params.scales": gaussians["scales"],
+        "gauss_params.quats": gaussians["quats"],
+        "gauss_params.opacities": gaussians["opacities"],
+        # models without higher order spherical harmonics store the logits of the colors
+        "gauss_params.features_dc": shs_0 if model.config.sh_degree > 0 else torch.logit(shs_0 * SH_C0 + 0.5, 1e-6),
+        "gauss_params.features_rest": features_rest,
+    }
+    model.load_state_dict(state, strict=False)
@@ -18,6 +18,8 @@ TSDF utils.
 
 from __future__ import annotations
 
+import itertools
+import math
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import List, Optional, Tuple, Union
@@ -26,7 +28,7 @@ import numpy as np
 import pymeshlab
 import torch
 import torch.nn.functional as F
-from jaxtyping import Bool, Float
+from jaxtyping import Bool, Float, Int
 from skimage import measure
 from torch import Tensor
 
@@ -274,6 +276,358 @@ class TSDF:
                 ) / total_weights[:, None]
 
 
+class SparseTSDF:
+    """
+    Class for creating TSDFs that only store the voxels near observed surfaces.
+
+    The voxels are grouped into cubic blocks, and a block is only allocated once a depth image sees a surface within
+    the truncation distance of it. Blocks are stored in the order they are allocated and looked up through their sorted
+    keys. Integration and mesh extraction go over the allocated blocks a chunk at a time, so memory and time grow with
+    the area of the observed surfaces instead of the volume of the bounding box.
+
+    Args:
+        origin: Origin of the TSDF [xmin, ymin, zmin].
+        voxel_size: Size of each voxel in the TSDF. [x, y, z] size.
+        volume_dims: Number of voxels along each axis, blocks are only allocated inside of this volume.
+        block_size: Number of voxels along each side of a block.
+        truncation_margin: Margin for truncation.
+    """
+
+    def __init__(
+        self,
+        origin: Float[Tensor, "3"],
+        voxel_size: Float[Tensor, "3"],
+        volume_dims: Int[Tensor, "3"],
+        block_size: int = 8,
+        truncation_margin: float = 5.0,
+    ) -> None:
+        self.origin = origin
+        self.voxel_size = voxel_size
+        self.block_size = block_size
+        self.truncation_margin = truncation_margin
+        self.grid_dims = torch.div(volume_dims + block_size - 1, block_size, rounding_mode="floor").to(origin.device)
+        """Number of blocks along each axis."""
+        self.block_coords = torch.empty((0, 3), dtype=torch.long, device=origin.device)
+        """Coordinates of each allocated block, in blocks from the origin."""
+        self.sorted_keys = torch.empty(0, dtype=torch.long, device=origin.device)
+        """Sorted keys of the allocated blocks."""
+        self.sorted_blocks = torch.empty(0, dtype=torch.long, device=origin.device)
+        """Index of the block of each sorted key."""
+        # storage grows by doubling, only the first len(block_coords) blocks are allocated
+        self.values = torch.empty((0,) + (block_size,) * 3, device=origin.device)
+        self.weights = torch.empty((0,) + (block_size,) * 3, device=origin.device)
+        self.colors = torch.empty((0,) + (block_size,) * 3 + (3,), device=origin.device)
+
+    @staticmethod
+    def from_aabb(aabb: Float[Tensor, "2 3"], volume_dims: Int[Tensor, "3"], block_size: int = 8) -> SparseTSDF:
+        """Returns an empty sparse TSDF with the voxels of a dense TSDF of the same bounding box and dimensions.
+
+        Args:
+            aabb: The axis-aligned bounding box with shape [[xmin, ymin, zmin], [xmax, ymax, zmax]].
+            volume_dims: The volume dimensions with shape [xdim, ydim, zdim].
+            block_size: Number of voxels along each side of a block.
+        """
+        return SparseTSDF(aabb[0], (aabb[1] - aabb[0]) / volume_dims, volume_dims, block_size)
+
+    def to(self, device: TORCH_DEVICE):
+        """Move the tensors to the specified device.
+
+        Args:
+            device: The device to move the tensors to. E.g., "cuda:0" or "cpu".
+        """
+        for name in ("origin", "voxel_size", "grid_dims", "block_coords", "sorted_keys", "sorted_blocks"):
+            setattr(self, name, getattr(self, name).to(device))
+        self.values = self.values.to(device)
+        self.weights = self.weights.to(device)
+        self.colors = self.colors.to(device)
+        return self
+
+    @property
+    def device(self) -> TORCH_DEVICE:
+        """Returns the device that the blocks are on."""
+        return self.block_coords.device
+
+    @property
+    def truncation(self) -> float:
+        """Returns the truncation distance."""
+        return self.voxel_size[0].item() * self.truncation_margin
+
+    @property
+    def num_blocks(self) -> int:
+        """Returns the number of allocated blocks."""
+        return len(self.block_coords)
+
+    def _get_keys(self, block_coords: Int[Tensor, "num_blocks 3"]) -> Int[Tensor, "num_blocks"]:
+        """Returns the keys of block coordinates inside of the volume."""
+        return (block_coords[:, 0] * self.grid_dims[1] + block_coords[:, 1]) * self.grid_dims[2] + block_coords[:, 2]
+
+    def _get_block_coords(self, keys: Int[Tensor, "num_blocks"]) -> Int[Tensor, "num_blocks 3"]:
+        """Returns the block coordinates of keys."""
+        return torch.stack(
+            [
+                torch.div(keys, self.grid_dims[1] * self.grid_dims[2], rounding_mode="floor"),
+                torch.div(keys, self.grid_dims[2], rounding_mode="floor") % self.grid_dims[1],
+                keys % self.grid_dims[2],
+            ],
+            dim=-1,
+        )
+
+    def find_blocks(self, block_coords: Int[Tensor, "num_blocks 3"]) -> Int[Tensor, "num_blocks"]:
+        """Returns the index of the block at each of the coordinates, or -1 where no block is allocated."""
+        inside = torch.all((block_coords >= 0) & (block_coords < self.grid_dims), dim=-1)
+        if self.num_blocks == 0:
+            return torch.full_like(inside, -1, dtype=torch.long)
+        keys = self._get_keys(torch.minimum(block_coords.clamp(min=0), self.grid_dims - 1))
+        positions = torch.searchsorted(self.sorted_keys, keys).clamp(max=self.num_blocks - 1)
+        found = inside & (self.sorted_keys[positions] == keys)
+        return torch.where(found, self.sorted_blocks[positions], -1)
+
+    def allocate_blocks(self, points: Float[Tensor, "num_points 3"], chunk_size: int = 1 << 20) -> None:
+        """Allocates the blocks inside of the volume within the truncation distance of surface points.
+
+        Args:
+            points: Observed surface points.
+            chunk_size: Number of points processed at once.
+        """
+        block_extent = self.voxel_size * self.block_size
+        # number of blocks a point reaches along each axis, with a margin for rounding
+        span = math.floor(2 * self.truncation / float(block_extent.min())) + 2
+        ranges = []
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start : start + chunk_size] - self.origin
+            lo = torch.floor((chunk - self.truncation) / block_extent).long().clamp(min=0)
+            hi = torch.minimum(torch.floor((chunk + self.truncation) / block_extent).long(), self.grid_dims - 1)
+            inside = torch.all(lo <= hi, dim=-1)
+            lengths = (hi - lo)[inside]
+            # neighbouring points mostly reach the same blocks, so the ranges are deduplicated by a single key
+            range_keys = self._get_keys(lo[inside]) * span**3 + (lengths[:, 0] * span + lengths[:, 1]) * span
+            ranges.append(torch.unique(range_keys + lengths[:, 2]))
+        ranges = torch.unique(torch.cat(ranges)) if ranges else points.new_empty(0, dtype=torch.long)
+        if len(ranges) == 0:
+            return
+        lo = self._get_block_coords(torch.div(ranges, span**3, rounding_mode="floor"))
+        lengths = torch.stack(
+            [
+                torch.div(ranges, span**2, rounding_mode="floor") % span,
+                torch.div(ranges, span, rounding_mode="floor") % span,
+                ranges % span,
+            ],
+            dim=-1,
+        )
+        offsets = torch.arange(span, device=self.device)
+        offsets = torch.cartesian_prod(offsets, offsets, offsets)
+        new_keys = []
+        ranges_chunk_size = max(1, chunk_size // span**3)
+        for start in range(0, len(ranges), ranges_chunk_size):
+            block_coords = lo[start : start + ranges_chunk_size, None] + offsets
+            block_coords = block_coords[torch.all(offsets <= lengths[start : start + ranges_chunk_size, None], dim=-1)]
+            new_keys.append(self._get_keys(block_coords[self.find_blocks(block_coords) < 0]))
+        new_keys = torch.unique(torch.cat(new_keys))
+        if len(new_keys) == 0:
+            return
+
+        num_blocks = self.num_blocks + len(new_keys)
+        if num_blocks > len(self.values):
+            capacity = max(num_blocks, 2 * len(self.values))
+            grow = capacity - len(self.values)
+            self.values = torch.cat([self.values, -torch.ones((grow,) + self.values.shape[1:], device=self.device)])
+            self.weights = torch.cat([self.weights, torch.zeros((grow,) + self.weights.shape[1:], device=self.device)])
+            self.colors = torch.cat([self.colors, torch.zeros((grow,) + self.colors.shape[1:], device=self.device)])
+        self.block_coords = torch.cat([self.block_coords, self._get_block_coords(new_keys)])
+        self.sorted_keys, self.sorted_blocks = torch.sort(self._get_keys(self.block_coords))
+
+    @staticmethod
+    def backproject_depth(
+        c2w: Float[Tensor, "batch 4 4"],
+        K: Float[Tensor, "batch 3 3"],
+        depth_images: Float[Tensor, "batch 1 height width"],
+    ) -> Float[Tensor, "num_points 3"]:
+        """Returns the world coordinates of the pixels with a positive depth, the depth being the distance along the
+        ray through the pixel center."""
+        height, width = depth_images.shape[-2:]
+        v, u = torch.meshgrid(
+            torch.arange(height, device=K.device) + 0.5, torch.arange(width, device=K.device) + 0.5, indexing="ij"
+        )
+        x = (u[None] - K[:, 0, 2, None, None]) / K[:, 0, 0, None, None]
+        y = (v[None] - K[:, 1, 2, None, None]) / K[:, 1, 1, None, None]
+        # flip the y and z axes from the image to the camera convention
+        directions = F.normalize(torch.stack([x, -y, -torch.ones_like(x)], dim=-1), dim=-1)  # [batch, H, W, 3]
+        cam_points = directions * depth_images[:, 0, ..., None]
+        world_points = torch.einsum("bij,bhwj->bhwi", c2w[:, :3, :3], cam_points) + c2w[:, None, None, :3, 3]
+        return world_points[depth_images[:, 0] > 0]
+
+    def integrate_tsdf(
+        self,
+        c2w: Float[Tensor, "batch 4 4"],
+        K: Float[Tensor, "batch 3 3"],
+        depth_images: Float[Tensor, "batch 1 height width"],
+        color_images: Optional[Float[Tensor, "batch 3 height width"]] = None,
+        mask_images: Optional[Bool[Tensor, "batch 1 height width"]] = None,
+        chunk_size: int = 512,
+    ) -> None:
+        """Integrates a batch of depth images into the TSDF, allocating the blocks near the observed surfaces.
+
+        Args:
+            c2w: The camera extrinsics.
+            K: The camera intrinsics.
+            depth_images: The depth images to integrate.
+            color_images: The color images to integrate.
+            mask_images: The mask images to integrate.
+            chunk_size: Number of blocks integrated at once.
+        """
+
+        if mask_images is not None:
+            raise NotImplementedError("Mask images are not supported yet.")
+
+        self.allocate_blocks(self.backproject_depth(c2w, K, depth_images))
+
+        batch_size = c2w.shape[0]
+        height, width = depth_images.shape[-2:]
+        w2c = torch.inverse(c2w)
+        block_voxels = torch.arange(self.block_size, device=self.device)
+        block_voxels = torch.cartesian_prod(block_voxels, block_voxels, block_voxels)  # [block_size**3, 3]
+        flat_depth_images = depth_images.reshape(batch_size, -1)
+        flat_color_images = color_images.reshape(batch_size, 3, -1) if color_images is not None else None
+
+        for start in range(0, self.num_blocks, chunk_size):
+            # the storage has room for more blocks than are allocated
+            end = min(start + chunk_size, self.num_blocks)
+            voxel_indices = (self.block_coords[start:end, None] * self.block_size + block_voxels).view(-1, 3)
+            voxel_world_coords = self.origin + voxel_indices * self.voxel_size
+            voxel_world_coords = torch.cat([voxel_world_coords, torch.ones_like(voxel_world_coords[:, :1])], dim=-1)
+            voxel_cam_coords = torch.matmul(w2c, voxel_world_coords.T)  # [batch, 4, N]
+
+            # flip the z and y axes
+            voxel_cam_coords[:, 1:3, :] = -voxel_cam_coords[:, 1:3, :]
+
+            # we need the distance of the point to the camera, not the z coordinate
+            voxel_depth = torch.linalg.norm(voxel_cam_coords[:, :3, :], dim=1)  # [batch, N]
+            voxel_cam_coords_z = voxel_cam_coords[:, 2, :]
+            voxel_cam_points = torch.bmm(K, voxel_cam_coords[:, 0:3, :] / voxel_cam_coords_z[:, None])  # [batch, 3, N]
+
+            # look up the pixel containing each projected voxel, like nearest sampling does
+            pixel_x = torch.floor(voxel_cam_points[:, 0, :]).long()
+            pixel_y = torch.floor(voxel_cam_points[:, 1, :]).long()
+            visible = (
+                (voxel_cam_coords_z > 0) & (pixel_x >= 0) & (pixel_x < width) & (pixel_y >= 0) & (pixel_y < height)
+            )
+            pixel_indices = pixel_y.clamp(0, height - 1) * width + pixel_x.clamp(0, width - 1)  # [batch, N]
+            sampled_depth = torch.where(visible, flat_depth_images.gather(1, pixel_indices), 0.0)
+
+            dist = sampled_depth - voxel_depth  # [batch, N]
+            tsdf_values = torch.clamp(dist / self.truncation, min=-1.0, max=1.0)  # [batch, N]
+            valid_points = visible & (sampled_depth > 0) & (dist > -self.truncation)  # [batch, N]
+
+            # views of the storage of the chunk
+            values = self.values[start:end].view(-1)
+            weights = self.weights[start:end].view(-1)
+            colors = self.colors[start:end].view(-1, 3)
+
+            # Sequentially update the TSDF...
+
+            for i in range(batch_size):
+                valid_points_i = valid_points[i]
+
+                # the old values
+                old_weights_i = weights[valid_points_i]
+                total_weights = old_weights_i + 1.0
+
+                values[valid_points_i] = (values[valid_points_i] * old_weights_i + tsdf_values[i][valid_points_i]) / (
+                    total_weights
+                )
+                weights[valid_points_i] = torch.clamp(total_weights, max=1.0)
+
+                if flat_color_images is not None:
+                    new_colors_i = flat_color_images[i][:, pixel_indices[i][valid_points_i]].permute(1, 0)  # [M, 3]
+                    colors[valid_points_i] = (
+                        colors[valid_points_i] * old_weights_i[:, None] + new_colors_i
+                    ) / total_weights[:, None]
+
+    def get_mesh(self, chunk_size: int = 1024) -> Mesh:
+        """Extracts a mesh by running marching cubes on each block, extended by one voxel into its neighbours.
+
+        Only the cells whose eight corners have been observed produce faces, and the vertices shared by neighbouring
+        blocks are merged.
+
+        Args:
+            chunk_size: Number of blocks gathered at once.
+        """
+        size = self.block_size
+        all_vertices, all_faces, all_normals, all_colors = [], [], [], []
+        num_vertices = 0
+        for start in range(0, self.num_blocks, chunk_size):
+            blocks = self.sorted_blocks[start : start + chunk_size]
+            block_coords = self.block_coords[blocks]
+            values = -torch.ones((len(blocks),) + (size + 1,) * 3, device=self.device)
+            weights = torch.zeros((len(blocks),) + (size + 1,) * 3, device=self.device)
+            colors = torch.zeros((len(blocks),) + (size + 1,) * 3 + (3,), device=self.device)
+            for offset in itertools.product((0, 1), repeat=3):
+                neighbors = self.find_blocks(block_coords + torch.tensor(offset, device=self.device))
+                has_neighbor = torch.nonzero(neighbors >= 0).squeeze(-1)
+                # the block fills the first block_size voxels, its neighbours the last voxel along their offset axes
+                target = (has_neighbor,) + tuple(size if d else slice(0, size) for d in offset)
+                source = (neighbors[has_neighbor],) + tuple(0 if d else slice(None) for d in offset)
+                values[target] = self.values[source]
+                weights[target] = self.weights[source]
+                colors[target] = self.colors[source]
+
+            observed = weights > 0
+            cell_observed = observed[:, :-1, :-1, :-1].clone()
+            for offset in itertools.product((0, 1), repeat=3):
+                cell_observed &= observed[:, offset[0] :, offset[1] :, offset[2] :][:, :size, :size, :size]
+            has_surface = (
+                cell_observed.flatten(1).any(dim=1)
+                & (torch.where(observed, values, 1.0).flatten(1).amin(dim=1) < 0)
+                & (torch.where(observed, values, -1.0).flatten(1).amax(dim=1) > 0)
+            )
+
+            values_np = values.clamp(-1, 1).cpu().numpy()
+            cell_observed_np = cell_observed.cpu().numpy()
+            colors_np = colors.cpu().numpy()
+            block_coords_np = block_coords.cpu().numpy()
+            for j in torch.nonzero(has_surface).squeeze(-1).tolist():
+                vertices, faces, normals, _ = measure.marching_cubes(  # type: ignore
+                    values_np[j], level=0, allow_degenerate=False
+                )
+                # keep the faces of fully observed cells, the centroid of a face lies in its cell
+                cells = np.clip(np.floor(vertices[faces].mean(axis=1)).astype(int), 0, size - 1)
+                faces = faces[cell_observed_np[j][cells[:, 0], cells[:, 1], cells[:, 2]]]
+                if len(faces) == 0:
+                    continue
+                vertices_indices = np.round(vertices).astype(int)
+                all_colors.append(colors_np[j][vertices_indices[:, 0], vertices_indices[:, 1], vertices_indices[:, 2]])
+                all_vertices.append(vertices + block_coords_np[j] * size)
+                all_normals.append(normals)
+                all_faces.append(faces + num_vertices)
+                num_vertices += len(vertices)
+
+        if not all_faces:
+            empty = torch.empty((0, 3), device=self.device)
+            return Mesh(vertices=empty, faces=empty.long(), normals=empty, colors=empty)
+
+        # merge the vertices found by both blocks next to a block boundary and drop the vertices of dropped faces
+        vertices = np.concatenate(all_vertices)
+        faces = np.concatenate(all_faces)
+        _, unique_indices, inverse = np.unique(
+            np.round(vertices * 1024).astype(np.int64), axis=0, return_index=True, return_inverse=True
+        )
+        faces = inverse.reshape(-1)[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])]
+        used, faces = np.unique(faces, return_inverse=True)
+        vertex_indices = unique_indices[used]
+
+        # move back to original device
+        vertices = torch.from_numpy(vertices[vertex_indices]).float().to(self.device)
+        faces = torch.from_numpy(faces.reshape(-1, 3)).long().to(self.device)
+        normals = torch.from_numpy(np.concatenate(all_normals)[vertex_indices]).float().to(self.device)
+        colors = torch.from_numpy(np.concatenate(all_colors)[vertex_indices]).float().to(self.device)
+
+        # move vertices back to world space
+        vertices = self.origin.view(1, 3) + vertices * self.voxel_size.view(1, 3)
+
+        return Mesh(vertices=vertices, faces=faces, normals=normals, colors=colors)
+
+
 def export_tsdf_mesh(
     pipeline: Pipeline,
     output_dir: Path,
@@ -287,6 +641,8 @@ def export_tsdf_mesh(
     bounding_box_max: Tuple[float, float, float] = (1.0, 1.0, 1.0),
     refine_mesh_using_initial_aabb_estimate: bool = False,
     refinement_epsilon: float = 1e-2,
+    sparse: bool = False,
+    block_size: int = 8,
 ) -> None:
     """Export a TSDF mesh from a pipeline.
 
@@ -304,6 +660,8 @@ def export_tsdf_mesh(
         refine_mesh_using_initial_aabb_estimate: Whether to refine the TSDF using the initial AABB estimate.
         refinement_epsilon: Epsilon for refining the TSDF. This is the distance in meters that the refined AABB/OBB will
             be expanded by in each direction.
+        sparse: Whether to only allocate the voxels near the observed surfaces, which scales to higher resolutions.
+        block_size: Number of voxels along each side of the blocks of the sparse TSDF.
     """
 
     device = pipeline.device
@@ -322,7 +680,11 @@ def export_tsdf_mesh(
         volume_dims = torch.tensor(resolution)
     else:
         raise ValueError("Resolution must be an int or a list.")
-    tsdf = TSDF.from_aabb(aabb, volume_dims=volume_dims)
+    tsdf: Union[TSDF, SparseTSDF]
+    if sparse:
+        tsdf = SparseTSDF.from_aabb(aabb, volume_dims=volume_dims, block_size=block_size)
+    else:
+        tsdf = TSDF.from_aabb(aabb, volume_dims=volume_dims)
     # move TSDF to device
     tsdf.to(device)
 
@@ -359,6 +721,9 @@ def export_tsdf_mesh(
             color_images=color_images[i : i + batch_size],
         )
 
+    if isinstance(tsdf, SparseTSDF):
+        CONSOLE.print(f"Allocated {tsdf.num_blocks} blocks of {block_size}^3 voxels")
+
     CONSOLE.print("Computing Mesh")
     mesh = tsdf.get_mesh()
 
@@ -369,7 +734,10 @@ def export_tsdf_mesh(
         vertices_min = torch.min(mesh.vertices, dim=0).values - refinement_epsilon
         vertices_max = torch.max(mesh.vertices, dim=0).values + refinement_epsilon
         aabb = torch.stack([vertices_min, vertices_max]).cpu()
-        tsdf = TSDF.from_aabb(aabb, volume_dims=volume_dims)
+        if sparse:
+            tsdf = SparseTSDF.from_aabb(aabb, volume_dims=volume_dims, block_size=block_size)
+        else:
+            tsdf = TSDF.from_aabb(aabb, volume_dims=volume_dims)
         # move TSDF to device
         tsdf.to(device)
 
@@ -386,4 +754,4 @@ def export_tsdf_mesh(
         mesh = tsdf.get_mesh()
 
     CONSOLE.print("Saving TSDF Mesh")
-    tsdf.export_mesh(mesh, filename=str(output_dir / "tsdf_mesh.ply"))
+    TSDF.export_mesh(mesh, filename=str(output_dir / "tsdf_mesh.ply"))
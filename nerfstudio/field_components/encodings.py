@@ -418,47 +418,35 @@ class HashEncoding(Encoding):
         return x
 
     def pytorch_fwd(self, in_tensor: Float[Tensor, "*bs input_dim"]) -> Float[Tensor, "*bs output_dim"]:
-        """Forward pass using pytorch. Significantly slower than TCNN implementation."""
+        """Forward pass using pytorch. Significantly slower than TCNN implementation.
 
-        assert in_tensor.shape[-1] == 3
-        in_tensor = in_tensor[..., None, :]  # [..., 1, 3]
-        scaled = in_tensor * self.scalings.view(-1, 1).to(in_tensor.device)  # [..., L, 3]
-        scaled_c = torch.ceil(scaled).type(torch.int32)
-        scaled_f = torch.floor(scaled).type(torch.int32)
+        All levels and corners are hashed at once and fetched with a single gather. The hash table may be stored in
+        half precision (e.g. for CPU inference), the interpolation is always done in full precision.
+        """
 
+        assert in_tensor.shape[-1] == 3
+        batch_shape = in_tensor.shape[:-1]
+        scaled = in_tensor.reshape(-1, 1, 3) * self.scalings.view(-1, 1).to(in_tensor.device)  # [N, L, 3]
+        scaled_f = torch.floor(scaled)
         offset = scaled - scaled_f
 
-        hashed_0 = self.hash_fn(scaled_c)  # [..., num_levels]
-        hashed_1 = self.hash_fn(torch.cat([scaled_c[..., 0:1], scaled_f[..., 1:2], scaled_c[..., 2:3]], dim=-1))
-        hashed_2 = self.hash_fn(torch.cat([scaled_f[..., 0:1], scaled_f[..., 1:2], scaled_c[..., 2:3]], dim=-1))
-        hashed_3 = self.hash_fn(torch.cat([scaled_f[..., 0:1], scaled_c[..., 1:2], scaled_c[..., 2:3]], dim=-1))
-        hashed_4 = self.hash_fn(torch.cat([scaled_c[..., 0:1], scaled_c[..., 1:2], scaled_f[..., 2:3]], dim=-1))
-        hashed_5 = self.hash_fn(torch.cat([scaled_c[..., 0:1], scaled_f[..., 1:2], scaled_f[..., 2:3]], dim=-1))
-        hashed_6 = self.hash_fn(scaled_f)
-        hashed_7 = self.hash_fn(torch.cat([scaled_f[..., 0:1], scaled_c[..., 1:2], scaled_f[..., 2:3]], dim=-1))
-
-        f_0 = self.hash_table[hashed_0]  # [..., num_levels, features_per_level]
-        f_1 = self.hash_table[hashed_1]
-        f_2 = self.hash_table[hashed_2]
-        f_3 = self.hash_table[hashed_3]
-        f_4 = self.hash_table[hashed_4]
-        f_5 = self.hash_table[hashed_5]
-        f_6 = self.hash_table[hashed_6]
-        f_7 = self.hash_table[hashed_7]
-
-        f_03 = f_0 * offset[..., 0:1] + f_3 * (1 - offset[..., 0:1])
-        f_12 = f_1 * offset[..., 0:1] + f_2 * (1 - offset[..., 0:1])
-        f_56 = f_5 * offset[..., 0:1] + f_6 * (1 - offset[..., 0:1])
-        f_47 = f_4 * offset[..., 0:1] + f_7 * (1 - offset[..., 0:1])
-
-        f0312 = f_03 * offset[..., 1:2] + f_12 * (1 - offset[..., 1:2])
-        f4756 = f_47 * offset[..., 1:2] + f_56 * (1 - offset[..., 1:2])
-
-        encoded_value = f0312 * offset[..., 2:3] + f4756 * (
-            1 - offset[..., 2:3]
-        )  # [..., num_levels, features_per_level]
-
-        return torch.flatten(encoded_value, start_dim=-2, end_dim=-1)  # [..., num_levels * features_per_level]
+        # The hash is a xor of per-axis products, so each corner is a xor of the hashed floor or ceil coordinates.
+        primes = torch.tensor([1, 2654435761, 805459861], device=in_tensor.device)
+        hashed = torch.stack([scaled_f.long() * primes, torch.ceil(scaled).long() * primes], dim=-1)  # [N, L, 3, 2]
+        indices = hashed[..., 0, :, None, None] ^ hashed[..., 1, None, :, None] ^ hashed[..., 2, None, None, :]
+        # equivalent to modulo for power of two table sizes
+        indices = (indices & (self.hash_table_size - 1)) + self.hash_offset.view(-1, 1, 1, 1).to(indices.device)
+
+        features = torch.index_select(self.hash_table, 0, indices.view(-1))
+        features = features.view(*indices.shape[:2], 8, self.features_per_level).to(offset.dtype)  # [N, L, 8, F]
+
+        weights = torch.stack([1 - offset, offset], dim=-1)  # [N, L, 3, 2]
+        corner_weights = (
+            weights[..., 0, :, None, None] * weights[..., 1, None, :, None] * weights[..., 2, None, None, :]
+        )
+        encoded_value = torch.matmul(corner_weights.view(*indices.shape[:2], 1, 8), features)  # [N, L, 1, F]
+
+        return encoded_value.view(*batch_shape, self.num_levels * self.features_per_level)
 
     def forward(self, in_tensor: Float[Tensor, "*bs input_dim"]) -> Float[Tensor, "*bs output_dim"]:
         if self.tcnn_encoding is not None:
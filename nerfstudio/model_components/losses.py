@@ -131,6 +131,23 @@ def interlevel_loss(weights_list, ray_samples_list) -> torch.Tensor:
     return loss_interlevel
 
 
+def pairwise_weighted_distance(
+    u: Float[Tensor, "*bs num_samples"], w: Float[Tensor, "*bs num_samples"]
+) -> Float[Tensor, "*bs"]:
+    """Computes sum_ij w_i w_j |u_i - u_j| in linear time.
+
+    For sorted ``u`` every pair with j < i contributes w_i w_j (u_i - u_j), so the double sum reduces to
+    2 sum_i w_i (u_i W_i - S_i) where W_i and S_i are the exclusive prefix sums of w and w * u.
+
+    Args:
+        u: sample locations, sorted along the last dimension
+        w: sample weights
+    """
+    cum_w = torch.cumsum(w, dim=-1) - w
+    cum_wu = torch.cumsum(w * u, dim=-1) - w * u
+    return 2 * torch.sum(w * (u * cum_w - cum_wu), dim=-1)
+
+
 # Verified
 def lossfun_distortion(t, w):
     """
@@ -138,8 +155,7 @@ def lossfun_distortion(t, w):
     https://github.com/google-research/multinerf/blob/b02228160d3179300c7d499dca28cb9ca3677f32/internal/stepfun.py#L266
     """
     ut = (t[..., 1:] + t[..., :-1]) / 2
-    dut = torch.abs(ut[..., :, None] - ut[..., None, :])
-    loss_inter = torch.sum(w * torch.sum(w[..., None, :] * dut, dim=-1), dim=-1)
+    loss_inter = pairwise_weighted_distance(ut, w)
 
     loss_intra = torch.sum(w**2 * (t[..., 1:] - t[..., :-1]), dim=-1) / 3
 
@@ -189,10 +205,7 @@ def nerfstudio_distortion_loss(
     assert starts is not None and ends is not None, "Ray samples must have spacing starts and ends"
     midpoints = (starts + ends) / 2.0  # (..., num_samples, 1)
 
-    loss = (
-        weights * weights[..., None, :, 0] * torch.abs(midpoints - midpoints[..., None, :, 0])
-    )  # (..., num_samples, num_samples)
-    loss = torch.sum(loss, dim=(-1, -2))[..., None]  # (..., num_samples)
+    loss = pairwise_weighted_distance(midpoints[..., 0], weights[..., 0])[..., None]  # (..., 1)
     loss = loss + 1 / 3.0 * torch.sum(weights**2 * (ends - starts), dim=-2)
 
     return loss
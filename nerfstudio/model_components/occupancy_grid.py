@@ -0,0 +1,200 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pure PyTorch occupancy grid used to skip empty space before querying fields.
+"""
+
+from typing import Callable, Dict, Optional
+
+import torch
+from jaxtyping import Bool, Float
+from torch import Tensor, nn
+
+from nerfstudio.cameras.rays import RaySamples
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.field_components.field_heads import FieldHeadNames
+from nerfstudio.field_components.spatial_distortions import SceneContraction, SpatialDistortion
+
+
+class OccupancyGrid(nn.Module):
+    """Binary occupancy grid maintained from a density field during training.
+
+    The grid covers the same normalized [0, 1]^3 domain as the hash-grid fields: the scene aabb for bounded scenes
+    or the contracted [-2, 2]^3 cube when a scene contraction is used. Unlike ``nerfacc.OccGridEstimator`` it does
+    not require CUDA, so it can be used to skip empty space on CPU as well.
+
+    Each update only evaluates one random position per cell, which can miss the part of a cell that is occupied. The
+    binary grid is therefore dilated by one cell: a cell is marked occupied if a sample in it or in any of its
+    neighbours found density. The cells at the boundary of a structure that is larger than a cell stay occupied,
+    but structures thinner than a cell can still be missed until a later update hits them.
+
+    Args:
+        aabb: parameters of scene aabb bounds
+        resolution: number of cells along each axis of the grid
+        spatial_distortion: spatial distortion applied by the field, only SceneContraction is supported
+        density_threshold: cells whose decayed density falls below this value are marked empty
+        ema_decay: decay applied to the stored density of a cell every time it is re-evaluated
+        eval_chunk_size: number of cells to evaluate with the density function at once
+    """
+
+    aabb: Tensor
+    density: Tensor
+    binary: Tensor
+
+    def __init__(
+        self,
+        aabb: Tensor,
+        resolution: int = 64,
+        spatial_distortion: Optional[SpatialDistortion] = None,
+        density_threshold: float = 0.01,
+        ema_decay: float = 0.95,
+        eval_chunk_size: int = 1 << 16,
+    ) -> None:
+        super().__init__()
+        if spatial_distortion is not None and not isinstance(spatial_distortion, SceneContraction):
+            raise TypeError("OccupancyGrid only supports SceneContraction as spatial distortion.")
+        self.resolution = resolution
+        self.spatial_distortion = spatial_distortion
+        self.density_threshold = density_threshold
+        self.ema_decay = ema_decay
+        self.eval_chunk_size = eval_chunk_size
+        self.num_cells = resolution**3
+
+        self.register_buffer("aabb", aabb.clone())
+        self.register_buffer("density", torch.zeros(self.num_cells))
+        # every cell starts occupied so that nothing is skipped until the first update
+        self.register_buffer("binary", torch.ones((resolution, resolution, resolution), dtype=torch.bool))
+        self._num_updates = 0
+
+    def normalize_positions(self, positions: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 3"]:
+        """Maps world positions into the [0, 1]^3 domain of the grid."""
+        if self.spatial_distortion is not None:
+            return (self.spatial_distortion(positions) + 2.0) / 4.0
+        return SceneBox.get_normalized_positions(positions, self.aabb)
+
+    def unnormalize_positions(self, positions: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 3"]:
+        """Inverse of :meth:`normalize_positions`."""
+        if self.spatial_distortion is None:
+            return positions * (self.aabb[1] - self.aabb[0]) + self.aabb[0]
+        assert isinstance(self.spatial_distortion, SceneContraction)
+        contracted = positions * 4.0 - 2.0
+        mag = torch.linalg.norm(contracted, ord=self.spatial_distortion.order, dim=-1)[..., None]
+        # invert f(x) = (2 - 1 / ||x||) x / ||x|| for points outside the unit ball, clamping at the far boundary
+        uncontracted_mag = 1.0 / torch.clamp(2.0 - mag, min=1e-6)
+        return torch.where(mag < 1, contracted, contracted / mag.clamp(min=1e-6) * uncontracted_mag)
+
+    def get_occupancy(self, positions: Float[Tensor, "*bs 3"]) -> Bool[Tensor, "*bs"]:
+        """Returns whether the cells containing the given world positions are occupied.
+
+        Positions outside of the grid are reported as empty, since the fields clamp their density to zero there.
+        """
+        normalized = self.normalize_positions(positions)
+        inside = ((normalized >= 0.0) & (normalized < 1.0)).all(dim=-1)
+        indices = torch.clamp((normalized * self.resolution).long(), 0, self.resolution - 1)
+        flat_indices = (indices[..., 0] * self.resolution + indices[..., 1]) * self.resolution + indices[..., 2]
+        return self.binary.view(-1)[flat_indices] & inside
+
+    def _sample_cells(self) -> Tensor:
+        """Cells to re-evaluate: all of them on the first update, then random cells plus a subset of occupied ones."""
+        device = self.density.device
+        if self._num_updates == 0:
+            return torch.arange(self.num_cells, device=device)
+        num_samples = self.num_cells // 4
+        uniform_cells = torch.randint(self.num_cells, (num_samples,), device=device)
+        occupied_cells = torch.nonzero(self.binary.view(-1))[:, 0]
+        if len(occupied_cells) > num_samples:
+            occupied_cells = occupied_cells[torch.randint(len(occupied_cells), (num_samples,), device=device)]
+        return torch.cat([uniform_cells, occupied_cells])
+
+    @torch.no_grad()
+    def update(self, density_fn: Callable[[Tensor], Tensor]) -> None:
+        """Re-evaluates a subset of the cells with the density function and refreshes the binary grid.
+
+        Args:
+            density_fn: function mapping world positions to densities
+        """
+        cells = self._sample_cells()
+        coords = torch.stack(
+            [
+                cells // (self.resolution * self.resolution),
+                (cells // self.resolution) % self.resolution,
+                cells % self.resolution,
+            ],
+            dim=-1,
+        )
+        # jitter samples within each cell so that thin structures are eventually hit
+        positions = self.unnormalize_positions(
+            (coords + torch.rand_like(coords, dtype=torch.float32)) / self.resolution
+        )
+        density = torch.cat(
+            [
+                density_fn(positions[i : i + self.eval_chunk_size]).view(-1).to(self.density)
+                for i in range(0, len(positions), self.eval_chunk_size)
+            ]
+        )
+        # duplicated cells keep an arbitrary sample, the others are evaluated again by later updates
+        self.density[cells] = torch.maximum(self.density[cells] * self.ema_decay, density)
+        threshold = torch.clamp(self.density.mean(), max=self.density_threshold)
+        binary = (self.density > threshold).view(1, 1, *self.binary.shape).float()
+        # dilate, the neighbours of a cell with density can be partially occupied even if their sample missed it
+        self.binary.copy_(nn.functional.max_pool3d(binary, kernel_size=3, stride=1, padding=1)[0, 0] > 0)
+        self._num_updates += 1
+
+    def masked_density_fn(self, density_fn: Callable[[Tensor], Tensor], positions: Float[Tensor, "*bs 3"]) -> Tensor:
+        """Evaluates the density function only at positions that fall into occupied cells.
+
+        Args:
+            density_fn: function mapping world positions to densities
+            positions: positions to evaluate
+
+        Returns:
+            Densities with zeros at empty positions.
+        """
+        occupied = self.get_occupancy(positions)
+        density = torch.zeros((*positions.shape[:-1], 1), dtype=positions.dtype, device=positions.device)
+        if occupied.any():
+            density[occupied] = density_fn(positions[occupied]).to(density)
+        return density
+
+    def masked_field_forward(
+        self, field: Callable[..., Dict[FieldHeadNames, Tensor]], ray_samples: RaySamples, **kwargs
+    ) -> Dict[FieldHeadNames, Tensor]:
+        """Evaluates a field only at ray samples that fall into occupied cells.
+
+        Args:
+            field: field to evaluate, called as ``field(ray_samples, **kwargs)``
+            ray_samples: samples to evaluate the field on
+
+        Returns:
+            Field outputs scattered back to the shape of ``ray_samples``, with zeros at empty samples.
+        """
+        occupied = self.get_occupancy(ray_samples.frustums.get_positions())
+        if not occupied.any():
+            # fields expect a non-empty batch, so always evaluate at least one sample
+            occupied.view(-1)[0] = True
+        if occupied.all():
+            return field(ray_samples, **kwargs)
+        occupied_outputs = field(ray_samples[occupied], **kwargs)
+        outputs = {}
+        for name, value in occupied_outputs.items():
+            output = torch.zeros((*ray_samples.shape, value.shape[-1]), dtype=value.dtype, device=value.device)
+            output[occupied] = value.view(-1, value.shape[-1])
+            outputs[name] = output
+        return outputs
+
+    @property
+    def occupancy_ratio(self) -> float:
+        """Fraction of cells marked as occupied."""
+        return self.binary.float().mean().item()
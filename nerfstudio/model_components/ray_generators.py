@@ -21,6 +21,7 @@ from torch import Tensor, nn
 
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.utils import profiler
 
 
 class RayGenerator(nn.Module):
@@ -38,6 +39,7 @@ class RayGenerator(nn.Module):
         self.cameras = cameras
         self.register_buffer("image_coords", cameras.get_image_coords(), persistent=False)
 
+    @profiler.time_function
     def forward(self, ray_indices: Int[Tensor, "num_rays 3"]) -> RayBundle:
         """Index into the cameras to generate the rays.
 
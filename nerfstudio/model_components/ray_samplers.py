@@ -16,8 +16,9 @@
 Collection of sampling strategies
 """
 
+import math
 from abc import abstractmethod
-from typing import Any, Callable, List, Optional, Protocol, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple, TypeVar, Union
 
 import torch
 from jaxtyping import Float
@@ -25,6 +26,7 @@ from nerfacc import OccGridEstimator
 from torch import Tensor, nn
 
 from nerfstudio.cameras.rays import Frustums, RayBundle, RaySamples
+from nerfstudio.model_components.occupancy_grid import OccupancyGrid
 
 
 class Sampler(nn.Module):
@@ -519,6 +521,57 @@ class VolumetricSampler(Sampler):
         return ray_samples, ray_indices
 
 
+KeyT = TypeVar("KeyT")
+
+
+@torch.no_grad()
+def evaluate_front_to_back(
+    ray_samples: RaySamples,
+    eval_fn: Callable[[RaySamples], Dict[KeyT, Tensor]],
+    density_key: KeyT,
+    opacity_threshold: float,
+    segment_size: int = 16,
+) -> Dict[KeyT, Tensor]:
+    """Evaluates samples front-to-back in segments, skipping rays whose accumulated opacity passes a threshold.
+
+    Samples behind the termination point are filled with zeros. Their weights would be at most
+    ``1 - opacity_threshold``, so this is only meant for inference.
+
+    Args:
+        ray_samples: Samples to evaluate, of shape [num_rays, num_samples]
+        eval_fn: Function evaluating a subset of the samples, returning tensors with the shape of its input
+        density_key: Key of the density in the outputs of ``eval_fn``
+        opacity_threshold: Rays are terminated once their accumulated opacity exceeds this value
+        segment_size: Number of samples per ray to evaluate at once
+
+    Returns:
+        Outputs of ``eval_fn`` for all samples.
+    """
+    assert ray_samples.deltas is not None
+    num_rays, num_samples = ray_samples.shape
+    device = ray_samples.deltas.device
+    max_optical_depth = -math.log(max(1.0 - opacity_threshold, 1e-10))
+    optical_depth = torch.zeros(num_rays, device=device)
+    alive = torch.arange(num_rays, device=device)
+    outputs: Dict[KeyT, Tensor] = {}
+    for start in range(0, num_samples, segment_size):
+        end = min(start + segment_size, num_samples)
+        segment = ray_samples[alive, start:end]
+        segment_outputs = eval_fn(segment)
+        for key, value in segment_outputs.items():
+            if key not in outputs:
+                outputs[key] = torch.zeros(
+                    (num_rays, num_samples, value.shape[-1]), dtype=value.dtype, device=value.device
+                )
+            outputs[key][alive, start:end] = value
+        assert segment.deltas is not None
+        optical_depth[alive] += (segment_outputs[density_key] * segment.deltas).sum(dim=(-2, -1))
+        alive = alive[optical_depth[alive] < max_optical_depth]
+        if len(alive) == 0:
+            break
+    return outputs
+
+
 class ProposalNetworkSampler(Sampler):
     """Sampler that uses a proposal network to generate samples.
 
@@ -570,24 +623,64 @@ class ProposalNetworkSampler(Sampler):
 
     def step_cb(self, step):
         """Callback to register a training step has passed. This is used to keep track of the sampling schedule"""
+        if self._is_update_step():
+            self._steps_since_update = 0
         self._step = step
         self._steps_since_update += 1
 
+    def _is_update_step(self) -> bool:
+        """Whether the proposal networks get gradients in the current training step.
+
+        The decision only changes in step_cb, so every micro-batch of a step makes the same one.
+        """
+        # always update on the first steps or the inf check in grad scaling crashes
+        return bool(self._steps_since_update > self.update_sched(self._step) or self._step < 10)
+
     def generate_ray_samples(
         self,
         ray_bundle: Optional[RayBundle] = None,
         density_fns: Optional[List[Callable]] = None,
+        occupancy_grid: Optional[OccupancyGrid] = None,
+        termination_threshold: Optional[float] = None,
+        termination_segment_size: int = 16,
     ) -> Tuple[RaySamples, List, List]:
+        """Generates ray samples with the proposal networks.
+
+        Args:
+            ray_bundle: Rays to generate samples for
+            density_fns: Density functions of the proposal networks
+            occupancy_grid: If provided, the proposal networks are only queried at samples in occupied cells and
+                empty samples get zero density.
+            termination_threshold: If provided and not training, the proposal networks are queried front-to-back
+                and rays stop being queried once their accumulated opacity passes this threshold.
+            termination_segment_size: Number of samples per ray to query at once when terminating rays early.
+        """
         assert ray_bundle is not None
         assert density_fns is not None
 
+        def positions_density_fn(i_level: int, positions: Tensor) -> Tensor:
+            if occupancy_grid is None:
+                return density_fns[i_level](positions)
+            return occupancy_grid.masked_density_fn(density_fns[i_level], positions)
+
+        def density_fn(i_level: int, ray_samples: RaySamples) -> Tensor:
+            if termination_threshold is None or self.training:
+                return positions_density_fn(i_level, ray_samples.frustums.get_positions())
+            return evaluate_front_to_back(
+                ray_samples,
+                lambda samples: {"density": positions_density_fn(i_level, samples.frustums.get_positions())},
+                density_key="density",
+                opacity_threshold=termination_threshold,
+                segment_size=termination_segment_size,
+            )["density"]
+
         weights_list = []
         ray_samples_list = []
 
         n = self.num_proposal_network_iterations
         weights = None
         ray_samples = None
-        updated = self._steps_since_update > self.update_sched(self._step) or self._step < 10
+        updated = self._is_update_step()
         for i_level in range(n + 1):
             is_prop = i_level < n
             num_samples = self.num_proposal_samples_per_ray[i_level] if is_prop else self.num_nerf_samples_per_ray
@@ -602,16 +695,13 @@ class ProposalNetworkSampler(Sampler):
                 ray_samples = self.pdf_sampler(ray_bundle, ray_samples, annealed_weights, num_samples=num_samples)
             if is_prop:
                 if updated:
-                    # always update on the first step or the inf check in grad scaling crashes
-                    density = density_fns[i_level](ray_samples.frustums.get_positions())
+                    density = density_fn(i_level, ray_samples)
                 else:
                     with torch.no_grad():
-                        density = density_fns[i_level](ray_samples.frustums.get_positions())
+                        density = density_fn(i_level, ray_samples)
                 weights = ray_samples.get_weights(density)
                 weights_list.append(weights)  # (num_rays, num_samples)
                 ray_samples_list.append(ray_samples)
-        if updated:
-            self._steps_since_update = 0
 
         assert ray_samples is not None
         return ray_samples, weights_list, ray_samples_list
@@ -34,6 +34,8 @@ from nerfstudio.configs.config_utils import to_immutable_dict
 from nerfstudio.data.scene_box import OrientedBox, SceneBox
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.model_components.scene_colliders import NearFarCollider
+from nerfstudio.utils.memory import get_available_memory, track_peak_memory
+from nerfstudio.utils.rich_utils import CONSOLE
 
 
 # Model related configs
@@ -51,6 +53,12 @@ class ModelConfig(InstantiateConfig):
     """parameters to instantiate density field with"""
     eval_num_rays_per_chunk: int = 4096
     """specifies number of rays per chunk during eval"""
+    eval_num_rays_per_chunk_auto: bool = False
+    """CUDA only. If True, the first chunk rendered at each new resolution uses eval_num_rays_per_chunk rays to
+    measure the peak memory per ray, and the remaining chunks use the largest size that fits eval_memory_budget_gb.
+    On other devices this has no effect and eval_num_rays_per_chunk is always used."""
+    eval_memory_budget_gb: Optional[float] = None
+    """Memory budget for automatic eval chunk sizing. Defaults to half of the free memory of the CUDA device."""
     prompt: Optional[str] = None
     """A prompt to be used in text to NeRF models"""
 
@@ -81,11 +89,14 @@ class Model(nn.Module):
         self.num_train_data = num_train_data
         self.kwargs = kwargs
         self.collider = None
+        # chunk sizes picked by eval_num_rays_per_chunk_auto, keyed by image resolution
+        self.auto_eval_num_rays_per_chunk: Dict[Tuple[int, int], int] = {}
 
         self.populate_modules()  # populate the modules
         self.callbacks = None
-        # to keep track of which device the nn.Module is on
-        self.device_indicator_param = nn.Parameter(torch.empty(0))
+        # to keep track of which device the nn.Module is on, it never receives a gradient so that DDP does not need
+        # to search for unused parameters because of it
+        self.device_indicator_param = nn.Parameter(torch.empty(0), requires_grad=False)
 
     @property
     def device(self):
@@ -174,6 +185,26 @@ class Model(nn.Module):
             camera.generate_rays(camera_indices=0, keep_shape=True, obb_box=obb_box)
         )
 
+    def get_num_cameras_per_batch(self, camera: Cameras) -> int:
+        """Returns how many cameras like ``camera`` to pass to one call of :meth:`get_outputs_for_cameras`.
+        Ray-based models render one camera at a time."""
+        return 1
+
+    @torch.no_grad()
+    def get_outputs_for_cameras(
+        self, cameras: List[Cameras], obb_box: Optional[OrientedBox] = None
+    ) -> List[Dict[str, torch.Tensor]]:
+        """Renders several cameras and returns the outputs of each of them.
+
+        Models that render multiple views at once, e.g. with batched rasterization, override this together with
+        :meth:`get_num_cameras_per_batch`.
+
+        Args:
+            cameras: cameras to render, each holding a single camera
+            obb_box: optional box to crop the scene to
+        """
+        return [self.get_outputs_for_camera(camera, obb_box=obb_box) for camera in cameras]
+
     @torch.no_grad()
     def get_outputs_for_camera_ray_bundle(self, camera_ray_bundle: RayBundle) -> Dict[str, torch.Tensor]:
         """Takes in camera parameters and computes the output of the model.
@@ -186,9 +217,8 @@ class Model(nn.Module):
         image_height, image_width = camera_ray_bundle.origins.shape[:2]
         num_rays = len(camera_ray_bundle)
         outputs_lists = defaultdict(list)
-        for i in range(0, num_rays, num_rays_per_chunk):
-            start_idx = i
-            end_idx = i + num_rays_per_chunk
+
+        def render_chunk(start_idx: int, end_idx: int) -> None:
             ray_bundle = camera_ray_bundle.get_row_major_sliced_ray_bundle(start_idx, end_idx)
             # move the chunk inputs to the model device
             ray_bundle = ray_bundle.to(self.device)
@@ -199,11 +229,46 @@ class Model(nn.Module):
                     continue
                 # move the chunk outputs from the model device back to the device of the inputs.
                 outputs_lists[output_name].append(output.to(input_device))
+
+        start_idx = 0
+        if self.config.eval_num_rays_per_chunk_auto and num_rays > 0:
+            resolution = (image_height, image_width)
+            if resolution not in self.auto_eval_num_rays_per_chunk:
+                start_idx = min(num_rays_per_chunk, num_rays)
+                with track_peak_memory(self.device) as peak_memory:
+                    render_chunk(0, start_idx)
+                if peak_memory.nbytes is None:
+                    # the device does not report its peak memory, keep the configured chunk size
+                    self.auto_eval_num_rays_per_chunk[resolution] = num_rays_per_chunk
+                else:
+                    self.auto_eval_num_rays_per_chunk[resolution] = self.get_auto_eval_num_rays_per_chunk(
+                        peak_memory.nbytes / start_idx
+                    )
+                    CONSOLE.log(
+                        f"Rendering {image_width}x{image_height} images with "
+                        f"{self.auto_eval_num_rays_per_chunk[resolution]} rays per chunk"
+                    )
+            num_rays_per_chunk = self.auto_eval_num_rays_per_chunk[resolution]
+
+        for i in range(start_idx, num_rays, num_rays_per_chunk):
+            render_chunk(i, i + num_rays_per_chunk)
         outputs = {}
         for output_name, outputs_list in outputs_lists.items():
             outputs[output_name] = torch.cat(outputs_list).view(image_height, image_width, -1)  # type: ignore
         return outputs
 
+    def get_auto_eval_num_rays_per_chunk(self, bytes_per_ray: float) -> int:
+        """Returns the largest number of rays per chunk that fits the eval memory budget.
+
+        Args:
+            bytes_per_ray: measured peak memory per rendered ray
+        """
+        if self.config.eval_memory_budget_gb is not None:
+            budget = self.config.eval_memory_budget_gb * (1 << 30)
+        else:
+            budget = get_available_memory(self.device) / 2
+        return max(1, int(budget / max(bytes_per_ray, 1.0)))
+
     def get_rgba_image(self, outputs: Dict[str, torch.Tensor], output_name: str = "rgb") -> torch.Tensor:
         """Returns the RGBA image from the outputs of the model.
 
@@ -19,7 +19,7 @@ NeRF implementation that combines many recent advancements.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Literal, Tuple, Type
+from typing import Dict, List, Literal, Optional, Tuple, Type
 
 import numpy as np
 import torch
@@ -40,7 +40,8 @@ from nerfstudio.model_components.losses import (
     pred_normal_loss,
     scale_gradients_by_distance_squared,
 )
-from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler, UniformSampler
+from nerfstudio.model_components.occupancy_grid import OccupancyGrid
+from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler, UniformSampler, evaluate_front_to_back
 from nerfstudio.model_components.renderers import AccumulationRenderer, DepthRenderer, NormalsRenderer, RGBRenderer
 from nerfstudio.model_components.scene_colliders import NearFarCollider
 from nerfstudio.model_components.shaders import NormalsShader
@@ -130,6 +131,21 @@ class NerfactoModelConfig(ModelConfig):
     """Average initial density output from MLP. """
     camera_optimizer: CameraOptimizerConfig = field(default_factory=lambda: CameraOptimizerConfig(mode="SO3xR3"))
     """Config of the camera optimizer to use"""
+    use_occupancy_grid: bool = False
+    """Whether to skip empty space with an occupancy grid before querying the proposal networks and the field."""
+    occupancy_grid_resolution: int = 64
+    """Resolution of the occupancy grid."""
+    occupancy_grid_update_every: int = 16
+    """Update the occupancy grid every n training steps."""
+    occupancy_grid_warmup_steps: int = 256
+    """Number of training steps before the occupancy grid is first updated. Nothing is skipped before that."""
+    occupancy_grid_density_threshold: float = 0.01
+    """Cells with a density below this value are considered empty."""
+    early_ray_termination_threshold: Optional[float] = None
+    """If set, inference evaluates samples front-to-back and stops querying rays once their accumulated opacity
+    passes this threshold, e.g. 0.9999. Has no effect during training."""
+    early_ray_termination_segment_size: int = 16
+    """Number of samples per ray to evaluate at once when terminating rays early."""
 
 
 class NerfactoModel(Model):
@@ -204,6 +220,15 @@ class NerfactoModel(Model):
                 self.proposal_networks.append(network)
             self.density_fns.extend([network.density_fn for network in self.proposal_networks])
 
+        self.occupancy_grid: Optional[OccupancyGrid] = None
+        if self.config.use_occupancy_grid:
+            self.occupancy_grid = OccupancyGrid(
+                self.scene_box.aabb,
+                resolution=self.config.occupancy_grid_resolution,
+                spatial_distortion=scene_contraction,
+                density_threshold=self.config.occupancy_grid_density_threshold,
+            )
+
         # Samplers
         def update_schedule(step):
             return np.clip(
@@ -293,15 +318,59 @@ class NerfactoModel(Model):
                     func=self.proposal_sampler.step_cb,
                 )
             )
+        if self.occupancy_grid is not None:
+            occupancy_grid = self.occupancy_grid
+
+            def update_occupancy_grid(step: int):
+                if step >= self.config.occupancy_grid_warmup_steps:
+                    occupancy_grid.update(density_fn=self.field.density_fn)
+
+            callbacks.append(
+                TrainingCallback(
+                    where_to_run=[TrainingCallbackLocation.BEFORE_TRAIN_ITERATION],
+                    update_every_num_iters=self.config.occupancy_grid_update_every,
+                    func=update_occupancy_grid,
+                )
+            )
         return callbacks
 
+    def get_field_outputs(self, ray_samples: RaySamples) -> Dict[FieldHeadNames, torch.Tensor]:
+        """Evaluates the field, skipping empty space and terminated rays when enabled.
+
+        Args:
+            ray_samples: Samples to evaluate the field on.
+        """
+
+        def field_fn(samples: RaySamples) -> Dict[FieldHeadNames, torch.Tensor]:
+            if self.occupancy_grid is not None:
+                return self.occupancy_grid.masked_field_forward(
+                    self.field, samples, compute_normals=self.config.predict_normals
+                )
+            return self.field.forward(samples, compute_normals=self.config.predict_normals)
+
+        if self.training or self.config.early_ray_termination_threshold is None:
+            return field_fn(ray_samples)
+        return evaluate_front_to_back(
+            ray_samples,
+            field_fn,
+            density_key=FieldHeadNames.DENSITY,
+            opacity_threshold=self.config.early_ray_termination_threshold,
+            segment_size=self.config.early_ray_termination_segment_size,
+        )
+
     def get_outputs(self, ray_bundle: RayBundle):
         # apply the camera optimizer pose tweaks
         if self.training:
             self.camera_optimizer.apply_to_raybundle(ray_bundle)
         ray_samples: RaySamples
-        ray_samples, weights_list, ray_samples_list = self.proposal_sampler(ray_bundle, density_fns=self.density_fns)
-        field_outputs = self.field.forward(ray_samples, compute_normals=self.config.predict_normals)
+        ray_samples, weights_list, ray_samples_list = self.proposal_sampler(
+            ray_bundle,
+            density_fns=self.density_fns,
+            occupancy_grid=self.occupancy_grid,
+            termination_threshold=self.config.early_ray_termination_threshold,
+            termination_segment_size=self.config.early_ray_termination_segment_size,
+        )
+        field_outputs = self.get_field_outputs(ray_samples)
         if self.config.use_gradient_scaling:
             field_outputs = scale_gradients_by_distance_squared(field_outputs, ray_samples)
 
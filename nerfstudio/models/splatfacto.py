@@ -218,6 +218,11 @@ class SplatfactoModelConfig(ModelConfig):
     """Shape of the bilateral grid (X, Y, W)"""
     color_corrected_metrics: bool = False
     """If True, apply color correction to the rendered images before computing the metrics."""
+    render_batch_size: Optional[int] = None
+    """Number of cameras rasterized together when rendering for evaluation or ns-render. If None, the batch size is
+    chosen from the free device memory, up to max_render_batch_size."""
+    max_render_batch_size: int = 16
+    """Largest number of cameras rasterized together when the batch size is chosen automatically."""
 
 
 class SplatfactoModel(Model):
@@ -531,7 +536,8 @@ class SplatfactoModel(Model):
 
         Args:
             camera: The camera(s) for which output images are rendered. It should have
-            all the needed information to compute the outputs.
+            all the needed information to compute the outputs. Several cameras of the same resolution can be
+            rendered at once at inference, the images then have a leading batch dimension.
 
         Returns:
             Outputs of model. (ie. rendered colors)
@@ -551,7 +557,7 @@ class SplatfactoModel(Model):
             crop_ids = self.crop_box.within(self.means).squeeze()
             if crop_ids.sum() == 0:
                 return self.get_empty_outputs(
-                    int(camera.width.item()), int(camera.height.item()), self.background_color
+                    int(camera.width[0].item()), int(camera.height[0].item()), self.background_color
                 )
         else:
             crop_ids = None
@@ -577,7 +583,7 @@ class SplatfactoModel(Model):
         camera.rescale_output_resolution(1 / camera_scale_fac)
         viewmat = get_viewmat(optimized_camera_to_world)
         K = camera.get_intrinsics_matrices().cuda()
-        W, H = int(camera.width.item()), int(camera.height.item())
+        W, H = int(camera.width[0].item()), int(camera.height[0].item())
         self.last_size = (H, W)
         camera.rescale_output_resolution(camera_scale_fac)  # type: ignore
 
@@ -602,8 +608,8 @@ class SplatfactoModel(Model):
             scales=torch.exp(scales_crop),
             opacities=torch.sigmoid(opacities_crop).squeeze(-1),
             colors=colors_crop,
-            viewmats=viewmat,  # [1, 4, 4]
-            Ks=K,  # [1, 3, 3]
+            viewmats=viewmat,  # [B, 4, 4]
+            Ks=K,  # [B, 3, 3]
             width=W,
             height=H,
             packed=False,
@@ -634,7 +640,9 @@ class SplatfactoModel(Model):
 
         if render_mode == "RGB+ED":
             depth_im = render[:, ..., 3:4]
-            depth_im = torch.where(alpha > 0, depth_im, depth_im.detach().max()).squeeze(0)
+            # fill empty pixels with the largest depth of their own image
+            depth_max = depth_im.detach().amax(dim=(1, 2, 3), keepdim=True)
+            depth_im = torch.where(alpha > 0, depth_im, depth_max).squeeze(0)
         else:
             depth_im = None
 
@@ -755,6 +763,57 @@ class SplatfactoModel(Model):
         outs = self.get_outputs(camera.to(self.device))
         return outs  # type: ignore
 
+    def get_num_cameras_per_batch(self, camera: Cameras) -> int:
+        """Returns the number of cameras to rasterize together, see render_batch_size."""
+        if self.config.render_batch_size is not None:
+            return self.config.render_batch_size
+        if self.device.type != "cuda":
+            return 1
+        free_memory, _ = torch.cuda.mem_get_info(self.device)
+        # projected gaussians (means, conics, depths, radii, colors and tile intersections) and the rendered images
+        num_pixels = int(camera.width[0].item()) * int(camera.height[0].item())
+        bytes_per_camera = self.num_points * 128 + num_pixels * 64
+        return int(max(1, min(self.config.max_render_batch_size, free_memory // 2 // bytes_per_camera)))
+
+    @torch.no_grad()
+    def get_outputs_for_cameras(
+        self, cameras: List[Cameras], obb_box: Optional[OrientedBox] = None
+    ) -> List[Dict[str, torch.Tensor]]:
+        """Rasterizes cameras of the same resolution with one call, so that the per call overhead is shared.
+
+        Batches that run out of memory are split in half and rendered again.
+
+        Args:
+            cameras: cameras to render, each holding a single camera
+            obb_box: optional box to crop the scene to
+        """
+        if len(cameras) == 1 or any(
+            camera.width[0] != cameras[0].width[0] or camera.height[0] != cameras[0].height[0] for camera in cameras
+        ):
+            return [self.get_outputs_for_camera(camera, obb_box=obb_box) for camera in cameras]
+        batch = Cameras(
+            camera_to_worlds=torch.cat([camera.camera_to_worlds for camera in cameras]),
+            fx=torch.cat([camera.fx for camera in cameras]),
+            fy=torch.cat([camera.fy for camera in cameras]),
+            cx=torch.cat([camera.cx for camera in cameras]),
+            cy=torch.cat([camera.cy for camera in cameras]),
+            width=torch.cat([camera.width for camera in cameras]),
+            height=torch.cat([camera.height for camera in cameras]),
+        )
+        try:
+            outputs = self.get_outputs_for_camera(batch, obb_box=obb_box)
+        except torch.cuda.OutOfMemoryError:
+            half = len(cameras) // 2
+            torch.cuda.empty_cache()
+            return self.get_outputs_for_cameras(cameras[:half], obb_box) + self.get_outputs_for_cameras(
+                cameras[half:], obb_box
+            )
+        # batched images have a leading batch dimension, empty outputs of a crop without gaussians are shared
+        return [
+            {name: value[i] if value.dim() == 4 else value for name, value in outputs.items()}
+            for i in range(len(cameras))
+        ]
+
     def get_image_metrics_and_images(
         self, outputs: Dict[str, torch.Tensor], batch: Dict[str, torch.Tensor]
     ) -> Tuple[Dict[str, float], Dict[str, torch.Tensor]]:
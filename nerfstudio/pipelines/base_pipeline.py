@@ -18,15 +18,18 @@ Abstracts for the Pipeline class.
 
 from __future__ import annotations
 
+import contextlib
+import math
+import shutil
 import typing
 from abc import abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from time import time
-from typing import Any, Dict, List, Literal, Mapping, Optional, Tuple, Type, Union, cast
+from typing import Any, Dict, Iterator, List, Literal, Mapping, Optional, Tuple, Type, Union, cast
 
 import torch
-import torch.distributed as dist
 import torchvision.utils as vutils
 from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeElapsedColumn
 from torch import nn
@@ -34,11 +37,42 @@ from torch.cuda.amp.grad_scaler import GradScaler
 from torch.nn import Parameter
 from torch.nn.parallel import DistributedDataParallel as DDP
 
+from nerfstudio.cameras.rays import RayBundle
 from nerfstudio.configs.base_config import InstantiateConfig
 from nerfstudio.data.datamanagers.base_datamanager import DataManager, DataManagerConfig
+from nerfstudio.data.utils.dataloaders import BatchPrefetcher, iter_prefetched
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
+from nerfstudio.engine.checkpoints import get_state_digest
 from nerfstudio.models.base_model import Model, ModelConfig
-from nerfstudio.utils import profiler
+from nerfstudio.utils import comms, profiler
+from nerfstudio.utils.eval_cache import EvalCache
+from nerfstudio.utils.misc import batched
+
+
+def _save_image(image: torch.Tensor, path: Path) -> None:
+    """Writes an [H, W, C] image with values in [0, 1] to a PNG file."""
+    vutils.save_image(image.permute(2, 0, 1).cpu(), path)
+
+
+# metrics measuring the rendering speed, they are not stored in the evaluation cache
+_TIMING_METRICS = ("num_rays_per_sec", "fps")
+
+
+def _write_eval_outputs(
+    image_dict: Dict[str, torch.Tensor],
+    image_paths: Dict[str, Path],
+    cache: Optional[EvalCache],
+    cache_key: Optional[str],
+    metrics_dict: Dict[str, Any],
+) -> None:
+    """Writes the rendered images of an evaluated image and stores the results in the evaluation cache."""
+    for key, path in image_paths.items():
+        _save_image(image_dict[key], path)
+    if cache is not None:
+        assert cache_key is not None
+        # a cached timing would be replayed as if it was measured by a later evaluation
+        metrics_dict = {key: value for key, value in metrics_dict.items() if key not in _TIMING_METRICS}
+        cache.save(cache_key, metrics_dict, image_paths)
 
 
 def module_wrapper(ddp_or_model: Union[DDP, Model]) -> Model:
@@ -218,6 +252,15 @@ class VanillaPipelineConfig(InstantiateConfig):
     """specifies the datamanager config"""
     model: ModelConfig = field(default_factory=ModelConfig)
     """specifies the model config"""
+    prefetch_train_batches: bool = False
+    """Whether to prepare the next training batch on a background thread while the current step runs."""
+    ddp_find_unused_parameters: bool = True
+    """When training on multiple processes, whether DDP searches the autograd graph for parameters that did not
+    receive a gradient. Disable for models that use all of their parameters in every step to save a graph traversal
+    per iteration."""
+    ddp_bucket_cap_mb: int = 25
+    """Size in MiB of the buckets DDP groups gradients into, each bucket is all-reduced as soon as its gradients are
+    ready so that communication overlaps with the rest of the backward pass."""
 
 
 class VanillaPipeline(Pipeline):
@@ -279,8 +322,21 @@ class VanillaPipeline(Pipeline):
 
         self.world_size = world_size
         if world_size > 1:
-            self._model = typing.cast(Model, DDP(self._model, device_ids=[local_rank], find_unused_parameters=True))
-            dist.barrier(device_ids=[local_rank])
+            self._model = typing.cast(Model, self.wrap_ddp(self._model, local_rank))
+            comms.synchronize()
+
+    def wrap_ddp(self, model: Model, local_rank: int) -> DDP:
+        """Wraps the model for distributed data parallel training.
+
+        On CUDA every process drives the GPU of its local rank, on the CPU (gloo backend) the module is kept where it
+        is. Gradients are all-reduced in buckets of ``ddp_bucket_cap_mb``.
+        """
+        return DDP(
+            model,
+            device_ids=[local_rank] if model.device.type == "cuda" else None,
+            find_unused_parameters=self.config.ddp_find_unused_parameters,
+            bucket_cap_mb=self.config.ddp_bucket_cap_mb,
+        )
 
     @property
     def device(self):
@@ -296,13 +352,66 @@ class VanillaPipeline(Pipeline):
         Args:
             step: current iteration step to update sampler if using DDP (distributed)
         """
-        ray_bundle, batch = self.datamanager.next_train(step)
-        model_outputs = self._model(ray_bundle)  # train distributed data parallel model if world_size > 1
-        metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
-        loss_dict = self.model.get_loss_dict(model_outputs, batch, metrics_dict)
+        with profiler.time_function("data_fetch"):
+            ray_bundle, batch = self.next_train_batch(step)
+        with profiler.time_function("forward"):
+            model_outputs = self._model(ray_bundle)  # train distributed data parallel model if world_size > 1
+            metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
+            loss_dict = self.model.get_loss_dict(model_outputs, batch, metrics_dict)
 
         return model_outputs, loss_dict, metrics_dict
 
+    def get_train_micro_batch_loss_dicts(
+        self, step: int, num_micro_batches: int
+    ) -> Iterator[Tuple[Dict[str, Any], Dict[str, torch.Tensor], Dict[str, Any], float]]:
+        """Splits the training batch of a step into micro-batches of rays and yields their losses one at a time.
+
+        The caller is expected to run the backward pass of each micro-batch before requesting the next one, so only
+        the activations of one micro-batch are alive at a time. With DDP the gradients are only all-reduced in the
+        backward pass of the last micro-batch.
+
+        Args:
+            step: current iteration step
+            num_micro_batches: number of micro-batches to split the batch into
+
+        Yields:
+            The model outputs, loss dict and metrics dict of each micro-batch, and the fraction of the rays of the
+            batch it contains, to weight its loss with.
+        """
+        with profiler.time_function("data_fetch"):
+            ray_bundle, batch = self.next_train_batch(step)
+        if not isinstance(ray_bundle, RayBundle):
+            raise ValueError("Micro-batching requires a datamanager that returns a RayBundle.")
+        num_rays = len(ray_bundle)
+        micro_batch_size = math.ceil(num_rays / num_micro_batches)
+        for start in range(0, num_rays, micro_batch_size):
+            end = min(start + micro_batch_size, num_rays)
+            micro_batch = {
+                key: value[start:end] if isinstance(value, torch.Tensor) and value.shape[:1] == (num_rays,) else value
+                for key, value in batch.items()
+            }
+            no_sync = isinstance(self._model, DDP) and end < num_rays
+            with self._model.no_sync() if no_sync else contextlib.nullcontext():
+                with profiler.time_function("forward"):
+                    model_outputs = self._model(ray_bundle[start:end])
+                    metrics_dict = self.model.get_metrics_dict(model_outputs, micro_batch)
+                    loss_dict = self.model.get_loss_dict(model_outputs, micro_batch, metrics_dict)
+                yield model_outputs, loss_dict, metrics_dict, (end - start) / num_rays
+
+    def next_train_batch(self, step: int) -> Tuple[Any, Dict]:
+        """Returns the next training batch from the datamanager, prepared during the previous step if
+        prefetch_train_batches is enabled.
+
+        Args:
+            step: current iteration step
+        """
+        if not self.config.prefetch_train_batches:
+            return self.datamanager.next_train(step)
+        # created lazily since subclasses do not necessarily call VanillaPipeline.__init__
+        if getattr(self, "train_batch_prefetcher", None) is None:
+            self.train_batch_prefetcher = BatchPrefetcher(self.datamanager.next_train, self.device)
+        return self.train_batch_prefetcher.next(step)
+
     def forward(self):
         """Blank forward method
 
@@ -351,15 +460,26 @@ class VanillaPipeline(Pipeline):
         step: Optional[int] = None,
         output_path: Optional[Path] = None,
         get_std: bool = False,
+        num_image_writers: int = 4,
+        cache_dir: Optional[Path] = None,
     ):
         """Iterate over all the images in the dataset and get the average.
 
+        Rendering is pipelined with the rest of the work: the next images are loaded on a background thread while the
+        current ones render, and rendered images are encoded and written by a pool of writer threads. Models that
+        support it render several cameras per call. Metrics are kept as tensors and only copied to the host once all
+        images are rendered.
+
         Args:
             data_loader: the data loader to iterate over
             image_prefix: prefix to use for the saved image filenames
             step: current training step
             output_path: optional path to save rendered images to
             get_std: Set True if you want to return std with the mean metric.
+            num_image_writers: number of threads encoding and writing the rendered images
+            cache_dir: optional directory of an :class:`~nerfstudio.utils.eval_cache.EvalCache`. Images whose
+                evaluation is cached for the current model weights are not rendered again. Timing metrics are only
+                averaged over the rendered images, and omitted if all images are cached.
 
         Returns:
             metrics_dict: dictionary of metrics
@@ -369,57 +489,107 @@ class VanillaPipeline(Pipeline):
         num_images = len(data_loader)
         if output_path is not None:
             output_path.mkdir(exist_ok=True, parents=True)
+        pending_writes: List[Future] = []
+        cache = EvalCache(cache_dir) if cache_dir is not None else None
+        if cache is not None:
+            model_digest = get_state_digest(self.model.state_dict())
+            render_settings = repr(self.model.config)
         with Progress(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
             TimeElapsedColumn(),
             MofNCompleteColumn(),
             transient=True,
-        ) as progress:
+        ) as progress, ThreadPoolExecutor(
+            max_workers=num_image_writers, thread_name_prefix="image_writer"
+        ) as image_writer:
             task = progress.add_task("[green]Evaluating all images...", total=num_images)
-            idx = 0
-            for camera, batch in data_loader:
+            images = enumerate(iter_prefetched(data_loader))
+            for image_batch in batched(images, lambda item: self.model.get_num_cameras_per_batch(item[1][0])):
+                images_to_render = []
+                for idx, (camera, batch) in image_batch:
+                    cache_key = None
+                    if cache is not None:
+                        cache_key = cache.get_key(model_digest, camera, batch, render_settings)
+                        cached = cache.load(cache_key, with_images=output_path is not None)
+                        if cached is not None:
+                            metrics_dict, image_paths = cached
+                            if output_path is not None:
+                                for key, path in image_paths.items():
+                                    shutil.copyfile(path, output_path / f"{image_prefix}_{key}_{idx:04d}.png")
+                            metrics_dict_list.append(metrics_dict)
+                            progress.advance(task)
+                            continue
+                    images_to_render.append((idx, camera, batch, cache_key))
+                if not images_to_render:
+                    continue
+
                 # time this the following line
                 inner_start = time()
-                outputs = self.model.get_outputs_for_camera(camera=camera)
-                height, width = camera.height, camera.width
-                num_rays = height * width
-                metrics_dict, image_dict = self.model.get_image_metrics_and_images(outputs, batch)
-                if output_path is not None:
-                    for key in image_dict.keys():
-                        image = image_dict[key]  # [H, W, C] order
-                        vutils.save_image(
-                            image.permute(2, 0, 1).cpu(), output_path / f"{image_prefix}_{key}_{idx:04d}.png"
+                outputs_list = self.model.get_outputs_for_cameras([camera for _, camera, _, _ in images_to_render])
+                # the images of a batch share its rendering time
+                render_time = (time() - inner_start) / len(images_to_render)
+                for (idx, camera, batch, cache_key), outputs in zip(images_to_render, outputs_list):
+                    inner_start = time()
+                    # the ground truth image stays on the host, so its size is known without waiting for the device
+                    height, width = batch["image"].shape[:2]
+                    num_rays = height * width
+                    metrics_dict, image_dict = self.model.get_image_metrics_and_images(outputs, batch)
+
+                    assert "num_rays_per_sec" not in metrics_dict
+                    metrics_dict["num_rays_per_sec"] = num_rays / (render_time + time() - inner_start)
+                    fps_str = "fps"
+                    assert fps_str not in metrics_dict
+                    metrics_dict[fps_str] = metrics_dict["num_rays_per_sec"] / num_rays
+                    metrics_dict_list.append(metrics_dict)
+
+                    image_paths = {}
+                    if output_path is not None:
+                        # [H, W, C] order
+                        image_paths = {key: output_path / f"{image_prefix}_{key}_{idx:04d}.png" for key in image_dict}
+                    if image_paths or cache is not None:
+                        pending_writes.append(
+                            image_writer.submit(
+                                _write_eval_outputs, image_dict, image_paths, cache, cache_key, dict(metrics_dict)
+                            )
                         )
-
-                assert "num_rays_per_sec" not in metrics_dict
-                metrics_dict["num_rays_per_sec"] = (num_rays / (time() - inner_start)).item()
-                fps_str = "fps"
-                assert fps_str not in metrics_dict
-                metrics_dict[fps_str] = (metrics_dict["num_rays_per_sec"] / (height * width)).item()
-                metrics_dict_list.append(metrics_dict)
-                progress.advance(task)
-                idx = idx + 1
+                        # bound the number of rendered images waiting to be written
+                        while len(pending_writes) > 4 * num_image_writers:
+                            pending_writes.pop(0).result()
+                    progress.advance(task)
+            for pending_write in pending_writes:
+                pending_write.result()
 
         metrics_dict = {}
-        for key in metrics_dict_list[0].keys():
+        # cached images have no timing metrics, so every metric is averaged over the images that have it
+        keys = dict.fromkeys(key for image_metrics_dict in metrics_dict_list for key in image_metrics_dict)
+        for key in keys:
+            # the first copy waits for the device once, the remaining ones are cheap
+            values = torch.stack(
+                [
+                    torch.as_tensor(image_metrics_dict[key]).detach().float().cpu().reshape(())
+                    for image_metrics_dict in metrics_dict_list
+                    if key in image_metrics_dict
+                ]
+            )
             if get_std:
-                key_std, key_mean = torch.std_mean(
-                    torch.tensor([metrics_dict[key] for metrics_dict in metrics_dict_list])
-                )
+                key_std, key_mean = torch.std_mean(values)
                 metrics_dict[key] = float(key_mean)
                 metrics_dict[f"{key}_std"] = float(key_std)
             else:
-                metrics_dict[key] = float(
-                    torch.mean(torch.tensor([metrics_dict[key] for metrics_dict in metrics_dict_list]))
-                )
+                metrics_dict[key] = float(torch.mean(values))
 
         self.train()
         return metrics_dict
 
     @profiler.time_function
     def get_average_eval_image_metrics(
-        self, step: Optional[int] = None, output_path: Optional[Path] = None, get_std: bool = False
+        self,
+        step: Optional[int] = None,
+        output_path: Optional[Path] = None,
+        get_std: bool = False,
+        num_image_writers: int = 4,
+        cache_dir: Optional[Path] = None,
     ):
         """Get the average metrics for evaluation images."""
         assert hasattr(
@@ -427,7 +597,13 @@ class VanillaPipeline(Pipeline):
         ), "datamanager must have 'fixed_indices_eval_dataloader' attribute"
         image_prefix = "eval"
         return self.get_average_image_metrics(
-            self.datamanager.fixed_indices_eval_dataloader, image_prefix, step, output_path, get_std
+            self.datamanager.fixed_indices_eval_dataloader,
+            image_prefix,
+            step,
+            output_path,
+            get_std,
+            num_image_writers,
+            cache_dir,
         )
 
     def load_pipeline(self, loaded_state: Dict[str, Any], step: int) -> None:
@@ -17,7 +17,7 @@ A pipeline that dynamically chooses the number of rays to sample.
 """
 
 from dataclasses import dataclass, field
-from typing import Literal, Optional, Type
+from typing import Any, Dict, Iterator, Literal, Optional, Tuple, Type
 
 import torch
 from torch.cuda.amp.grad_scaler import GradScaler
@@ -75,16 +75,20 @@ class DynamicBatchPipeline(VanillaPipeline):
             self.dynamic_num_rays_per_batch * (self.config.target_num_samples / num_samples_per_batch)
         )
 
-    def get_train_loss_dict(self, step: int):
-        model_outputs, loss_dict, metrics_dict = super().get_train_loss_dict(step)
-
-        # update the number of rays for the next step
+    @staticmethod
+    def _get_num_samples_per_batch(metrics_dict: Dict[str, Any]) -> int:
         if "num_samples_per_batch" not in metrics_dict:
             raise ValueError(
                 "'num_samples_per_batch' is not in metrics_dict."
                 "Please return 'num_samples_per_batch' in the models get_metrics_dict function to use this method."
             )
-        self._update_dynamic_num_rays_per_batch(int(metrics_dict["num_samples_per_batch"]))
+        return int(metrics_dict["num_samples_per_batch"])
+
+    def get_train_loss_dict(self, step: int):
+        model_outputs, loss_dict, metrics_dict = super().get_train_loss_dict(step)
+
+        # update the number of rays for the next step
+        self._update_dynamic_num_rays_per_batch(self._get_num_samples_per_batch(metrics_dict))
         self._update_pixel_samplers()
 
         # add the number of rays
@@ -94,6 +98,24 @@ class DynamicBatchPipeline(VanillaPipeline):
 
         return model_outputs, loss_dict, metrics_dict
 
+    def get_train_micro_batch_loss_dicts(
+        self, step: int, num_micro_batches: int
+    ) -> Iterator[Tuple[Dict[str, Any], Dict[str, torch.Tensor], Dict[str, Any], float]]:
+        assert self.datamanager.train_pixel_sampler is not None
+        num_rays_per_batch = torch.tensor(self.datamanager.train_pixel_sampler.num_rays_per_batch)
+        num_samples_per_batch = 0
+        for model_outputs, loss_dict, metrics_dict, weight in super().get_train_micro_batch_loss_dicts(
+            step, num_micro_batches
+        ):
+            num_samples_per_batch += self._get_num_samples_per_batch(metrics_dict)
+            assert "num_rays_per_batch" not in metrics_dict
+            metrics_dict["num_rays_per_batch"] = num_rays_per_batch
+            yield model_outputs, loss_dict, metrics_dict, weight
+
+        # the number of rays for the next step depends on the samples of the whole batch
+        self._update_dynamic_num_rays_per_batch(num_samples_per_batch)
+        self._update_pixel_samplers()
+
     def get_eval_loss_dict(self, step: int):
         model_outputs, loss_dict, metrics_dict = super().get_eval_loss_dict(step)
 
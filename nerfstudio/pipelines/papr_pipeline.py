@@ -6,9 +6,7 @@ import typing
 from dataclasses import dataclass, field
 from typing import Literal, Optional, Type
 
-import torch.distributed as dist
 from torch.cuda.amp.grad_scaler import GradScaler
-from torch.nn.parallel import DistributedDataParallel as DDP
 
 from nerfstudio.data.datamanagers.base_datamanager import (
     DataManager,
@@ -22,15 +20,16 @@ from nerfstudio.pipelines.base_pipeline import (
 
 from nerfstudio.data.datamanagers.papr_datamanager import PAPRDataManagerConfig
 from nerfstudio.models.papr_model import PAPRModel, PAPRModelConfig
+from nerfstudio.utils import comms
 
 @dataclass
 class PAPRPipelineConfig(VanillaPipelineConfig):
     """Configuration for pipeline instantiation"""
     _target: Type = field(default_factory=lambda: PAPRPipeline)
     """target class to instantiate"""
-    datamanager: DataManagerConfig = PAPRDataManagerConfig()
+    datamanager: DataManagerConfig = field(default_factory=PAPRDataManagerConfig)
     """specifies the datamanager config"""
-    model: ModelConfig = PAPRModelConfig()
+    model: ModelConfig = field(default_factory=PAPRModelConfig)
     """specifies the model config"""
 
 
@@ -69,7 +68,5 @@ class PAPRPipeline(VanillaPipeline):
 
         self.world_size = world_size
         if world_size > 1:
-            self._model = typing.cast(
-                PAPRModel, DDP(self._model, device_ids=[local_rank], find_unused_parameters=True)
-            )
-            dist.barrier(device_ids=[local_rank])
+            self._model = typing.cast(PAPRModel, self.wrap_ddp(self._model, local_rank))
+            comms.synchronize()
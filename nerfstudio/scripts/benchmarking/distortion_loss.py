@@ -0,0 +1,99 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+Compares time and peak memory of the linear-time distortion loss with the pairwise formulation:
+
+    python -m nerfstudio.scripts.benchmarking.distortion_loss --num-samples 48 96
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+import torch
+import tyro
+from torch.profiler import ProfilerActivity, profile
+
+from nerfstudio.model_components.losses import lossfun_distortion
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+def quadratic_lossfun_distortion(t, w):
+    """Reference formulation materializing all pairwise distances between sample midpoints."""
+    ut = (t[..., 1:] + t[..., :-1]) / 2
+    dut = torch.abs(ut[..., :, None] - ut[..., None, :])
+    loss_inter = torch.sum(w * torch.sum(w[..., None, :] * dut, dim=-1), dim=-1)
+    loss_intra = torch.sum(w**2 * (t[..., 1:] - t[..., :-1]), dim=-1) / 3
+    return loss_inter + loss_intra
+
+
+@dataclass
+class BenchmarkDistortionLoss:
+    """Measure forward+backward time and memory of the distortion loss."""
+
+    num_samples: Tuple[int, ...] = (48, 96, 256)
+    """Numbers of samples per ray to benchmark."""
+    num_rays: int = 4096
+    """Number of rays per batch."""
+    num_repeats: int = 10
+    """Number of calls to average over."""
+    device: str = "cpu"
+    """Device to run the benchmark on."""
+
+    def _run(self, loss_fn: Callable, t: torch.Tensor, w: torch.Tensor) -> Tuple[float, float]:
+        """Returns milliseconds per forward+backward and the largest memory allocation of a single op in MB."""
+
+        def step():
+            loss_fn(t, w).mean().backward()
+
+        step()  # warm up
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            step()
+        peak_mb = max(event.cpu_memory_usage for event in prof.key_averages()) / 2**20
+        if t.is_cuda:
+            torch.cuda.reset_peak_memory_stats()
+            step()
+            peak_mb = torch.cuda.max_memory_allocated() / 2**20
+        start = time.perf_counter()
+        for _ in range(self.num_repeats):
+            step()
+        if t.is_cuda:
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start) / self.num_repeats * 1000, peak_mb
+
+    def main(self) -> None:
+        """Main function."""
+        for num_samples in self.num_samples:
+            t = torch.sort(torch.rand((self.num_rays, num_samples + 1), device=self.device), dim=-1).values
+            w = torch.rand((self.num_rays, num_samples), device=self.device, requires_grad=True)
+            for name, loss_fn in (("quadratic", quadratic_lossfun_distortion), ("linear", lossfun_distortion)):
+                ms, peak_mb = self._run(loss_fn, t, w)
+                CONSOLE.print(f"{num_samples} samples, {name}: {ms:.2f} ms, {peak_mb:.1f} MB largest allocation")
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkDistortionLoss).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkDistortionLoss)  # noqa
@@ -0,0 +1,97 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+Reports throughput of the pure PyTorch HashEncoding backend at several hash table sizes:
+
+    python -m nerfstudio.scripts.benchmarking.hash_encoding --log2-hashmap-sizes 15 17 19
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Tuple
+
+import torch
+import tyro
+
+from nerfstudio.field_components.encodings import HashEncoding
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+@dataclass
+class BenchmarkHashEncoding:
+    """Measure points/sec of the torch hash encoding with full and half precision tables."""
+
+    log2_hashmap_sizes: Tuple[int, ...] = (15, 17, 19)
+    """Hash table sizes to benchmark."""
+    num_levels: int = 16
+    """Number of levels of the hash grid."""
+    features_per_level: int = 2
+    """Number of features per level."""
+    num_points: int = 1 << 16
+    """Number of points encoded per call."""
+    num_repeats: int = 10
+    """Number of calls to average over."""
+    device: str = "cpu"
+    """Device to run the benchmark on."""
+
+    def _time(self, fn) -> float:
+        fn()  # warm up
+        start = time.perf_counter()
+        for _ in range(self.num_repeats):
+            fn()
+        return self.num_points * self.num_repeats / (time.perf_counter() - start)
+
+    def main(self) -> None:
+        """Main function."""
+        points = torch.rand((self.num_points, 3), device=self.device)
+        for log2_hashmap_size in self.log2_hashmap_sizes:
+            encoding = HashEncoding(
+                num_levels=self.num_levels,
+                max_res=2048,
+                log2_hashmap_size=log2_hashmap_size,
+                features_per_level=self.features_per_level,
+                implementation="torch",
+            ).to(self.device)
+
+            def forward_backward():
+                encoding(points).sum().backward()
+
+            train_rate = self._time(forward_backward)
+            with torch.no_grad():
+                inference_rate = self._time(lambda: encoding(points))
+                encoding.hash_table.data = encoding.hash_table.data.half()
+                half_rate = self._time(lambda: encoding(points))
+            CONSOLE.print(
+                f"log2_hashmap_size={log2_hashmap_size}: "
+                f"forward+backward {train_rate:,.0f} pts/s, "
+                f"forward {inference_rate:,.0f} pts/s, "
+                f"forward (fp16 table) {half_rate:,.0f} pts/s"
+            )
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkHashEncoding).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkHashEncoding)  # noqa
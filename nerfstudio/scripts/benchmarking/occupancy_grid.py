@@ -0,0 +1,115 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+Reports eval rays/sec of nerfacto-style models with and without occupancy grid empty-space skipping.
+
+Trains briefly on the lego test fixture on CPU, then renders the evaluation camera with both settings:
+
+    python -m nerfstudio.scripts.benchmarking.occupancy_grid --method-name papr
+"""
+
+from __future__ import annotations
+
+import copy
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+import torch
+import tyro
+
+from nerfstudio.configs.method_configs import method_configs
+from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
+from nerfstudio.engine.callbacks import TrainingCallbackAttributes, TrainingCallbackLocation
+from nerfstudio.engine.optimizers import Optimizers
+from nerfstudio.models.nerfacto import NerfactoModel, NerfactoModelConfig
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+@dataclass
+class BenchmarkOccupancyGrid:
+    """Measure eval rays/sec with and without the occupancy grid."""
+
+    method_name: Literal["nerfacto", "papr"] = "nerfacto"
+    """Nerfacto-style method to benchmark."""
+    data: Path = Path("tests/data/lego_test")
+    """Blender-format dataset to train and evaluate on."""
+    num_train_steps: int = 100
+    """Number of training steps before measuring, the grid is updated during the second half."""
+    train_num_rays_per_batch: int = 256
+    """Number of rays per training batch, kept small so that the benchmark runs quickly on CPU."""
+    num_eval_repeats: int = 3
+    """Number of renders of the eval camera to average over."""
+    device: str = "cpu"
+    """Device to run the benchmark on."""
+
+    def main(self) -> None:
+        """Main function."""
+        config = copy.deepcopy(method_configs[self.method_name])
+        config.pipeline.datamanager.dataparser = BlenderDataParserConfig(data=self.data)
+        config.pipeline.datamanager.train_num_rays_per_batch = self.train_num_rays_per_batch
+        model_config = config.pipeline.model
+        assert isinstance(model_config, NerfactoModelConfig)
+        model_config.implementation = "torch"
+        model_config.use_occupancy_grid = True
+        model_config.occupancy_grid_warmup_steps = self.num_train_steps // 2
+        model_config.occupancy_grid_update_every = 8
+
+        pipeline = config.pipeline.setup(device=self.device, test_mode="val")
+        optimizers = Optimizers(config.optimizers, pipeline.get_param_groups())
+        callbacks = pipeline.get_training_callbacks(
+            TrainingCallbackAttributes(optimizers=optimizers, grad_scaler=None, pipeline=pipeline, trainer=None)
+        )
+        pipeline.train()
+        for step in range(self.num_train_steps):
+            for callback in callbacks:
+                callback.run_callback_at_location(step, location=TrainingCallbackLocation.BEFORE_TRAIN_ITERATION)
+            optimizers.zero_grad_all()
+            _, loss_dict, _ = pipeline.get_train_loss_dict(step=step)
+            torch.stack(list(loss_dict.values())).sum().backward()
+            optimizers.optimizer_step_all()
+            for callback in callbacks:
+                callback.run_callback_at_location(step, location=TrainingCallbackLocation.AFTER_TRAIN_ITERATION)
+
+        pipeline.eval()
+        model = pipeline.model
+        assert isinstance(model, NerfactoModel) and model.occupancy_grid is not None
+        CONSOLE.print(f"Occupied cells: {model.occupancy_grid.occupancy_ratio:.2%}")
+        camera = pipeline.datamanager.eval_dataset.cameras[0:1].to(pipeline.device)
+        occupancy_grid = model.occupancy_grid
+        for name, grid in (("dense", None), ("occupancy grid", occupancy_grid)):
+            model.occupancy_grid = grid
+            model.get_outputs_for_camera(camera)  # warm up
+            start = time.perf_counter()
+            for _ in range(self.num_eval_repeats):
+                outputs = model.get_outputs_for_camera(camera)
+            duration = (time.perf_counter() - start) / self.num_eval_repeats
+            num_rays = outputs["rgb"].shape[0] * outputs["rgb"].shape[1]
+            CONSOLE.print(f"{self.method_name} ({name}): {num_rays / duration:,.0f} eval rays/sec")
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkOccupancyGrid).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkOccupancyGrid)  # noqa
@@ -0,0 +1,301 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+Training and rendering benchmark of the registered methods on the small test scene, runnable without a GPU:
+
+    ns-benchmark --output-path benchmark.json --baseline benchmark_baseline.json
+
+Every method runs in a fresh process for a fixed number of steps. The results are written as JSON and compared with
+a baseline, failing if a metric regressed by more than the configured thresholds.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from queue import Empty
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import torch
+import tyro
+
+from nerfstudio.configs.method_configs import method_configs
+from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
+from nerfstudio.engine.callbacks import TrainingCallbackLocation
+from nerfstudio.utils.rich_utils import CONSOLE
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# metrics for which higher values are better, all others are better when lower
+THROUGHPUT_METRICS = ("steps_per_sec", "train_rays_per_sec", "eval_rays_per_sec")
+MEMORY_METRICS = ("peak_rss_mb",)
+STARTUP_METRICS = ("startup_sec",)
+
+
+def get_peak_rss_mb() -> float:
+    """Returns the peak resident set size of the current process in MiB."""
+    if resource is None:
+        raise RuntimeError("Measuring the peak resident set size is not supported on this platform.")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    max_throughput_drop: float,
+    max_memory_increase: float,
+    max_startup_increase: float,
+) -> List[str]:
+    """Returns a description of every metric that regressed beyond its threshold compared to the baseline.
+
+    Args:
+        results: per method metrics of the current run
+        baseline: per method metrics of the baseline run
+        max_throughput_drop: allowed relative decrease of the throughput metrics
+        max_memory_increase: allowed relative increase of the peak memory
+        max_startup_increase: allowed relative increase of the startup time
+    """
+    regressions = []
+    for method, baseline_metrics in baseline.items():
+        metrics = results.get(method)
+        if metrics is None or "error" in baseline_metrics:
+            continue
+        if "error" in metrics:
+            regressions.append(f"{method}: failed with {metrics['error']}")
+            continue
+        for name, value in metrics.items():
+            if name not in baseline_metrics:
+                continue
+            reference = baseline_metrics[name]
+            if name in THROUGHPUT_METRICS and value < reference * (1 - max_throughput_drop):
+                regressions.append(f"{method}: {name} dropped from {reference:.4g} to {value:.4g}")
+            elif name in MEMORY_METRICS and value > reference * (1 + max_memory_increase):
+                regressions.append(f"{method}: {name} increased from {reference:.4g} to {value:.4g}")
+            elif name in STARTUP_METRICS and value > reference * (1 + max_startup_increase):
+                regressions.append(f"{method}: {name} increased from {reference:.4g} to {value:.4g}")
+    return regressions
+
+
+@dataclass
+class RunBenchmark:
+    """Benchmark training and rendering speed of the registered methods."""
+
+    methods: Tuple[str, ...] = ()
+    """Methods to benchmark, all registered methods if empty."""
+    data: Path = Path("tests/data/lego_test")
+    """Blender scene to train on."""
+    device_type: Literal["cpu", "cuda", "mps"] = "cpu"
+    """Device to benchmark on."""
+    num_warmup_steps: int = 3
+    """Number of training steps to run before timing."""
+    num_steps: int = 20
+    """Number of timed training steps."""
+    num_rays_per_batch: int = 256
+    """Number of rays per training batch, for methods that sample rays."""
+    num_eval_images: int = 2
+    """Number of eval image renders to time."""
+    timeout: float = 600.0
+    """Seconds after which a method is aborted and reported as failed."""
+    output_path: Path = Path("benchmark.json")
+    """Where to write the results."""
+    baseline: Optional[Path] = None
+    """Results of a previous run to compare against."""
+    update_baseline: bool = False
+    """Overwrite the baseline with the results of this run instead of comparing against it."""
+    max_throughput_drop: float = 0.2
+    """Relative decrease of steps/sec, train rays/sec or eval rays/sec that counts as a regression."""
+    max_memory_increase: float = 0.2
+    """Relative increase of the peak RSS that counts as a regression."""
+    max_startup_increase: float = 0.5
+    """Relative increase of the startup time that counts as a regression."""
+
+    def get_config(self, method: str, output_dir: Path):
+        """Returns the config of a method reduced to the benchmark scene and settings."""
+        config = copy.deepcopy(method_configs[method])
+        config.machine.device_type = self.device_type
+        if hasattr(config.pipeline.model, "implementation"):
+            setattr(config.pipeline.model, "implementation", "torch")
+        if self.device_type != "cuda":
+            config.mixed_precision = False
+            config.use_grad_scaler = False
+        config.pipeline.datamanager.dataparser = BlenderDataParserConfig(data=self.data)
+        if hasattr(config.pipeline.datamanager, "train_num_rays_per_batch"):
+            setattr(config.pipeline.datamanager, "train_num_rays_per_batch", self.num_rays_per_batch)
+        config.vis = "tensorboard"
+        config.logging.local_writer.enable = False
+        config.viewer.quit_on_train_completion = True
+        config.set_timestamp()
+        config.output_dir = output_dir
+        return config
+
+    def benchmark_method(self, method: str, start_time: float) -> Dict[str, float]:
+        """Trains and renders a method in the current process and returns its metrics.
+
+        Args:
+            method: name of the method
+            start_time: time at which the process was started, to measure the startup time
+        """
+
+        def synchronize():
+            if self.device_type == "cuda":
+                torch.cuda.synchronize()
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            trainer = self.get_config(method, Path(output_dir)).setup(local_rank=0, world_size=1)
+            trainer.setup()
+            startup_sec = time.time() - start_time
+
+            def train_step(step: int) -> None:
+                for callback in trainer.callbacks:
+                    callback.run_callback_at_location(step, location=TrainingCallbackLocation.BEFORE_TRAIN_ITERATION)
+                trainer.train_iteration(step)
+                for callback in trainer.callbacks:
+                    callback.run_callback_at_location(step, location=TrainingCallbackLocation.AFTER_TRAIN_ITERATION)
+
+            trainer.pipeline.train()
+            for step in range(self.num_warmup_steps):
+                train_step(step)
+            synchronize()
+            start = time.perf_counter()
+            num_rays = 0
+            for step in range(self.num_warmup_steps, self.num_warmup_steps + self.num_steps):
+                num_rays += trainer.pipeline.datamanager.get_train_rays_per_batch()
+                train_step(step)
+            synchronize()
+            train_duration = time.perf_counter() - start
+
+            trainer.pipeline.eval()
+            eval_rays, eval_duration = 0, 0.0
+            for _ in range(self.num_eval_images):
+                start = time.perf_counter()
+                metrics_dict, _ = trainer.pipeline.get_eval_image_metrics_and_images(
+                    step=self.num_warmup_steps + self.num_steps
+                )
+                synchronize()
+                eval_duration += time.perf_counter() - start
+                eval_rays += metrics_dict["num_rays"]
+
+        return {
+            "startup_sec": startup_sec,
+            "steps_per_sec": self.num_steps / train_duration,
+            "train_rays_per_sec": num_rays / train_duration,
+            "eval_rays_per_sec": eval_rays / eval_duration,
+            "peak_rss_mb": get_peak_rss_mb(),
+        }
+
+    def run_method(self, method: str) -> Dict[str, Any]:
+        """Benchmarks a method in a fresh process, so that startup time and peak memory are measured in isolation."""
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_benchmark_worker, args=(self, method, time.time(), queue))
+        process.start()
+        deadline = time.time() + self.timeout
+        result: Optional[Dict[str, Any]] = None
+        while result is None and time.time() < deadline:
+            try:
+                result = queue.get(timeout=1.0)
+            except Empty:
+                if not process.is_alive():
+                    break
+        if result is None:
+            if process.is_alive():
+                result = {"error": f"timed out after {self.timeout:.0f}s"}
+            else:
+                result = {"error": f"process exited with code {process.exitcode}"}
+        process.join(timeout=10.0)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        return result
+
+    def main(self) -> None:
+        """Main function."""
+        methods = self.methods or tuple(method_configs.keys())
+        results: Dict[str, Dict[str, Any]] = {}
+        for method in methods:
+            CONSOLE.print(f"Benchmarking {method}...")
+            results[method] = self.run_method(method)
+            if "error" in results[method]:
+                CONSOLE.print(f"[bold yellow]{method} failed: {results[method]['error']}")
+            else:
+                CONSOLE.print(", ".join(f"{name}={value:.4g}" for name, value in results[method].items()))
+
+        output = {
+            "environment": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "torch": torch.__version__,
+                "num_cpus": multiprocessing.cpu_count(),
+                "num_threads": torch.get_num_threads(),
+            },
+            "settings": {key: str(value) for key, value in asdict(self).items()},
+            "methods": results,
+        }
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.output_path.write_text(json.dumps(output, indent=2), encoding="utf8")
+        CONSOLE.print(f"Saved results to {self.output_path}")
+
+        if self.baseline is None:
+            return
+        if self.update_baseline or not self.baseline.exists():
+            self.baseline.parent.mkdir(parents=True, exist_ok=True)
+            self.baseline.write_text(json.dumps(output, indent=2), encoding="utf8")
+            CONSOLE.print(f"Saved baseline to {self.baseline}")
+            return
+        baseline = json.loads(self.baseline.read_text(encoding="utf8"))["methods"]
+        regressions = compare_to_baseline(
+            results, baseline, self.max_throughput_drop, self.max_memory_increase, self.max_startup_increase
+        )
+        if regressions:
+            CONSOLE.print("[bold red]Regressions compared to the baseline:")
+            for regression in regressions:
+                CONSOLE.print(f"  {regression}")
+            sys.exit(1)
+        CONSOLE.print("[bold green]No regressions compared to the baseline.")
+
+
+def _benchmark_worker(benchmark: RunBenchmark, method: str, start_time: float, queue: Any) -> None:
+    """Runs the benchmark of a method in a spawned process and reports the metrics or the error."""
+    try:
+        queue.put(benchmark.benchmark_method(method, start_time))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(RunBenchmark).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(RunBenchmark)  # noqa
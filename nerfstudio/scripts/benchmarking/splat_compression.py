@@ -0,0 +1,130 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+Reports the file size, write time and decode time of random Gaussian splats in the full precision and the compressed
+PLY formats:
+
+    python -m nerfstudio.scripts.benchmarking.splat_compression --num-gaussians 1000000 --sh-degree 3
+"""
+
+from __future__ import annotations
+
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict
+
+import torch
+import tyro
+from torch import Tensor
+
+from nerfstudio.exporter import splat_compression
+from nerfstudio.scripts.exporter import ExportGaussianSplat
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+@dataclass
+class BenchmarkSplatCompression:
+    """Measure the size, write time and decode time of the full precision and compressed splat formats."""
+
+    num_gaussians: int = 1 << 20
+    """Number of random Gaussians to write."""
+    sh_degree: int = 3
+    """Degree of the spherical harmonics of the Gaussians."""
+    num_repeats: int = 3
+    """Number of writes and reads to average over."""
+    seed: int = 0
+    """Seed of the random Gaussians."""
+
+    def _get_gaussians(self) -> Dict[str, Tensor]:
+        generator = torch.Generator().manual_seed(self.seed)
+        gaussians = {
+            "means": torch.randn((self.num_gaussians, 3), generator=generator) * 10.0,
+            "scales": torch.randn((self.num_gaussians, 3), generator=generator) - 4.0,
+            "quats": torch.randn((self.num_gaussians, 4), generator=generator),
+            "opacities": torch.randn((self.num_gaussians, 1), generator=generator),
+            "shs_0": torch.randn((self.num_gaussians, 3), generator=generator),
+        }
+        if self.sh_degree > 0:
+            num_coeffs = (self.sh_degree + 1) ** 2 - 1
+            gaussians["shs_rest"] = torch.randn((self.num_gaussians, num_coeffs, 3), generator=generator) * 0.1
+        return gaussians
+
+    def _time(self, fn: Callable[[], object]) -> float:
+        start = time.perf_counter()
+        for _ in range(self.num_repeats):
+            fn()
+        return (time.perf_counter() - start) / self.num_repeats
+
+    def main(self) -> None:
+        """Main function."""
+        gaussians = self._get_gaussians()
+        # the properties of the full precision PLY export
+        map_to_tensors = OrderedDict()
+        for i, axis in enumerate("xyz"):
+            map_to_tensors[axis] = gaussians["means"][:, i]
+        for axis in "xyz":
+            map_to_tensors[f"n{axis}"] = torch.zeros(self.num_gaussians)
+        for i in range(3):
+            map_to_tensors[f"f_dc_{i}"] = gaussians["shs_0"][:, i]
+        if "shs_rest" in gaussians:
+            shs_rest = gaussians["shs_rest"].transpose(1, 2).reshape(self.num_gaussians, -1)
+            for i in range(shs_rest.shape[-1]):
+                map_to_tensors[f"f_rest_{i}"] = shs_rest[:, i]
+        map_to_tensors["opacity"] = gaussians["opacities"][:, 0]
+        for i in range(3):
+            map_to_tensors[f"scale_{i}"] = gaussians["scales"][:, i]
+        for i in range(4):
+            map_to_tensors[f"rot_{i}"] = gaussians["quats"][:, i]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            full_filename = Path(tmp_dir) / "splat.ply"
+            compressed_filename = Path(tmp_dir) / "splat.compressed.ply"
+            formats = {
+                "full precision": (
+                    full_filename,
+                    lambda: ExportGaussianSplat.write_ply(str(full_filename), self.num_gaussians, map_to_tensors),
+                    lambda: splat_compression.read_ply(full_filename),
+                ),
+                "compressed": (
+                    compressed_filename,
+                    lambda: splat_compression.write_compressed_splat(compressed_filename, gaussians),
+                    lambda: splat_compression.read_compressed_splat(compressed_filename),
+                ),
+            }
+            for name, (filename, write, read) in formats.items():
+                write_time = self._time(write)
+                read_time = self._time(read)
+                CONSOLE.print(
+                    f"{name}: {filename.stat().st_size / 1e6:.1f} MB, "
+                    f"{filename.stat().st_size / self.num_gaussians:.1f} bytes per Gaussian, "
+                    f"written in {write_time:.2f} s, decoded in {read_time:.2f} s"
+                )
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkSplatCompression).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkSplatCompression)  # noqa
@@ -40,6 +40,12 @@ class ComputePSNR:
     output_path: Path = Path("output.json")
     # Optional path to save rendered outputs to.
     render_output_path: Optional[Path] = None
+    # Whether to reuse the per image results of previous evaluations of the same checkpoint. Only images whose
+    # results are not cached yet are rendered, so an interrupted evaluation resumes where it stopped. Timing metrics
+    # (num_rays_per_sec, fps) are not cached, they are only averaged over the images rendered by this run.
+    use_cache: bool = False
+    # Directory of the evaluation cache, defaults to eval_cache next to the config file.
+    cache_dir: Optional[Path] = None
 
     def main(self) -> None:
         """Main function."""
@@ -47,7 +53,12 @@ class ComputePSNR:
         assert self.output_path.suffix == ".json"
         if self.render_output_path is not None:
             self.render_output_path.mkdir(parents=True, exist_ok=True)
-        metrics_dict = pipeline.get_average_eval_image_metrics(output_path=self.render_output_path, get_std=True)
+        cache_dir = None
+        if self.use_cache:
+            cache_dir = self.cache_dir if self.cache_dir is not None else self.load_config.parent / "eval_cache"
+        metrics_dict = pipeline.get_average_eval_image_metrics(
+            output_path=self.render_output_path, get_std=True, cache_dir=cache_dir
+        )
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
         # Get the output and define the names to save to
         benchmark_info = {
@@ -19,19 +19,23 @@ Script for exporting NeRF into other formats.
 from __future__ import annotations
 
 import json
+import math
 import os
 import sys
+import tempfile
+import time
 import typing
 from collections import OrderedDict
 from dataclasses import dataclass, field
 from importlib.metadata import version
 from pathlib import Path
-from typing import List, Optional, Tuple, Union, cast
+from typing import Dict, List, Optional, Tuple, Union, cast
 
 import numpy as np
 import open3d as o3d
 import torch
 import tyro
+from torch import Tensor
 from typing_extensions import Annotated, Literal
 
 from nerfstudio.cameras.rays import RayBundle
@@ -40,8 +44,13 @@ from nerfstudio.data.datamanagers.full_images_datamanager import FullImageDatama
 from nerfstudio.data.datamanagers.parallel_datamanager import ParallelDataManager
 from nerfstudio.data.datamanagers.random_cameras_datamanager import RandomCamerasDataManager
 from nerfstudio.data.scene_box import OrientedBox
-from nerfstudio.exporter import texture_utils, tsdf_utils
-from nerfstudio.exporter.exporter_utils import collect_camera_poses, generate_point_cloud, get_mesh_from_filename
+from nerfstudio.exporter import splat_compression, texture_utils, tsdf_utils
+from nerfstudio.exporter.exporter_utils import (
+    collect_camera_poses,
+    generate_point_cloud,
+    generate_point_cloud_from_frames,
+    get_mesh_from_filename,
+)
 from nerfstudio.exporter.marching_cubes import generate_mesh_with_multires_marching_cubes
 from nerfstudio.fields.sdf_field import SDFField  # noqa
 from nerfstudio.models.splatfacto import SplatfactoModel
@@ -99,8 +108,12 @@ def validate_pipeline(normal_method: str, normal_output_name: str, pipeline: Pip
 class ExportPointCloud(Exporter):
     """Export NeRF as a point cloud."""
 
+    sampling: Literal["rays", "frames"] = "rays"
+    """How the scene is sampled. "rays" renders random batches of training rays until num_points points are collected.
+    "frames" renders every training image in full and averages the back-projected points per voxel, which bounds the
+    memory used and always gives the same points."""
     num_points: int = 1000000
-    """Number of points to generate. May result in less if outlier removal is used."""
+    """Number of points to generate. May result in less if outlier removal is used. Only used with "rays" sampling."""
     remove_outliers: bool = True
     """Remove outliers from the point cloud."""
     reorient_normals: bool = True
@@ -124,6 +137,13 @@ class ExportPointCloud(Exporter):
     """Number of rays to evaluate per batch. Decrease if you run out of memory."""
     std_ratio: float = 10.0
     """Threshold based on STD of the average distances across the point cloud to remove outliers."""
+    downscale_factor: int = 2
+    """Downscale the training images rendered with "frames" sampling."""
+    voxel_size: float = 0.002
+    """Edge length of the voxels the points are averaged in with "frames" sampling, in the coordinate space of the
+    NeRF models."""
+    voxel_std_ratio: float = 2.0
+    """With "frames" sampling, remove the voxels whose number of occupied neighbours is this many STDs below the mean."""
     save_world_frame: bool = False
     """If set, saves the point cloud in the same frame as the original dataset. Otherwise, uses the
     scaled and reoriented coordinate space expected by the NeRF models."""
@@ -138,31 +158,48 @@ class ExportPointCloud(Exporter):
 
         validate_pipeline(self.normal_method, self.normal_output_name, pipeline)
 
-        # Increase the batchsize to speed up the evaluation.
-        assert isinstance(
-            pipeline.datamanager,
-            (VanillaDataManager, ParallelDataManager, FullImageDatamanager, RandomCamerasDataManager),
-        )
-        assert pipeline.datamanager.train_pixel_sampler is not None
-        pipeline.datamanager.train_pixel_sampler.num_rays_per_batch = self.num_rays_per_batch
-
         # Whether the normals should be estimated based on the point cloud.
         estimate_normals = self.normal_method == "open3d"
         crop_obb = None
         if self.obb_center is not None and self.obb_rotation is not None and self.obb_scale is not None:
             crop_obb = OrientedBox.from_params(self.obb_center, self.obb_rotation, self.obb_scale)
-        pcd = generate_point_cloud(
-            pipeline=pipeline,
-            num_points=self.num_points,
-            remove_outliers=self.remove_outliers,
-            reorient_normals=self.reorient_normals,
-            estimate_normals=estimate_normals,
-            rgb_output_name=self.rgb_output_name,
-            depth_output_name=self.depth_output_name,
-            normal_output_name=self.normal_output_name if self.normal_method == "model_output" else None,
-            crop_obb=crop_obb,
-            std_ratio=self.std_ratio,
-        )
+        if self.sampling == "frames":
+            # Increase the chunk size to speed up the evaluation.
+            pipeline.model.config.eval_num_rays_per_chunk = self.num_rays_per_batch
+            pcd = generate_point_cloud_from_frames(
+                pipeline=pipeline,
+                voxel_size=self.voxel_size,
+                downscale_factor=self.downscale_factor,
+                remove_outliers=self.remove_outliers,
+                reorient_normals=self.reorient_normals,
+                estimate_normals=estimate_normals,
+                rgb_output_name=self.rgb_output_name,
+                depth_output_name=self.depth_output_name,
+                normal_output_name=self.normal_output_name if self.normal_method == "model_output" else None,
+                crop_obb=crop_obb,
+                std_ratio=self.voxel_std_ratio,
+            )
+        else:
+            # Increase the batchsize to speed up the evaluation.
+            assert isinstance(
+                pipeline.datamanager,
+                (VanillaDataManager, ParallelDataManager, FullImageDatamanager, RandomCamerasDataManager),
+            )
+            assert pipeline.datamanager.train_pixel_sampler is not None
+            pipeline.datamanager.train_pixel_sampler.num_rays_per_batch = self.num_rays_per_batch
+
+            pcd = generate_point_cloud(
+                pipeline=pipeline,
+                num_points=self.num_points,
+                remove_outliers=self.remove_outliers,
+                reorient_normals=self.reorient_normals,
+                estimate_normals=estimate_normals,
+                rgb_output_name=self.rgb_output_name,
+                depth_output_name=self.depth_output_name,
+                normal_output_name=self.normal_output_name if self.normal_method == "model_output" else None,
+                crop_obb=crop_obb,
+                std_ratio=self.std_ratio,
+            )
         if self.save_world_frame:
             # apply the inverse dataparser transform to the point cloud
             points = np.asarray(pcd.points)
@@ -224,6 +261,10 @@ class ExportTSDFMesh(Exporter):
     refinement_epsilon: float = 1e-2
     """Refinement epsilon for the mesh. This is the distance in meters that the refined AABB/OBB will be expanded by
     in each direction."""
+    sparse: bool = False
+    """Only store the voxels near the observed surfaces, in blocks, so that high resolutions fit in memory."""
+    block_size: int = 8
+    """Number of voxels along each side of a block of the sparse TSDF."""
 
     def main(self) -> None:
         """Export mesh"""
@@ -246,6 +287,8 @@ class ExportTSDFMesh(Exporter):
             bounding_box_max=self.bounding_box_max,
             refine_mesh_using_initial_aabb_estimate=self.refine_mesh_using_initial_aabb_estimate,
             refinement_epsilon=self.refinement_epsilon,
+            sparse=self.sparse,
+            block_size=self.block_size,
         )
 
         # possibly
@@ -486,6 +529,22 @@ class ExportCameraPoses(Exporter):
             CONSOLE.print(f"[bold green]:white_check_mark: Saved poses to {output_file_path}")
 
 
+_PLY_PROPERTY_DTYPES = {"float": "<f4", "uchar": "u1"}
+
+
+def _get_ply_property_type(tensor: Union[np.ndarray, torch.Tensor]) -> Optional[str]:
+    """Returns the PLY type a float or uint8 array is written as, or None for any other array."""
+    if isinstance(tensor, torch.Tensor):
+        if tensor.is_floating_point():
+            return "float"
+        return "uchar" if tensor.dtype == torch.uint8 else None
+    if isinstance(tensor, np.ndarray):
+        if tensor.dtype.kind == "f":
+            return "float"
+        return "uchar" if tensor.dtype == np.uint8 else None
+    return None
+
+
 @dataclass
 class ExportGaussianSplat(Exporter):
     """
@@ -503,36 +562,48 @@ class ExportGaussianSplat(Exporter):
     ply_color_mode: Literal["sh_coeffs", "rgb"] = "sh_coeffs"
     """If "rgb", export colors as red/green/blue fields. Otherwise, export colors as
     spherical harmonics coefficients."""
+    ply_format: Literal["full", "compressed"] = "full"
+    """If "compressed", sort the Gaussians along a Morton curve and quantize them per chunk of neighbouring Gaussians
+    into <output_filename stem>.compressed.ply, about four times smaller than the full precision PLY."""
+    check_compression: bool = False
+    """Report the size and load time of the compressed file against the full precision PLY, and the PSNR of renders
+    of the decoded Gaussians against renders of the exported ones."""
+    num_check_images: int = 8
+    """Number of eval images rendered to check the compressed file."""
 
     @staticmethod
     def write_ply(
         filename: str,
         count: int,
-        map_to_tensors: typing.OrderedDict[str, np.ndarray],
+        map_to_tensors: typing.OrderedDict[str, Union[np.ndarray, torch.Tensor]],
+        chunk_size: int = 1 << 18,
     ):
         """
         Writes a PLY file with given vertex properties and a tensor of float or uint8 values in the order specified by the OrderedDict.
         Note: All float values will be converted to float32 for writing.
 
+        The vertices are packed into a structured array and written one chunk at a time, so torch tensors can be passed
+        while still on the GPU and only a single chunk is held in host memory.
+
         Parameters:
         filename (str): The name of the file to write.
         count (int): The number of vertices to write.
-        map_to_tensors (OrderedDict[str, np.ndarray]): An ordered dictionary mapping property names to numpy arrays of float or uint8 values.
+        map_to_tensors (OrderedDict[str, np.ndarray | torch.Tensor]): An ordered dictionary mapping property names to numpy arrays or torch tensors of float or uint8 values.
             Each array should be 1-dimensional and of equal length matching 'count'. Arrays should not be empty.
+        chunk_size (int): The number of vertices to convert and write at once.
         """
 
         # Ensure count matches the length of all tensors
-        if not all(tensor.size == count for tensor in map_to_tensors.values()):
+        if not all(len(tensor) == count and math.prod(tensor.shape) == count for tensor in map_to_tensors.values()):
             raise ValueError("Count does not match the length of all tensors")
 
-        # Type check for numpy arrays of type float or uint8 and non-empty
-        if not all(
-            isinstance(tensor, np.ndarray)
-            and (tensor.dtype.kind == "f" or tensor.dtype == np.uint8)
-            and tensor.size > 0
-            for tensor in map_to_tensors.values()
-        ):
+        # Type check for numpy arrays or torch tensors of type float or uint8 and non-empty
+        property_types = [_get_ply_property_type(tensor) for tensor in map_to_tensors.values()]
+        if not all(property_type is not None for property_type in property_types) or count == 0:
             raise ValueError("All tensors must be numpy arrays of float or uint8 type and not empty")
+        vertex_dtype = np.dtype(
+            [(key, _PLY_PROPERTY_DTYPES[property_type]) for key, property_type in zip(map_to_tensors, property_types)]
+        )
 
         with open(filename, "wb") as ply_file:
             nerfstudio_version = version("nerfstudio")
@@ -544,21 +615,20 @@ class ExportGaussianSplat(Exporter):
             ply_file.write(f"element vertex {count}\n".encode())
 
             # Write properties, in order due to OrderedDict
-            for key, tensor in map_to_tensors.items():
-                data_type = "float" if tensor.dtype.kind == "f" else "uchar"
-                ply_file.write(f"property {data_type} {key}\n".encode())
+            for key, property_type in zip(map_to_tensors, property_types):
+                ply_file.write(f"property {property_type} {key}\n".encode())
 
             ply_file.write(b"end_header\n")
 
-            # Write binary data
-            # Note: If this is a performance bottleneck consider using numpy.hstack for efficiency improvement
-            for i in range(count):
-                for tensor in map_to_tensors.values():
-                    value = tensor[i]
-                    if tensor.dtype.kind == "f":
-                        ply_file.write(np.float32(value).tobytes())
-                    elif tensor.dtype == np.uint8:
-                        ply_file.write(value.tobytes())
+            # Write binary data, the structured array interleaves the properties of each vertex
+            for start in range(0, count, chunk_size):
+                vertices = np.empty(min(chunk_size, count - start), dtype=vertex_dtype)
+                for key, tensor in map_to_tensors.items():
+                    values = tensor[start : start + len(vertices)].reshape(-1)
+                    if isinstance(values, torch.Tensor):
+                        values = values.detach().cpu().numpy()
+                    vertices[key] = values
+                vertices.tofile(ply_file)
 
     def main(self) -> None:
         if not self.output_dir.exists():
@@ -574,25 +644,25 @@ class ExportGaussianSplat(Exporter):
 
         map_to_tensors = OrderedDict()
 
+        # the properties stay on the model's device, write_ply copies them to host memory chunk by chunk
         with torch.no_grad():
-            positions = model.means.cpu().numpy()
-            count = positions.shape[0]
-            n = count
+            positions = model.means
+            n = positions.shape[0]
+            device = positions.device
             map_to_tensors["x"] = positions[:, 0]
             map_to_tensors["y"] = positions[:, 1]
             map_to_tensors["z"] = positions[:, 2]
-            map_to_tensors["nx"] = np.zeros(n, dtype=np.float32)
-            map_to_tensors["ny"] = np.zeros(n, dtype=np.float32)
-            map_to_tensors["nz"] = np.zeros(n, dtype=np.float32)
+            map_to_tensors["nx"] = torch.zeros(n, device=device)
+            map_to_tensors["ny"] = torch.zeros(n, device=device)
+            map_to_tensors["nz"] = torch.zeros(n, device=device)
 
             if self.ply_color_mode == "rgb":
-                colors = torch.clamp(model.colors.clone(), 0.0, 1.0).data.cpu().numpy()
-                colors = (colors * 255).astype(np.uint8)
+                colors = (torch.clamp(model.colors, 0.0, 1.0) * 255).to(torch.uint8)
                 map_to_tensors["red"] = colors[:, 0]
                 map_to_tensors["green"] = colors[:, 1]
                 map_to_tensors["blue"] = colors[:, 2]
             elif self.ply_color_mode == "sh_coeffs":
-                shs_0 = model.shs_0.contiguous().cpu().numpy()
+                shs_0 = model.shs_0
                 for i in range(shs_0.shape[1]):
                     map_to_tensors[f"f_dc_{i}"] = shs_0[:, i, None]
 
@@ -603,56 +673,106 @@ class ExportGaussianSplat(Exporter):
                     )
                 elif self.ply_color_mode == "sh_coeffs":
                     # transpose(1, 2) was needed to match the sh order in Inria version
-                    shs_rest = model.shs_rest.transpose(1, 2).contiguous().cpu().numpy()
-                    shs_rest = shs_rest.reshape((n, -1))
+                    shs_rest = model.shs_rest.transpose(1, 2).reshape((n, -1))
                     for i in range(shs_rest.shape[-1]):
                         map_to_tensors[f"f_rest_{i}"] = shs_rest[:, i, None]
 
-            map_to_tensors["opacity"] = model.opacities.data.cpu().numpy()
+            map_to_tensors["opacity"] = model.opacities
 
-            scales = model.scales.data.cpu().numpy()
+            scales = model.scales
             for i in range(3):
                 map_to_tensors[f"scale_{i}"] = scales[:, i, None]
 
-            quats = model.quats.data.cpu().numpy()
+            quats = model.quats
             for i in range(4):
                 map_to_tensors[f"rot_{i}"] = quats[:, i, None]
 
+            select = torch.ones(n, dtype=torch.bool, device=device)
             if self.obb_center is not None and self.obb_rotation is not None and self.obb_scale is not None:
                 crop_obb = OrientedBox.from_params(self.obb_center, self.obb_rotation, self.obb_scale)
                 assert crop_obb is not None
-                mask = crop_obb.within(torch.from_numpy(positions)).numpy()
+                select = crop_obb.within(positions.cpu()).to(device)
+                n = int(select.sum())
+
+            # post optimization, it is possible have NaN/Inf values in some attributes
+            # to ensure the exported ply file has finite values, we enforce finite filters.
+            for k, t in map_to_tensors.items():
+                n_before = int(select.sum())
+                select &= torch.isfinite(t).reshape(len(select), -1).all(dim=-1)
+                n_after = int(select.sum())
+                if n_after < n_before:
+                    CONSOLE.print(f"{n_before - n_after} NaN/Inf elements in {k}")
+            nan_count = n - int(select.sum())
+
+            # filter gaussians that have opacities < 1/255, because they are skipped in cuda rasterization
+            low_opacity_gaussians = map_to_tensors["opacity"].squeeze(-1) < -5.5373  # logit(1/255)
+            lowopa_count = int(low_opacity_gaussians.sum())
+            select &= ~low_opacity_gaussians
+
+            count = int(select.sum())
+            if count < n:
+                CONSOLE.print(
+                    f"{nan_count} Gaussians have NaN/Inf and {lowopa_count} have low opacity, only export {count}/{n}"
+                )
+            if count < len(select):
                 for k, t in map_to_tensors.items():
-                    map_to_tensors[k] = map_to_tensors[k][mask]
-
-                n = map_to_tensors["x"].shape[0]
-                count = n
-
-        # post optimization, it is possible have NaN/Inf values in some attributes
-        # to ensure the exported ply file has finite values, we enforce finite filters.
-        select = np.ones(n, dtype=bool)
-        for k, t in map_to_tensors.items():
-            n_before = np.sum(select)
-            select = np.logical_and(select, np.isfinite(t).all(axis=-1))
-            n_after = np.sum(select)
-            if n_after < n_before:
-                CONSOLE.print(f"{n_before - n_after} NaN/Inf elements in {k}")
-        nan_count = np.sum(select) - n
-
-        # filter gaussians that have opacities < 1/255, because they are skipped in cuda rasterization
-        low_opacity_gaussians = (map_to_tensors["opacity"]).squeeze(axis=-1) < -5.5373  # logit(1/255)
-        lowopa_count = np.sum(low_opacity_gaussians)
-        select[low_opacity_gaussians] = 0
-
-        if np.sum(select) < n:
+                    map_to_tensors[k] = t[select]
+
+            if self.ply_format == "compressed":
+                gaussians = {
+                    "means": model.means,
+                    "scales": model.scales,
+                    "quats": model.quats,
+                    "opacities": model.opacities,
+                    "shs_0": model.shs_0,
+                }
+                if model.config.sh_degree > 0 and self.ply_color_mode == "sh_coeffs":
+                    gaussians["shs_rest"] = model.shs_rest
+                gaussians = {k: t[select] for k, t in gaussians.items()}
+                filename = filename.with_suffix(".compressed.ply")
+                splat_compression.write_compressed_splat(filename, gaussians)
+                if self.check_compression:
+                    self._check_compression(pipeline, gaussians, filename, map_to_tensors)
+            else:
+                ExportGaussianSplat.write_ply(str(filename), count, map_to_tensors)
+
+    def _check_compression(
+        self,
+        pipeline: Pipeline,
+        gaussians: Dict[str, Tensor],
+        filename: Path,
+        map_to_tensors: typing.OrderedDict[str, Tensor],
+    ) -> None:
+        """Compares a compressed file with the full precision PLY of the same Gaussians."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            full_filename = Path(tmp_dir) / "splat.ply"
+            ExportGaussianSplat.write_ply(str(full_filename), len(gaussians["means"]), map_to_tensors)
+            start = time.perf_counter()
+            splat_compression.read_ply(full_filename)
             CONSOLE.print(
-                f"{nan_count} Gaussians have NaN/Inf and {lowopa_count} have low opacity, only export {np.sum(select)}/{n}"
+                f"Full precision PLY: {full_filename.stat().st_size / 1e6:.1f} MB, "
+                f"loaded in {time.perf_counter() - start:.2f} s"
             )
-            for k, t in map_to_tensors.items():
-                map_to_tensors[k] = map_to_tensors[k][select]
-            count = np.sum(select)
+        start = time.perf_counter()
+        decoded = splat_compression.read_compressed_splat(filename)
+        CONSOLE.print(
+            f"Compressed PLY: {filename.stat().st_size / 1e6:.1f} MB, decoded in {time.perf_counter() - start:.2f} s"
+        )
 
-        ExportGaussianSplat.write_ply(str(filename), count, map_to_tensors)
+        model = cast(SplatfactoModel, pipeline.model)
+        cameras = pipeline.datamanager.eval_dataset.cameras
+        num_images = min(self.num_check_images, len(cameras))
+        image_indices = np.linspace(0, len(cameras) - 1, num_images).round().astype(int).tolist()
+        renders = []
+        for splat in (gaussians, decoded):
+            splat_compression.load_gaussians(model, splat)
+            with torch.no_grad():
+                renders.append([model.get_outputs_for_camera(cameras[i : i + 1])["rgb"] for i in image_indices])
+        psnrs = [float(model.psnr(decoded_render, render)) for render, decoded_render in zip(*renders)]
+        CONSOLE.print(
+            f"PSNR of the decoded Gaussians against the exported ones on {len(psnrs)} eval images: "
+            f"mean {np.mean(psnrs):.2f} dB, min {np.min(psnrs):.2f} dB"
+        )
 
 
 Commands = tyro.conf.FlagConversionOff[
@@ -19,22 +19,24 @@ render.py
 
 from __future__ import annotations
 
+import copy
+import functools
 import gzip
 import json
 import os
-import shutil
 import struct
 import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Literal, Optional, Union
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Tuple, Union
 
 import mediapy as media
 import numpy as np
 import torch
 import tyro
-import viser.transforms as tf
 from jaxtyping import Float
 from rich import box, style
 from rich.panel import Panel
@@ -51,14 +53,84 @@ from nerfstudio.data.datamanagers.parallel_datamanager import ParallelDataManage
 from nerfstudio.data.datamanagers.random_cameras_datamanager import RandomCamerasDataManager
 from nerfstudio.data.datasets.base_dataset import Dataset
 from nerfstudio.data.scene_box import OrientedBox
-from nerfstudio.data.utils.dataloaders import FixedIndicesEvalDataloader
+from nerfstudio.data.utils.dataloaders import FixedIndicesEvalDataloader, iter_prefetched
 from nerfstudio.engine.trainer import TrainerConfig
 from nerfstudio.model_components import renderers
+from nerfstudio.models.base_model import Model
 from nerfstudio.pipelines.base_pipeline import Pipeline
 from nerfstudio.utils import colormaps, install_checks
 from nerfstudio.utils.eval_utils import eval_setup
+from nerfstudio.utils.misc import batched
 from nerfstudio.utils.rich_utils import CONSOLE, ItersPerSecColumn
-from nerfstudio.utils.scripts import run_command
+
+RENDER_INFO_FILENAME = "render_info.json"
+
+
+class NearestCameraIndex:
+    """Finds the training camera closest to a rendered camera.
+
+    The distance combines the rotation and position differences as ``0.3 * (1 - <q, q_train>^2) + 0.7 * ||t - t_train||``
+    with q the unit quaternions of the camera rotations. The poses of the training cameras are stacked once, so a
+    query scores all of them with a few vectorized operations.
+
+    Args:
+        camera_to_worlds: poses of the training cameras, on the device of the model used for occlusion tests
+        occlusion_chunk_size: number of candidate cameras whose visibility is tested with one model query
+    """
+
+    def __init__(self, camera_to_worlds: Float[Tensor, "num_cameras 3 4"], occlusion_chunk_size: int = 256) -> None:
+        self.rotations = camera_to_worlds[:, :3, :3]
+        self.positions = camera_to_worlds[:, :3, 3]
+        self.occlusion_chunk_size = occlusion_chunk_size
+
+    def get_distances(self, camera_to_world: Float[Tensor, "3 4"]) -> Float[Tensor, "num_cameras"]:
+        """Returns the distances of all training cameras to a camera pose."""
+        camera_to_world = camera_to_world.to(self.rotations)
+        # <q1, q2>^2 = (1 + trace(R1^T R2)) / 4
+        trace = (self.rotations * camera_to_world[:3, :3]).sum(dim=(-2, -1))
+        rot_dist = 1 - (1 + trace) / 4
+        pos_dist = torch.linalg.norm(self.positions - camera_to_world[:3, 3], dim=-1)
+        return 0.3 * rot_dist + 0.7 * pos_dist
+
+    @torch.no_grad()
+    def get_nearest(
+        self,
+        camera_to_world: Float[Tensor, "3 4"],
+        get_outputs: Optional[Callable[[RayBundle], Dict[str, Tensor]]] = None,
+    ) -> int:
+        """Returns the index of the nearest training camera.
+
+        Args:
+            camera_to_world: pose of the rendered camera
+            get_outputs: if set, the function rendering the ray bundles of the model, e.g. ``model.get_outputs``.
+                Training cameras whose line of sight to the rendered camera is blocked in the rendered depth are
+                skipped, unless all of them are blocked.
+        """
+        distances = self.get_distances(camera_to_world)
+        nearest = int(torch.argmin(distances))
+        if get_outputs is None:
+            return nearest
+
+        # test the candidates in order of distance, a chunk of line of sight rays at a time
+        origin = camera_to_world[:3, 3].to(self.positions)
+        for candidates in torch.argsort(distances).split(self.occlusion_chunk_size):
+            offsets = self.positions[candidates] - origin
+            ranges = torch.linalg.norm(offsets, dim=-1, keepdim=True)
+            ones = torch.ones_like(ranges)
+            bundle = RayBundle(
+                origins=origin.expand(len(candidates), 3),
+                directions=offsets / ranges.clamp(min=1e-8),
+                pixel_area=ones,
+                nears=ones * 0.05,
+                fars=ones * 100.0,
+                camera_indices=torch.zeros_like(ranges, dtype=torch.long),
+                metadata={},
+            )
+            depth = get_outputs(bundle)["depth"].to(ranges)
+            visible = torch.nonzero(depth.view(-1) >= ranges.view(-1))
+            if len(visible) > 0:
+                return int(candidates[visible[0, 0]])
+        return nearest
 
 
 def _render_trajectory_video(
@@ -77,9 +149,16 @@ def _render_trajectory_video(
     colormap_options: colormaps.ColormapOptions = colormaps.ColormapOptions(),
     render_nearest_camera=False,
     check_occlusions: bool = False,
+    right_eye_cameras: Optional[Cameras] = None,
+    max_queued_frames: int = 4,
+    frame_indices: Optional[Sequence[int]] = None,
+    skip_existing: bool = False,
 ) -> None:
     """Helper function to create a video of the spiral trajectory.
 
+    Rendering, colormapping and encoding run concurrently: frames are rendered on the calling thread while the
+    previous frames are colormapped and encoded on two background threads, connected by a bounded queue.
+
     Args:
         pipeline: Pipeline to evaluate with.
         cameras: Cameras to render.
@@ -94,11 +173,30 @@ def _render_trajectory_video(
         colormap_options: Options for colormap.
         render_nearest_camera: Whether to render the nearest training camera to the rendered camera.
         check_occlusions: If true, checks line-of-sight occlusions when computing camera distance and rejects cameras not visible to each other
+        right_eye_cameras: For stereo (ODS or VR180) output, the right eye cameras matching ``cameras``. Both eyes
+            are rendered for every frame and written as a single frame, stacked vertically for ODS and side by side
+            for VR180.
+        max_queued_frames: Maximum number of rendered frames waiting to be colormapped and encoded.
+        frame_indices: Frames of the trajectory to render, all of them if None. A subset of the frames is always
+            written as an image sequence, to be assembled into a video with ``ns-render merge``.
+        skip_existing: Whether to skip frames whose image already exists, to resume an interrupted render.
     """
     CONSOLE.print("[bold green]Creating trajectory " + output_format)
     cameras.rescale_output_resolution(rendered_resolution_scaling_factor)
     cameras = cameras.to(pipeline.device)
+    eye_cameras = [cameras]
+    if right_eye_cameras is not None:
+        right_eye_cameras.rescale_output_resolution(rendered_resolution_scaling_factor)
+        eye_cameras.append(right_eye_cameras.to(pipeline.device))
+    # ODS stacks the eyes top/bottom, VR180 side by side
+    stereo_axis = 0 if cameras.camera_type[0] == CameraType.OMNIDIRECTIONALSTEREO_L.value else 1
     fps = len(cameras) / seconds
+    is_partial = frame_indices is not None or skip_existing
+    if frame_indices is None:
+        frame_indices = range(cameras.size)
+    if output_format == "video" and is_partial:
+        # a video can only be written in one go, so partial renders are merged from their frames later
+        output_format = "images"
 
     progress = Progress(
         TextColumn(":movie_camera: Rendering :movie_camera:"),
@@ -112,8 +210,20 @@ def _render_trajectory_video(
         TimeElapsedColumn(),
     )
     output_image_dir = output_filename.parent / output_filename.stem
+
+    def get_image_path(camera_idx: int) -> Path:
+        return output_image_dir / f"{camera_idx:05d}.{'png' if image_format == 'png' else 'jpg'}"
+
     if output_format == "images":
         output_image_dir.mkdir(parents=True, exist_ok=True)
+        render_info = {
+            "num_frames": cameras.size,
+            "fps": fps,
+            "equirectangular": cameras.camera_type[0].item() == CameraType.EQUIRECTANGULAR.value,
+        }
+        (output_image_dir / RENDER_INFO_FILENAME).write_text(json.dumps(render_info), encoding="utf8")
+        if skip_existing:
+            frame_indices = [camera_idx for camera_idx in frame_indices if not get_image_path(camera_idx).exists()]
     if output_format == "video":
         # make the folder if it doesn't exist
         output_filename.parent.mkdir(parents=True, exist_ok=True)
@@ -124,160 +234,164 @@ def _render_trajectory_video(
         # (unless we reserve enough space to overwrite with our uuid tag,
         # but we don't know how big the video file will be, so it's not certain!)
 
-    with ExitStack() as stack:
-        writer = None
+    if render_nearest_camera:
+        assert pipeline.datamanager.train_dataset is not None
+        train_dataset = pipeline.datamanager.train_dataset
+        nearest_camera_index = NearestCameraIndex(train_dataset.cameras.camera_to_worlds.to(pipeline.device))
+    else:
+        train_dataset = None
+        nearest_camera_index = None
+
+    @functools.lru_cache(maxsize=8)
+    def get_nearest_image(max_idx: int) -> np.ndarray:
+        """Loads a training image at the height of the rendered images. Consecutive frames usually share the
+        nearest training camera, so recently loaded images are cached."""
+        assert train_dataset is not None
+        img = train_dataset.get_image_float32(max_idx)
+        height = cameras.image_height[0]
+        # maintain the resolution of the img to calculate the width from the height
+        width = int(img.shape[1] * (height / img.shape[0]))
+        resized_image = torch.nn.functional.interpolate(img.permute(2, 0, 1)[None], size=(int(height), int(width)))
+        resized_image = resized_image[0].permute(1, 2, 0)
+        return (
+            colormaps.apply_colormap(
+                image=resized_image,
+                colormap_options=colormap_options,
+            )
+            .cpu()
+            .numpy()
+        )
 
-        if render_nearest_camera:
-            assert pipeline.datamanager.train_dataset is not None
-            train_dataset = pipeline.datamanager.train_dataset
-            train_cameras = train_dataset.cameras.to(pipeline.device)
+    def render_outputs(eye_cameras: List[Cameras]) -> List[Dict[str, Tensor]]:
+        """Renders a batch of cameras with one call where the model supports it."""
+        obb_box = None
+        if crop_data is not None:
+            obb_box = crop_data.obb
+
+        if crop_data is not None:
+            with renderers.background_color_override_context(
+                crop_data.background_color.to(pipeline.device)
+            ), torch.no_grad():
+                outputs_list = pipeline.model.get_outputs_for_cameras(eye_cameras, obb_box=obb_box)
         else:
-            train_dataset = None
-            train_cameras = None
-
-        with progress:
-            for camera_idx in progress.track(range(cameras.size), description=""):
-                obb_box = None
-                if crop_data is not None:
-                    obb_box = crop_data.obb
-
-                max_dist, max_idx = -1, -1
-                true_max_dist, true_max_idx = -1, -1
-
-                if render_nearest_camera:
-                    assert pipeline.datamanager.train_dataset is not None
-                    assert train_dataset is not None
-                    assert train_cameras is not None
-                    cam_pos = cameras[camera_idx].camera_to_worlds[:, 3].cpu()
-                    cam_quat = tf.SO3.from_matrix(cameras[camera_idx].camera_to_worlds[:3, :3].numpy(force=True)).wxyz
-
-                    for i in range(len(train_cameras)):
-                        train_cam_pos = train_cameras[i].camera_to_worlds[:, 3].cpu()
-                        # Make sure the line of sight from rendered cam to training cam is not blocked by any object
-                        bundle = RayBundle(
-                            origins=cam_pos.view(1, 3),
-                            directions=((cam_pos - train_cam_pos) / (cam_pos - train_cam_pos).norm()).view(1, 3),
-                            pixel_area=torch.tensor(1).view(1, 1),
-                            nears=torch.tensor(0.05).view(1, 1),
-                            fars=torch.tensor(100).view(1, 1),
-                            camera_indices=torch.tensor(0).view(1, 1),
-                            metadata={},
-                        ).to(pipeline.device)
-                        outputs = pipeline.model.get_outputs(bundle)
-
-                        q = tf.SO3.from_matrix(train_cameras[i].camera_to_worlds[:3, :3].numpy(force=True)).wxyz
-                        # calculate distance between two quaternions
-                        rot_dist = 1 - np.dot(q, cam_quat) ** 2
-                        pos_dist = torch.norm(train_cam_pos - cam_pos)
-                        dist = 0.3 * rot_dist + 0.7 * pos_dist
-
-                        if true_max_dist == -1 or dist < true_max_dist:
-                            true_max_dist = dist
-                            true_max_idx = i
-
-                        if outputs["depth"][0] < torch.norm(cam_pos - train_cam_pos).item():
-                            continue
-
-                        if check_occlusions and (max_dist == -1 or dist < max_dist):
-                            max_dist = dist
-                            max_idx = i
-
-                    if max_idx == -1:
-                        max_idx = true_max_idx
-
-                if crop_data is not None:
-                    with renderers.background_color_override_context(
-                        crop_data.background_color.to(pipeline.device)
-                    ), torch.no_grad():
-                        outputs = pipeline.model.get_outputs_for_camera(
-                            cameras[camera_idx : camera_idx + 1], obb_box=obb_box
+            with torch.no_grad():
+                outputs_list = pipeline.model.get_outputs_for_cameras(eye_cameras, obb_box=obb_box)
+                if rendered_output_names is not None and "rgba" in rendered_output_names:
+                    for outputs in outputs_list:
+                        rgba = pipeline.model.get_rgba_image(outputs=outputs, output_name="rgb")
+                        outputs["rgba"] = rgba
+
+        for rendered_output_name in rendered_output_names:
+            if rendered_output_name not in outputs_list[0]:
+                CONSOLE.rule("Error", style="red")
+                CONSOLE.print(f"Could not find {rendered_output_name} in the model outputs", justify="center")
+                CONSOLE.print(
+                    f"Please set --rendered_output_name to one of: {outputs_list[0].keys()}", justify="center"
+                )
+                sys.exit(1)
+        return outputs_list
+
+    def get_frame(outputs_per_eye: List[Dict[str, Tensor]], max_idx: int) -> np.ndarray:
+        """Colormaps and concatenates the outputs of a frame, runs on the colormap thread."""
+        eye_images = []
+        for outputs in outputs_per_eye:
+            render_image = []
+            for rendered_output_name in rendered_output_names:
+                output_image = outputs[rendered_output_name]
+                is_depth = rendered_output_name.find("depth") != -1
+                if is_depth:
+                    output_image = (
+                        colormaps.apply_depth_colormap(
+                            output_image,
+                            accumulation=outputs["accumulation"],
+                            near_plane=depth_near_plane,
+                            far_plane=depth_far_plane,
+                            colormap_options=colormap_options,
                         )
+                        .cpu()
+                        .numpy()
+                    )
+                elif rendered_output_name == "rgba":
+                    output_image = output_image.detach().cpu().numpy()
                 else:
-                    with torch.no_grad():
-                        outputs = pipeline.model.get_outputs_for_camera(
-                            cameras[camera_idx : camera_idx + 1], obb_box=obb_box
-                        )
-                        if rendered_output_names is not None and "rgba" in rendered_output_names:
-                            rgba = pipeline.model.get_rgba_image(outputs=outputs, output_name="rgb")
-                            outputs["rgba"] = rgba
-
-                render_image = []
-                for rendered_output_name in rendered_output_names:
-                    if rendered_output_name not in outputs:
-                        CONSOLE.rule("Error", style="red")
-                        CONSOLE.print(f"Could not find {rendered_output_name} in the model outputs", justify="center")
-                        CONSOLE.print(
-                            f"Please set --rendered_output_name to one of: {outputs.keys()}", justify="center"
-                        )
-                        sys.exit(1)
-                    output_image = outputs[rendered_output_name]
-                    is_depth = rendered_output_name.find("depth") != -1
-                    if is_depth:
-                        output_image = (
-                            colormaps.apply_depth_colormap(
-                                output_image,
-                                accumulation=outputs["accumulation"],
-                                near_plane=depth_near_plane,
-                                far_plane=depth_far_plane,
-                                colormap_options=colormap_options,
-                            )
-                            .cpu()
-                            .numpy()
-                        )
-                    elif rendered_output_name == "rgba":
-                        output_image = output_image.detach().cpu().numpy()
-                    else:
-                        output_image = (
-                            colormaps.apply_colormap(
-                                image=output_image,
-                                colormap_options=colormap_options,
-                            )
-                            .cpu()
-                            .numpy()
-                        )
-                    render_image.append(output_image)
-
-                # Add closest training image to the right of the rendered image
-                if render_nearest_camera:
-                    assert train_dataset is not None
-                    assert train_cameras is not None
-                    img = train_dataset.get_image_float32(max_idx)
-                    height = cameras.image_height[0]
-                    # maintain the resolution of the img to calculate the width from the height
-                    width = int(img.shape[1] * (height / img.shape[0]))
-                    resized_image = torch.nn.functional.interpolate(
-                        img.permute(2, 0, 1)[None], size=(int(height), int(width))
-                    )[0].permute(1, 2, 0)
-                    resized_image = (
+                    output_image = (
                         colormaps.apply_colormap(
-                            image=resized_image,
+                            image=output_image,
                             colormap_options=colormap_options,
                         )
                         .cpu()
                         .numpy()
                     )
-                    render_image.append(resized_image)
-
-                render_image = np.concatenate(render_image, axis=1)
-                if output_format == "images":
-                    if image_format == "png":
-                        media.write_image(output_image_dir / f"{camera_idx:05d}.png", render_image, fmt="png")
-                    if image_format == "jpeg":
-                        media.write_image(
-                            output_image_dir / f"{camera_idx:05d}.jpg", render_image, fmt="jpeg", quality=jpeg_quality
+                render_image.append(output_image)
+
+            # Add closest training image to the right of the rendered image
+            if render_nearest_camera:
+                render_image.append(get_nearest_image(max_idx))
+
+            eye_images.append(np.concatenate(render_image, axis=1))
+        return np.concatenate(eye_images, axis=stereo_axis)
+
+    with ExitStack() as stack:
+        writer = None
+
+        def write_frame(frame: Future, camera_idx: int) -> None:
+            """Writes a colormapped frame, runs on the encoder thread."""
+            nonlocal writer
+            render_image = frame.result()
+            if output_format == "images":
+                image_path = get_image_path(camera_idx)
+                # write to a hidden file first, so that an interrupted write is never mistaken for a rendered frame
+                tmp_path = image_path.with_name(f".{image_path.name}")
+                if image_format == "png":
+                    media.write_image(tmp_path, render_image, fmt="png")
+                if image_format == "jpeg":
+                    media.write_image(tmp_path, render_image, fmt="jpeg", quality=jpeg_quality)
+                os.replace(tmp_path, image_path)
+            if output_format == "video":
+                if writer is None:
+                    render_width = int(render_image.shape[1])
+                    render_height = int(render_image.shape[0])
+                    writer = stack.enter_context(
+                        media.VideoWriter(
+                            path=output_filename,
+                            shape=(render_height, render_width),
+                            fps=fps,
                         )
-                if output_format == "video":
-                    if writer is None:
-                        render_width = int(render_image.shape[1])
-                        render_height = int(render_image.shape[0])
-                        writer = stack.enter_context(
-                            media.VideoWriter(
-                                path=output_filename,
-                                shape=(render_height, render_width),
-                                fps=fps,
-                            )
+                    )
+                writer.add_image(render_image)
+
+        # the executors are shut down before the video writer is closed
+        colormap_executor = stack.enter_context(ThreadPoolExecutor(max_workers=1, thread_name_prefix="colormap"))
+        encoder_executor = stack.enter_context(ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder"))
+        pending_frames: Deque[Future] = deque()
+
+        with progress:
+            task = progress.add_task("", total=len(frame_indices))
+            for frame_batch in batched(
+                frame_indices,
+                lambda camera_idx: pipeline.model.get_num_cameras_per_batch(cameras[camera_idx : camera_idx + 1]),
+            ):
+                # every eye renders the frames of the batch with one call, where the model supports it
+                outputs_per_eye = [
+                    render_outputs([eye[camera_idx : camera_idx + 1] for camera_idx in frame_batch])
+                    for eye in eye_cameras
+                ]
+                for i, camera_idx in enumerate(frame_batch):
+                    max_idx = -1
+                    if nearest_camera_index is not None:
+                        max_idx = nearest_camera_index.get_nearest(
+                            cameras.camera_to_worlds[camera_idx],
+                            get_outputs=pipeline.model.get_outputs if check_occlusions else None,
                         )
-                    writer.add_image(render_image)
+
+                    frame = colormap_executor.submit(get_frame, [outputs[i] for outputs in outputs_per_eye], max_idx)
+                    pending_frames.append(encoder_executor.submit(write_frame, frame, camera_idx))
+                    progress.advance(task)
+                # bound the number of frames, and their device memory, waiting to be colormapped and encoded
+                while len(pending_frames) > max(max_queued_frames, len(frame_batch)):
+                    pending_frames.popleft().result()
+            while pending_frames:
+                pending_frames.popleft().result()
 
     table = Table(
         title=None,
@@ -292,6 +406,8 @@ def _render_trajectory_video(
         table.add_row("Video", str(output_filename))
     else:
         table.add_row("Images", str(output_image_dir))
+        if is_partial:
+            table.add_row("Merge into a video", f"ns-render merge --frames-dir {output_image_dir}")
     CONSOLE.print(Panel(table, title="[bold][green]:tada: Render Complete :tada:[/bold]", expand=False))
 
 
@@ -437,6 +553,32 @@ class BaseRender:
     """If true, checks line-of-sight occlusions when computing camera distance and rejects cameras not visible to each other"""
     camera_idx: Optional[int] = None
     """Index of the training camera to render."""
+    frame_range: Optional[Tuple[int, int]] = None
+    """Only render the frames in [start, end), e.g. to split a long render or to redo part of it. Partial video
+    renders are written as image sequences, see ns-render merge."""
+    shard: Optional[Tuple[int, int]] = None
+    """Only render shard i of n, given as "i n". The frames (of the frame range, if set) are split into n contiguous
+    ranges, so that the shards can be rendered by independent processes or machines."""
+    skip_existing: bool = False
+    """Skip frames that are already rendered in the output directory, to resume an interrupted render."""
+
+    def get_frame_indices(self, num_frames: int) -> Optional[range]:
+        """Returns the frames selected by frame_range and shard, or None to render all frames.
+
+        Args:
+            num_frames: number of frames of the whole trajectory or dataset
+        """
+        if self.frame_range is None and self.shard is None:
+            return None
+        start, end = (0, num_frames) if self.frame_range is None else self.frame_range
+        start, end = max(0, start), min(num_frames, end)
+        if self.shard is not None:
+            index, count = self.shard
+            if not 0 <= index < count:
+                raise ValueError(f"Invalid shard {index} of {count}, the index must be in [0, {count}).")
+            length = max(0, end - start)
+            start, end = start + length * index // count, start + length * (index + 1) // count
+        return range(start, max(start, end))
 
 
 @dataclass
@@ -464,24 +606,22 @@ class RenderCameraPath(BaseRender):
         crop_data = get_crop_from_json(camera_path)
         camera_path = get_path_from_json(camera_path)
 
-        if (
-            camera_path.camera_type[0] == CameraType.OMNIDIRECTIONALSTEREO_L.value
-            or camera_path.camera_type[0] == CameraType.VR180_L.value
-        ):
-            # temp folder for writing left and right view renders
-            temp_folder_path = self.output_path.parent / (self.output_path.stem + "_temp")
-
-            Path(temp_folder_path).mkdir(parents=True, exist_ok=True)
-            left_eye_path = temp_folder_path / "render_left.mp4"
-
-            self.output_path = left_eye_path
-
-            if camera_path.camera_type[0] == CameraType.OMNIDIRECTIONALSTEREO_L.value:
+        right_eye_cameras = None
+        right_eye_camera_types = {
+            CameraType.OMNIDIRECTIONALSTEREO_L.value: CameraType.OMNIDIRECTIONALSTEREO_R,
+            CameraType.VR180_L.value: CameraType.VR180_R,
+        }
+        left_eye_camera_type = int(camera_path.camera_type[0])
+        if left_eye_camera_type in right_eye_camera_types:
+            if left_eye_camera_type == CameraType.OMNIDIRECTIONALSTEREO_L.value:
                 CONSOLE.print("[bold green]:goggles: Omni-directional Stereo VR :goggles:")
             else:
                 CONSOLE.print("[bold green]:goggles: VR180 :goggles:")
-
-            CONSOLE.print("Rendering left eye view")
+            # both eyes are rendered frame by frame and stacked into the same output
+            right_eye_cameras = copy.copy(camera_path)
+            right_eye_cameras.camera_type = torch.full_like(
+                camera_path.camera_type, right_eye_camera_types[left_eye_camera_type].value
+            )
 
         # add mp4 suffix to video output if none is specified
         if self.output_format == "video" and str(self.output_path.suffix) == "":
@@ -489,6 +629,8 @@ class RenderCameraPath(BaseRender):
 
         if self.camera_idx is not None:
             camera_path.metadata = {"cam_idx": self.camera_idx}
+            if right_eye_cameras is not None:
+                right_eye_cameras.metadata = {"cam_idx": self.camera_idx}
 
         _render_trajectory_video(
             pipeline,
@@ -506,87 +648,11 @@ class RenderCameraPath(BaseRender):
             colormap_options=self.colormap_options,
             render_nearest_camera=self.render_nearest_camera,
             check_occlusions=self.check_occlusions,
+            right_eye_cameras=right_eye_cameras,
+            frame_indices=self.get_frame_indices(len(camera_path)),
+            skip_existing=self.skip_existing,
         )
 
-        if (
-            camera_path.camera_type[0] == CameraType.OMNIDIRECTIONALSTEREO_L.value
-            or camera_path.camera_type[0] == CameraType.VR180_L.value
-        ):
-            # declare paths for left and right renders
-
-            left_eye_path = self.output_path
-            right_eye_path = left_eye_path.parent / "render_right.mp4"
-
-            self.output_path = right_eye_path
-
-            if camera_path.camera_type[0] == CameraType.OMNIDIRECTIONALSTEREO_L.value:
-                camera_path.camera_type[0] = CameraType.OMNIDIRECTIONALSTEREO_R.value
-            else:
-                camera_path.camera_type[0] = CameraType.VR180_R.value
-
-            CONSOLE.print("Rendering right eye view")
-            _render_trajectory_video(
-                pipeline,
-                camera_path,
-                output_filename=self.output_path,
-                rendered_output_names=self.rendered_output_names,
-                rendered_resolution_scaling_factor=1.0 / self.downscale_factor,
-                crop_data=crop_data,
-                seconds=seconds,
-                output_format=self.output_format,
-                image_format=self.image_format,
-                jpeg_quality=self.jpeg_quality,
-                depth_near_plane=self.depth_near_plane,
-                depth_far_plane=self.depth_far_plane,
-                colormap_options=self.colormap_options,
-                render_nearest_camera=self.render_nearest_camera,
-                check_occlusions=self.check_occlusions,
-            )
-
-            self.output_path = Path(str(left_eye_path.parent)[:-5] + ".mp4")
-
-            if camera_path.camera_type[0] == CameraType.OMNIDIRECTIONALSTEREO_R.value:
-                # stack the left and right eye renders vertically for ODS final output
-                ffmpeg_ods_command = ""
-                if self.output_format == "video":
-                    ffmpeg_ods_command = f'ffmpeg -y -i "{left_eye_path}" -i "{right_eye_path}" -filter_complex "[0:v]pad=iw:2*ih[int];[int][1:v]overlay=0:h" -c:v libx264 -crf 23 -preset veryfast "{self.output_path}"'
-                    run_command(ffmpeg_ods_command, verbose=False)
-                if self.output_format == "images":
-                    # create a folder for the stacked renders
-                    self.output_path = Path(str(left_eye_path.parent)[:-5])
-                    self.output_path.mkdir(parents=True, exist_ok=True)
-                    if self.image_format == "png":
-                        ffmpeg_ods_command = f'ffmpeg -y -pattern_type glob -i "{str(left_eye_path.with_suffix("") / "*.png")}"  -pattern_type glob -i "{str(right_eye_path.with_suffix("") / "*.png")}" -filter_complex vstack -start_number 0 "{str(self.output_path)+"//%05d.png"}"'
-                    elif self.image_format == "jpeg":
-                        ffmpeg_ods_command = f'ffmpeg -y -pattern_type glob -i "{str(left_eye_path.with_suffix("") / "*.jpg")}"  -pattern_type glob -i "{str(right_eye_path.with_suffix("") / "*.jpg")}" -filter_complex vstack -start_number 0 "{str(self.output_path)+"//%05d.jpg"}"'
-                    run_command(ffmpeg_ods_command, verbose=False)
-
-                # remove the temp files directory
-                if str(left_eye_path.parent)[-5:] == "_temp":
-                    shutil.rmtree(left_eye_path.parent, ignore_errors=True)
-                CONSOLE.print("[bold green]Final ODS Render Complete")
-            else:
-                # stack the left and right eye renders horizontally for VR180 final output
-                self.output_path = Path(str(left_eye_path.parent)[:-5] + ".mp4")
-                ffmpeg_vr180_command = ""
-                if self.output_format == "video":
-                    ffmpeg_vr180_command = f'ffmpeg -y -i "{right_eye_path}" -i "{left_eye_path}" -filter_complex "[1:v]hstack=inputs=2" -c:a copy "{self.output_path}"'
-                    run_command(ffmpeg_vr180_command, verbose=False)
-                if self.output_format == "images":
-                    # create a folder for the stacked renders
-                    self.output_path = Path(str(left_eye_path.parent)[:-5])
-                    self.output_path.mkdir(parents=True, exist_ok=True)
-                    if self.image_format == "png":
-                        ffmpeg_vr180_command = f'ffmpeg -y -pattern_type glob -i "{str(left_eye_path.with_suffix("") / "*.png")}"  -pattern_type glob -i "{str(right_eye_path.with_suffix("") / "*.png")}" -filter_complex hstack -start_number 0 "{str(self.output_path)+"//%05d.png"}"'
-                    elif self.image_format == "jpeg":
-                        ffmpeg_vr180_command = f'ffmpeg -y -pattern_type glob -i "{str(left_eye_path.with_suffix("") / "*.jpg")}"  -pattern_type glob -i "{str(right_eye_path.with_suffix("") / "*.jpg")}" -filter_complex hstack -start_number 0 "{str(self.output_path)+"//%05d.jpg"}"'
-                    run_command(ffmpeg_vr180_command, verbose=False)
-
-                # remove the temp files directory
-                if str(left_eye_path.parent)[-5:] == "_temp":
-                    shutil.rmtree(left_eye_path.parent, ignore_errors=True)
-                CONSOLE.print("[bold green]Final VR180 Render Complete")
-
 
 @dataclass
 class RenderInterpolated(BaseRender):
@@ -644,6 +710,8 @@ class RenderInterpolated(BaseRender):
             colormap_options=self.colormap_options,
             render_nearest_camera=self.render_nearest_camera,
             check_occlusions=self.check_occlusions,
+            frame_indices=self.get_frame_indices(len(camera_path)),
+            skip_existing=self.skip_existing,
         )
 
 
@@ -699,9 +767,23 @@ class SpiralRender(BaseRender):
             colormap_options=self.colormap_options,
             render_nearest_camera=self.render_nearest_camera,
             check_occlusions=self.check_occlusions,
+            frame_indices=self.get_frame_indices(len(camera_path)),
+            skip_existing=self.skip_existing,
         )
 
 
+def _render_in_batches(
+    model: Model, images: Iterable[Tuple[int, Tuple[Cameras, Dict[str, Any]]]]
+) -> Iterator[Tuple[int, Dict[str, Any], Dict[str, Tensor]]]:
+    """Renders the cameras of (index, (camera, batch)) items, several per call where the model supports it, and
+    yields (index, batch, outputs) in order."""
+    for image_batch in batched(images, lambda item: model.get_num_cameras_per_batch(item[1][0])):
+        with torch.no_grad():
+            outputs_list = model.get_outputs_for_cameras([camera for _, (camera, _) in image_batch])
+        for (image_idx, (_, batch)), outputs in zip(image_batch, outputs_list):
+            yield image_idx, batch, outputs
+
+
 @contextmanager
 def _disable_datamanager_setup(cls):
     """
@@ -731,6 +813,19 @@ class DatasetRender(BaseRender):
     rendered_output_names: Optional[List[str]] = field(default_factory=lambda: None)
     """Name of the renderer outputs to use. rgb, depth, raw-depth, gt-rgb etc. By default all outputs are rendered."""
 
+    def _is_rendered(self, split_dir: Path, image_name: Path) -> bool:
+        """Returns whether all outputs of an image were already rendered into a split directory."""
+        if self.rendered_output_names is not None:
+            output_names = self.rendered_output_names
+        elif split_dir.exists():
+            output_names = [path.name for path in split_dir.iterdir() if path.is_dir()]
+        else:
+            output_names = []
+        return bool(output_names) and all(
+            any((split_dir / name / image_name).with_suffix(suffix).exists() for suffix in (".png", ".jpg", ".npy.gz"))
+            for name in output_names
+        )
+
     def main(self):
         config: TrainerConfig
 
@@ -775,12 +870,23 @@ class DatasetRender(BaseRender):
                 dataparser_outputs = getattr(dataset, "_dataparser_outputs", None)
                 if dataparser_outputs is None:
                     dataparser_outputs = datamanager.dataparser.get_dataparser_outputs(split=datamanager.test_split)
+            images_root = Path(os.path.commonpath(dataparser_outputs.image_filenames))
+            image_indices = self.get_frame_indices(len(dataset))
+            image_indices = list(range(len(dataset)) if image_indices is None else image_indices)
+            if self.skip_existing:
+                image_indices = [
+                    idx
+                    for idx in image_indices
+                    if not self._is_rendered(
+                        self.output_path / split, dataparser_outputs.image_filenames[idx].relative_to(images_root)
+                    )
+                ]
             dataloader = FixedIndicesEvalDataloader(
                 input_dataset=dataset,
+                image_indices=tuple(image_indices),
                 device=datamanager.device,
                 num_workers=datamanager.world_size * 4,
             )
-            images_root = Path(os.path.commonpath(dataparser_outputs.image_filenames))
             with Progress(
                 TextColumn(f":movie_camera: Rendering split {split} :movie_camera:"),
                 BarColumn(),
@@ -792,9 +898,9 @@ class DatasetRender(BaseRender):
                 TimeRemainingColumn(elapsed_when_finished=False, compact=False),
                 TimeElapsedColumn(),
             ) as progress:
-                for camera_idx, (camera, batch) in enumerate(progress.track(dataloader, total=len(dataset))):
+                images = zip(image_indices, progress.track(dataloader, total=len(image_indices)))
+                for camera_idx, batch, outputs in _render_in_batches(pipeline.model, images):
                     with torch.no_grad():
-                        outputs = pipeline.model.get_outputs_for_camera(camera)
                         if self.rendered_output_names is not None and "rgba" in self.rendered_output_names:
                             rgba = pipeline.model.get_rgba_image(outputs=outputs, output_name="rgb")
                             outputs["rgba"] = rgba
@@ -810,6 +916,9 @@ class DatasetRender(BaseRender):
                     rendered_output_names = self.rendered_output_names
                     if rendered_output_names is None:
                         rendered_output_names = ["gt-rgb"] + list(outputs.keys())
+                    # outputs are written to hidden files and only renamed once all of them are written, so that a
+                    # resumed render never skips a partially written image
+                    written_paths = []
                     for rendered_output_name in rendered_output_names:
                         if rendered_output_name not in all_outputs:
                             CONSOLE.rule("Error", style="red")
@@ -879,16 +988,23 @@ class DatasetRender(BaseRender):
 
                         # Save to file
                         if is_raw:
-                            with gzip.open(output_path.with_suffix(".npy.gz"), "wb") as f:
+                            output_path = output_path.with_suffix(".npy.gz")
+                            tmp_path = output_path.with_name(f".{output_path.name}")
+                            with gzip.open(tmp_path, "wb") as f:
                                 np.save(f, output_image)
                         elif self.image_format == "png":
-                            media.write_image(output_path.with_suffix(".png"), output_image, fmt="png")
+                            output_path = output_path.with_suffix(".png")
+                            tmp_path = output_path.with_name(f".{output_path.name}")
+                            media.write_image(tmp_path, output_image, fmt="png")
                         elif self.image_format == "jpeg":
-                            media.write_image(
-                                output_path.with_suffix(".jpg"), output_image, fmt="jpeg", quality=self.jpeg_quality
-                            )
+                            output_path = output_path.with_suffix(".jpg")
+                            tmp_path = output_path.with_name(f".{output_path.name}")
+                            media.write_image(tmp_path, output_image, fmt="jpeg", quality=self.jpeg_quality)
                         else:
                             raise ValueError(f"Unknown image format {self.image_format}")
+                        written_paths.append((tmp_path, output_path))
+                    for tmp_path, output_path in written_paths:
+                        os.replace(tmp_path, output_path)
 
         table = Table(
             title=None,
@@ -901,12 +1017,65 @@ class DatasetRender(BaseRender):
         CONSOLE.print(Panel(table, title="[bold][green]:tada: Render on split {} Complete :tada:[/bold]", expand=False))
 
 
+@dataclass
+class MergeFrames:
+    """Assemble the frames of a partial, sharded or resumed trajectory render into a video."""
+
+    frames_dir: Path
+    """Directory with the rendered frames, named like the output video without its suffix."""
+    output_path: Optional[Path] = None
+    """Path of the video. Defaults to the frames directory with an .mp4 suffix."""
+
+    def main(self) -> None:
+        """Main function."""
+        install_checks.check_ffmpeg_installed()
+        render_info = json.loads((self.frames_dir / RENDER_INFO_FILENAME).read_text(encoding="utf8"))
+        frame_paths = {
+            int(path.stem): path
+            for path in self.frames_dir.iterdir()
+            if path.suffix in (".png", ".jpg") and path.stem.isdigit()
+        }
+        num_frames = render_info["num_frames"]
+        missing = [idx for idx in range(num_frames) if idx not in frame_paths]
+        if missing:
+            CONSOLE.print(
+                f"[bold red]{len(missing)} of {num_frames} frames are missing in {self.frames_dir}, "
+                f"starting with {missing[:10]}. Render them first, e.g. with --skip-existing."
+            )
+            sys.exit(1)
+
+        output_path = self.output_path if self.output_path is not None else self.frames_dir.with_suffix(".mp4")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        frames = iter_prefetched(media.read_image(frame_paths[idx]) for idx in range(num_frames))
+        with Progress(
+            TextColumn(":movie_camera: Merging frames :movie_camera:"),
+            BarColumn(),
+            TaskProgressColumn(show_speed=True),
+            TimeRemainingColumn(elapsed_when_finished=False, compact=False),
+        ) as progress:
+            task = progress.add_task("", total=num_frames)
+            writer = None
+            with ExitStack() as stack:
+                for frame in frames:
+                    if writer is None:
+                        writer = stack.enter_context(
+                            media.VideoWriter(path=output_path, shape=frame.shape[:2], fps=render_info["fps"])
+                        )
+                    writer.add_image(frame[..., :3])
+                    progress.advance(task)
+        if render_info["equirectangular"]:
+            CONSOLE.print("Adding spherical camera data")
+            insert_spherical_metadata_into_file(output_path)
+        CONSOLE.print(f"[bold green]Saved video to {output_path}")
+
+
 Commands = tyro.conf.FlagConversionOff[
     Union[
         Annotated[RenderCameraPath, tyro.conf.subcommand(name="camera-path")],
         Annotated[RenderInterpolated, tyro.conf.subcommand(name="interpolate")],
         Annotated[SpiralRender, tyro.conf.subcommand(name="spiral")],
         Annotated[DatasetRender, tyro.conf.subcommand(name="dataset")],
+        Annotated[MergeFrames, tyro.conf.subcommand(name="merge")],
     ]
 ]
 
@@ -45,6 +45,7 @@ subcommand:
 
 from __future__ import annotations
 
+import os
 import random
 import socket
 import traceback
@@ -117,14 +118,15 @@ def _distributed_worker(
     Args:
         local_rank: Current rank of process.
         main_func: Function that will be called by the distributed workers.
-        world_size: Total number of gpus available.
-        num_devices_per_machine: Number of GPUs per machine.
+        world_size: Total number of processes.
+        num_devices_per_machine: Number of processes per machine, one per GPU or a share of the CPU cores.
         machine_rank: Rank of this machine.
         dist_url: URL to connect to for distributed jobs, including protocol
             E.g., "tcp://127.0.0.1:8686".
             It can be set to "auto" to automatically select a free port on localhost.
         config: TrainerConfig specifying training regimen.
         timeout: Timeout of the distributed workers.
+        device_type: type of device to use for training, the gloo backend is used on the CPU.
 
     Raises:
         e: Exception in initializing the process group
@@ -132,7 +134,12 @@ def _distributed_worker(
     Returns:
         Any: TODO: determine the return type
     """
-    assert torch.cuda.is_available(), "cuda is not available. Please check your installation."
+    if device_type == "cuda":
+        assert torch.cuda.is_available(), "cuda is not available. Please check your installation."
+        assert num_devices_per_machine <= torch.cuda.device_count()
+    elif device_type == "cpu":
+        # share the cores of the machine between the processes instead of oversubscribing them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_devices_per_machine))
     global_rank = machine_rank * num_devices_per_machine + local_rank
 
     dist.init_process_group(
@@ -150,7 +157,6 @@ def _distributed_worker(
         if i == machine_rank:
             comms.LOCAL_PROCESS_GROUP = pg
 
-    assert num_devices_per_machine <= torch.cuda.device_count()
     output = main_func(local_rank, world_size, config, global_rank)
     comms.synchronize()
     dist.destroy_process_group()
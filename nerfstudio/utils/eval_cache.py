@@ -0,0 +1,117 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+On-disk cache of per image evaluation results.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.engine.checkpoints import get_state_digest
+
+EVAL_CACHE_VERSION = 2
+
+
+class EvalCache:
+    """Stores the metrics and, optionally, the rendered images of every evaluated image.
+
+    An entry is keyed by the content hash of the model weights, the camera, the ground truth batch and the render
+    settings, so it is reused as long as none of them changes, e.g. when a report is recomputed for the same
+    checkpoint. Every entry is published as soon as its image is evaluated, so an interrupted evaluation resumes
+    where it stopped.
+
+    Args:
+        cache_dir: directory to store the entries in
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def get_key(model_digest: str, camera: Cameras, batch: Dict[str, Any], render_settings: str) -> str:
+        """Returns the key of the evaluation of a single image.
+
+        Args:
+            model_digest: content hash of the model state, see :func:`~nerfstudio.engine.checkpoints.get_state_digest`
+            camera: camera the image is rendered from
+            batch: ground truth the rendering is compared with
+            render_settings: description of everything else that changes the rendering, e.g. the model config
+        """
+        camera_state = {field.name: getattr(camera, field.name) for field in dataclasses.fields(camera)}
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{EVAL_CACHE_VERSION}{model_digest}{render_settings}".encode())
+        digest.update(get_state_digest(camera_state).encode())
+        digest.update(get_state_digest(batch).encode())
+        return digest.hexdigest()
+
+    def _get_entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _get_image_path(self, key: str, image_name: str) -> Path:
+        return self.cache_dir / f"{key}_{image_name}.png"
+
+    def load(self, key: str, with_images: bool = False) -> Optional[Tuple[Dict[str, float], Dict[str, Path]]]:
+        """Returns the cached metrics and the paths of the cached images of an entry.
+
+        Args:
+            key: key of the entry
+            with_images: whether the images are needed, entries stored without images are then treated as missing
+
+        Returns:
+            The metrics and the image paths, or None if the entry is not cached.
+        """
+        entry_path = self._get_entry_path(key)
+        if not entry_path.exists():
+            return None
+        entry = json.loads(entry_path.read_text(encoding="utf8"))
+        image_paths = {name: self._get_image_path(key, name) for name in entry["images"]}
+        if with_images and (not image_paths or not all(path.exists() for path in image_paths.values())):
+            return None
+        return entry["metrics"], image_paths
+
+    def save(
+        self, key: str, metrics_dict: Dict[str, Any], image_paths: Optional[Dict[str, Path]] = None
+    ) -> Dict[str, float]:
+        """Stores an entry, replacing any previous one with the same key.
+
+        Args:
+            key: key of the entry
+            metrics_dict: scalar metrics of the image, tensors are converted to floats
+            image_paths: already written PNG images to copy into the cache
+
+        Returns:
+            The metrics as stored in the cache.
+        """
+        metrics = {name: float(torch.as_tensor(value).detach().cpu()) for name, value in metrics_dict.items()}
+        image_paths = image_paths or {}
+        for name, path in image_paths.items():
+            shutil.copyfile(path, self._get_image_path(key, name))
+        entry_path = self._get_entry_path(key)
+        # the entry is written last and atomically, so it only exists once all of its images do
+        tmp_path = entry_path.with_name(f".{entry_path.name}.tmp")
+        tmp_path.write_text(json.dumps({"metrics": metrics, "images": sorted(image_paths)}), encoding="utf8")
+        os.replace(tmp_path, entry_path)
+        return metrics
@@ -27,6 +27,7 @@ import torch
 import yaml
 
 from nerfstudio.configs.method_configs import all_methods
+from nerfstudio.engine.checkpoints import get_checkpoint_path, get_latest_checkpoint_step, read_checkpoint
 from nerfstudio.engine.trainer import TrainerConfig
 from nerfstudio.pipelines.base_pipeline import Pipeline
 from nerfstudio.utils.rich_utils import CONSOLE
@@ -54,12 +55,12 @@ def eval_load_checkpoint(config: TrainerConfig, pipeline: Pipeline) -> Tuple[Pat
                 justify="center",
             )
             sys.exit(1)
-        load_step = sorted(int(x[x.find("-") + 1 : x.find(".")]) for x in os.listdir(config.load_dir))[-1]
+        load_step = get_latest_checkpoint_step(config.load_dir)
     else:
         load_step = config.load_step
-    load_path = config.load_dir / f"step-{load_step:09d}.ckpt"
+    load_path = get_checkpoint_path(config.load_dir, load_step)
     assert load_path.exists(), f"Checkpoint {load_path} does not exist"
-    loaded_state = torch.load(load_path, map_location="cpu")
+    loaded_state = read_checkpoint(load_path)
     pipeline.load_pipeline(loaded_state["pipeline"], loaded_state["step"])
     CONSOLE.print(f":white_check_mark: Done loading checkpoint from {load_path}")
     return load_path, load_step
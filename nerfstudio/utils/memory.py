@@ -0,0 +1,73 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers to measure and query memory on CUDA devices.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import torch
+
+
+@dataclass
+class PeakMemory:
+    """Result of :func:`track_peak_memory`."""
+
+    nbytes: Optional[int] = None
+    """Peak number of bytes allocated on top of what was allocated when tracking started, None if the device does
+    not report its peak memory."""
+
+
+def get_available_memory(device: Union[torch.device, str]) -> int:
+    """Returns the number of bytes that can currently be allocated on a CUDA device.
+
+    Args:
+        device: device to query
+    """
+    device = torch.device(device)
+    if device.type != "cuda":
+        raise ValueError(f"Available memory can only be queried on CUDA devices, got {device}")
+    free, _ = torch.cuda.mem_get_info(device)
+    return free
+
+
+@contextmanager
+def track_peak_memory(device: Union[torch.device, str]):
+    """Measures the peak memory allocated by torch on a device within the context.
+
+    This uses the statistics of the CUDA caching allocator. Other devices do not report peak memory, so nothing is
+    measured there and the result stays None.
+
+    Args:
+        device: device to track allocations on
+
+    Returns:
+        A :class:`PeakMemory` that is filled in when the context exits.
+    """
+    device = torch.device(device)
+    result = PeakMemory()
+    if device.type != "cuda":
+        yield result
+        return
+    torch.cuda.synchronize(device)
+    torch.cuda.reset_peak_memory_stats(device)
+    baseline = torch.cuda.memory_allocated(device)
+    yield result
+    torch.cuda.synchronize(device)
+    result.nbytes = torch.cuda.max_memory_allocated(device) - baseline
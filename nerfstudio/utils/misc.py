@@ -16,11 +16,12 @@
 Miscellaneous helper code.
 """
 
+import itertools
 import platform
 import typing
 import warnings
 from inspect import currentframe
-from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar, Union
 
 import torch
 
@@ -119,6 +120,18 @@ class IterableWrapper:
         return self
 
 
+def batched(iterable: Iterable[T], get_batch_size: Callable[[T], int]) -> Iterator[List[T]]:
+    """Groups consecutive items into lists, the size of each list is decided from its first item.
+
+    Args:
+        iterable: items to group
+        get_batch_size: returns the size of the list starting with an item
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        yield [first, *itertools.islice(iterator, max(1, get_batch_size(first)) - 1)]
+
+
 def scale_dict(dictionary: Dict[Any, Any], coefficients: Dict[str, float]) -> Dict[Any, Any]:
     """Scale a dictionary in-place given a coefficients dictionary.
 
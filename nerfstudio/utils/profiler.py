@@ -19,19 +19,23 @@ Profiler base class and functionality
 from __future__ import annotations
 
 import functools
+import json
 import os
+import threading
 import time
 import typing
 from collections import deque
 from contextlib import ContextDecorator, contextmanager
 from pathlib import Path
-from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple, TypeVar, Union, overload
+from typing import Any, Callable, ContextManager, Deque, Dict, List, Optional, Tuple, TypeVar, Union, overload
 
+import numpy as np
 from torch.profiler import ProfilerActivity, profile, record_function
 
 from nerfstudio.configs import base_config as cfg
 from nerfstudio.utils import comms
 from nerfstudio.utils.decorators import check_main_thread, check_profiler_enabled, decorate_all
+from nerfstudio.utils.misc import step_check
 from nerfstudio.utils.rich_utils import CONSOLE
 
 PROFILER = []
@@ -83,7 +87,7 @@ class _TimeFunction(ContextDecorator):
         raise ValueError(f"Argument func of type {type(func)} is not a string or a callable.")
 
     def __enter__(self):
-        self.start = time.time()
+        self.start = time.perf_counter()
         if PYTORCH_PROFILER is not None:
             args, kwargs = tuple(), {}
             if self._function_call_args is not None:
@@ -101,7 +105,7 @@ class _TimeFunction(ContextDecorator):
             context = self._profiler_contexts.pop()
             context.__exit__(*args, **kwargs)
         if PROFILER:
-            PROFILER[0].update_time(self.name, self.start, time.time())
+            PROFILER[0].update_time(self.name, self.start, time.perf_counter())
 
     def __call__(self, func: Callable):
         @functools.wraps(func)
@@ -119,15 +123,22 @@ def flush_profiler(config: cfg.LoggingConfig):
     """Method that checks if profiler is enabled before flushing"""
     if config.profiler != "none" and PROFILER:
         PROFILER[0].print_profile()
+        PROFILER[0].export_profile("final")
+
+
+def export_profile(step: int):
+    """Exports the profiler stats and timeline if an export is due at this step"""
+    if PROFILER and step_check(step, PROFILER[0].config.steps_per_profiler_export):
+        PROFILER[0].export_profile(f"step-{step:09d}")
 
 
 def setup_profiler(config: cfg.LoggingConfig, log_dir: Path):
     """Initialization of profilers"""
     global PYTORCH_PROFILER
     if comms.is_main_process():
-        PROFILER.append(Profiler(config))
+        PROFILER.append(Profiler(config, log_dir))
         if config.profiler == "pytorch":
-            PYTORCH_PROFILER = PytorchProfiler(log_dir)
+            PYTORCH_PROFILER = PytorchProfiler(log_dir, trace_steps=list(config.profiler_trace_steps))
 
 
 class PytorchProfiler:
@@ -180,11 +191,25 @@ class PytorchProfiler:
 
 @decorate_all([check_profiler_enabled, check_main_thread])
 class Profiler:
-    """Profiler class"""
+    """Profiler class
+
+    Keeps the most recent durations of every profiled function for percentile statistics, and the spans recorded
+    since the last export for a Chrome trace timeline. Functions can be timed from any thread, e.g. the data
+    prefetching or image writing threads, so the records are guarded by a lock.
 
-    def __init__(self, config: cfg.LoggingConfig):
+    Args:
+        config: logging configuration
+        log_dir: directory to export the stats and timelines to
+    """
+
+    def __init__(self, config: cfg.LoggingConfig, log_dir: Optional[Path] = None):
         self.config = config
+        self.output_path = None if log_dir is None else log_dir / "profiler"
         self.profiler_dict = {}
+        self.durations: Dict[str, Deque[float]] = {}
+        self.spans: Deque[Tuple[str, float, float, int]] = deque(maxlen=100 * config.profiler_history_size)
+        self.time_origin = time.perf_counter()
+        self._lock = threading.Lock()
 
     def update_time(self, func_name: str, start_time: float, end_time: float):
         """update the profiler dictionary with running averages of durations
@@ -195,19 +220,77 @@ class Profiler:
             end_time: the end time when function terminated
         """
         val = end_time - start_time
-        func_dict = self.profiler_dict.get(func_name, {"val": 0, "step": 0})
-        prev_val = func_dict["val"]
-        prev_step = func_dict["step"]
-        self.profiler_dict[func_name] = {"val": (prev_val * prev_step + val) / (prev_step + 1), "step": prev_step + 1}
+        thread_id = threading.get_ident()
+        with self._lock:
+            func_dict = self.profiler_dict.get(func_name, {"val": 0, "step": 0})
+            prev_val = func_dict["val"]
+            prev_step = func_dict["step"]
+            self.profiler_dict[func_name] = {
+                "val": (prev_val * prev_step + val) / (prev_step + 1),
+                "step": prev_step + 1,
+            }
+            if func_name not in self.durations:
+                self.durations[func_name] = deque(maxlen=self.config.profiler_history_size)
+            self.durations[func_name].append(val)
+            self.spans.append((func_name, start_time, end_time, thread_id))
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns the call count, mean and p50/p95/p99 of the recent durations in seconds of every function"""
+        # snapshot the records, other threads keep adding to them
+        with self._lock:
+            profiler_dict = {func_name: dict(func_dict) for func_name, func_dict in self.profiler_dict.items()}
+            durations_dict = {func_name: list(durations) for func_name, durations in self.durations.items()}
+        stats = {}
+        for func_name, durations in durations_dict.items():
+            p50, p95, p99 = np.percentile(np.asarray(durations), [50, 95, 99])
+            stats[func_name] = {
+                "count": profiler_dict[func_name]["step"],
+                "mean": profiler_dict[func_name]["val"],
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+            }
+        return stats
+
+    def export_profile(self, name: str):
+        """Writes the stats to ``stats_{name}.json`` and the spans recorded since the last export to the Chrome
+        trace ``trace_{name}.json``, which can be opened with chrome://tracing or https://ui.perfetto.dev.
+
+        Args:
+            name: suffix of the exported files
+        """
+        if self.output_path is None:
+            return
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        with open(self.output_path / f"stats_{name}.json", "w", encoding="utf-8") as f:
+            json.dump(self.get_stats(), f, indent=2)
+        with self._lock:
+            spans = list(self.spans)
+            self.spans.clear()
+        events = [
+            {
+                "name": func_name,
+                "ph": "X",
+                "ts": (start_time - self.time_origin) * 1e6,
+                "dur": (end_time - start_time) * 1e6,
+                "pid": os.getpid(),
+                "tid": thread_id,
+            }
+            for func_name, start_time, end_time, thread_id in spans
+        ]
+        with open(self.output_path / f"trace_{name}.json", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events}, f)
 
     def print_profile(self):
         """helper to print out the profiler stats"""
         CONSOLE.print("Printing profiling stats, from longest to shortest duration in seconds")
+        stats = self.get_stats()
         sorted_keys = sorted(
-            self.profiler_dict.keys(),
-            key=lambda k: self.profiler_dict[k]["val"],
+            stats.keys(),
+            key=lambda k: stats[k]["mean"],
             reverse=True,
         )
+        CONSOLE.print(f"{'':<20}  {'mean':<10}{'p50':<10}{'p95':<10}{'p99':<10}")
         for k in sorted_keys:
-            val = f"{self.profiler_dict[k]['val']:0.4f}"
-            CONSOLE.print(f"{k:<20}: {val:<20}")
+            val = "".join(f"{stats[k][key]:<10.4f}" for key in ("mean", "p50", "p95", "p99"))
+            CONSOLE.print(f"{k:<20}: {val}")
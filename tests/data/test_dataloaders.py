@@ -0,0 +1,55 @@
+"""
+Test batch prefetching
+"""
+
+import threading
+
+import torch
+
+from nerfstudio.data.utils.dataloaders import BatchPrefetcher, iter_prefetched
+
+
+def test_batch_prefetcher():
+    """Test that batches are returned in order and that the next one is prepared in the background"""
+    requested_steps = []
+    release = threading.Event()
+
+    def next_train(step):
+        if requested_steps:
+            release.wait(timeout=10)
+        requested_steps.append(step)
+        return torch.full((4, 3), step), {"image": torch.full((4, 3), step)}
+
+    prefetcher = BatchPrefetcher(next_train, "cpu")
+    inputs, batch = prefetcher.next(0)
+    assert torch.all(inputs == 0) and torch.all(batch["image"] == 0)
+    # step 1 is being prepared and blocks until released
+    assert requested_steps == [0]
+
+    release.set()
+    _, batch = prefetcher.next(1)
+    assert torch.all(batch["image"] == 1)
+    assert requested_steps[:2] == [0, 1]
+
+    # skipping a step discards the prefetched batch
+    _, batch = prefetcher.next(5)
+    assert torch.all(batch["image"] == 5)
+    _, batch = prefetcher.next(6)
+    assert torch.all(batch["image"] == 6)
+    assert requested_steps[:5] == [0, 1, 2, 5, 6]
+
+
+def test_iter_prefetched():
+    """Test that prefetched iteration yields every item in order and loads the next item ahead"""
+    loaded = []
+
+    def items():
+        for i in range(4):
+            loaded.append(i)
+            yield i
+
+    iterator = iter_prefetched(items())
+    assert next(iterator) == 0
+    assert list(iterator) == [1, 2, 3]
+    assert loaded == [0, 1, 2, 3]
+    assert list(iter_prefetched([])) == []
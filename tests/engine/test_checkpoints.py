@@ -0,0 +1,94 @@
+"""
+Test checkpoint writing
+"""
+
+import threading
+from pathlib import Path
+
+import torch
+
+from nerfstudio.engine.checkpoints import (
+    AsyncCheckpointWriter,
+    atomic_save,
+    get_checkpoint_path,
+    get_latest_checkpoint_step,
+    read_checkpoint,
+    remove_unreferenced_shards,
+    save_sharded,
+)
+
+
+def test_latest_checkpoint_ignores_partial_writes(tmp_path: Path):
+    """Test that temporary files of an interrupted write are never picked as the latest checkpoint"""
+    atomic_save({"step": 10}, get_checkpoint_path(tmp_path, 10))
+    atomic_save({"step": 20}, get_checkpoint_path(tmp_path, 20))
+    (tmp_path / f".{get_checkpoint_path(tmp_path, 30).name}.tmp").write_bytes(b"truncated")
+    assert get_latest_checkpoint_step(tmp_path) == 20
+    assert torch.load(get_checkpoint_path(tmp_path, 20))["step"] == 20
+    assert sorted(p.name for p in tmp_path.glob("*.ckpt")) == ["step-000000010.ckpt", "step-000000020.ckpt"]
+
+
+def test_read_checkpoint_mmap(tmp_path: Path):
+    """Test that memory-mapped loading returns the saved tensors and leaves the file untouched by writes"""
+    state = {"step": 3, "pipeline": {"weight": torch.rand(128, 128)}, "optimizers": {"exp_avg": torch.rand(128, 128)}}
+    path = get_checkpoint_path(tmp_path, 3)
+    atomic_save(state, path)
+    loaded = read_checkpoint(path, mmap=True)
+    assert loaded["step"] == 3
+    assert torch.equal(loaded["pipeline"]["weight"], state["pipeline"]["weight"])
+    # mapped pages are copy-on-write, so in-place updates do not modify the checkpoint
+    loaded["optimizers"]["exp_avg"].zero_()
+    assert torch.equal(read_checkpoint(path, mmap=False)["optimizers"]["exp_avg"], state["optimizers"]["exp_avg"])
+
+
+def test_async_checkpoint_writer(tmp_path: Path):
+    """Test that the writer saves a snapshot and keeps at most one checkpoint in flight"""
+    param = torch.zeros(3)
+    writer = AsyncCheckpointWriter()
+    release = threading.Event()
+    saved_steps = []
+
+    def on_saved(step):
+        release.wait(timeout=10)
+        saved_steps.append(step)
+
+    writer.save(lambda: {"param": param}, get_checkpoint_path(tmp_path, 0), on_saved=lambda: on_saved(0))
+    # training keeps updating the parameter in place while the checkpoint is written
+    param += 1
+    assert saved_steps == []
+
+    release.set()
+    writer.save(lambda: {"param": param}, get_checkpoint_path(tmp_path, 1), on_saved=lambda: on_saved(1))
+    # the second save had to wait for the first write
+    assert saved_steps[0] == 0
+    writer.close()
+    assert saved_steps == [0, 1]
+    assert torch.equal(torch.load(get_checkpoint_path(tmp_path, 0))["param"], torch.zeros(3))
+    assert torch.equal(torch.load(get_checkpoint_path(tmp_path, 1))["param"], torch.ones(3))
+
+
+def test_sharded_checkpoint_deduplication(tmp_path: Path):
+    """Test that unchanged tensors are stored once and that shards are loaded per top-level entry"""
+    frozen = torch.rand(64, 64)
+    state = {
+        "step": 0,
+        "pipeline": {"frozen": frozen, "trained": torch.rand(64, 64)},
+        "optimizers": [torch.rand(32, 32)],
+    }
+    save_sharded(state, get_checkpoint_path(tmp_path, 0))
+    state["step"] = 1
+    state["pipeline"]["trained"] = torch.rand(64, 64)
+    save_sharded(state, get_checkpoint_path(tmp_path, 1))
+    # frozen, two versions of trained and the optimizer state
+    assert len(list((tmp_path / "shards").glob("*.pt"))) == 4
+
+    loaded = read_checkpoint(get_checkpoint_path(tmp_path, 1))
+    assert loaded["step"] == 1
+    assert "optimizers" in loaded and "optimizers" not in getattr(loaded, "_loaded")
+    assert torch.equal(loaded["pipeline"]["frozen"], frozen)
+    assert torch.equal(loaded["pipeline"]["trained"], state["pipeline"]["trained"])
+
+    get_checkpoint_path(tmp_path, 0).unlink()
+    remove_unreferenced_shards(tmp_path)
+    assert len(list((tmp_path / "shards").glob("*.pt"))) == 3
+    assert torch.equal(read_checkpoint(get_checkpoint_path(tmp_path, 1))["optimizers"][0], state["optimizers"][0])
@@ -0,0 +1,44 @@
+"""
+Test early stopping
+"""
+
+import torch
+
+from nerfstudio.engine.early_stopping import EarlyStoppingConfig
+
+
+def test_stops_after_plateau():
+    """Test that training stops once the loss plateaus for `patience` checks, and not before min_num_iterations"""
+    early_stopping = EarlyStoppingConfig(
+        enable=True, steps_per_check=10, min_num_iterations=50, patience=2, loss_ema_decay=0.0
+    ).setup()
+    stopped_at = None
+    for step in range(200):
+        # improves until step 20, then stays flat
+        early_stopping.update_train_loss(torch.tensor(1.0 / min(step + 1, 20)))
+        if early_stopping.check(step):
+            stopped_at = step
+            break
+    assert stopped_at == 50
+
+
+def test_eval_interval_adapts():
+    """Test that evaluations are spaced further apart while the metrics are flat and closer once they improve"""
+    early_stopping = EarlyStoppingConfig(
+        enable=True, steps_per_check=10, min_num_iterations=1000, max_eval_interval_multiplier=4
+    ).setup()
+    early_stopping.update_eval_psnr(20.0)
+    assert early_stopping.get_eval_interval(100) == 100
+    early_stopping.check(10)  # the first check sets the best psnr
+    assert early_stopping.get_eval_interval(100) == 100
+    for step in (20, 30, 40):
+        early_stopping.update_eval_psnr(20.0)
+        early_stopping.check(step)
+    assert early_stopping.get_eval_interval(100) == 400
+    assert early_stopping.get_eval_interval(0) == 0
+
+    # the smoothed psnr rises by 1.5 dB
+    early_stopping.update_eval_psnr(23.0)
+    assert not early_stopping.check(50)
+    assert early_stopping.get_eval_interval(100) == 200
+    assert early_stopping.num_checks_without_improvement == 0
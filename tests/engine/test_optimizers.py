@@ -0,0 +1,47 @@
+"""
+Test optimizers
+"""
+
+import torch
+
+from nerfstudio.engine.optimizers import LazyAdam
+
+
+def test_lazy_adam_matches_adam_on_dense_gradients():
+    """Test that LazyAdam is Adam when every row has a gradient"""
+    torch.manual_seed(0)
+    param = torch.nn.Parameter(torch.randn((8, 4)))
+    reference = torch.nn.Parameter(param.detach().clone())
+    optimizer = LazyAdam([param], lr=0.1, eps=1e-15, weight_decay=0.01)
+    reference_optimizer = torch.optim.Adam([reference], lr=0.1, eps=1e-15, weight_decay=0.01)
+    for _ in range(5):
+        grad = torch.randn((8, 4))
+        param.grad, reference.grad = grad.clone(), grad.clone()
+        optimizer.step()
+        reference_optimizer.step()
+    assert torch.allclose(param, reference, atol=1e-6)
+
+
+def test_lazy_adam_skips_untouched_rows():
+    """Test that rows without gradients keep their values and state"""
+    torch.manual_seed(0)
+    embedding = torch.nn.Embedding(10, 3)
+    optimizer = LazyAdam(embedding.parameters(), lr=0.1)
+    initial = embedding.weight.detach().clone()
+
+    embedding(torch.tensor([1, 2])).sum().backward()
+    optimizer.step()
+    optimizer.zero_grad()
+    embedding(torch.tensor([2, 3])).sum().backward()
+    optimizer.step()
+
+    weight = embedding.weight.detach()
+    untouched = [0, 4, 5, 6, 7, 8, 9]
+    assert torch.equal(weight[untouched], initial[untouched])
+    assert not torch.allclose(weight[[1, 2, 3]], initial[[1, 2, 3]])
+    # row 1 did not move in the second step, whereas dense Adam would keep applying its momentum
+    assert torch.allclose(weight[1], initial[1] - 0.1)
+    state = optimizer.state[embedding.weight]
+    assert state["step"].tolist() == [0, 1, 2, 1, 0, 0, 0, 0, 0, 0]
+    # the first update of a row has the same size regardless of when it happens
+    assert torch.allclose(weight[3], initial[3] - 0.1)
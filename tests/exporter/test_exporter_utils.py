@@ -0,0 +1,48 @@
+"""
+Test the export utils
+"""
+
+import pytest
+import torch
+
+from nerfstudio.exporter.exporter_utils import VoxelGrid
+
+
+def test_voxel_grid():
+    """Test that points are averaged per voxel regardless of how they are added"""
+    # a jittered lattice of 2^3 points in each of the 8^3 voxels of [-1, 1]^3, so that every voxel is occupied
+    lattice = torch.stack(torch.meshgrid(*[torch.arange(16)] * 3, indexing="ij"), dim=-1).view(-1, 3)
+    points = (lattice + 0.1 + 0.8 * torch.rand(lattice.shape)) / 8.0 - 1.0
+    points = points[torch.randperm(len(points))]
+    colors = torch.rand((len(points), 3))
+    voxel_grid = VoxelGrid(voxel_size=0.25, num_attributes=3)
+    for start in range(0, len(points), 7):
+        voxel_grid.add(points[start : start + 7], colors[start : start + 7])
+    keys, mean_points, mean_colors = voxel_grid.get_voxels()
+
+    # 8 voxels along each axis
+    assert len(keys) == 512 and torch.all(keys.diff() > 0)
+    voxel_coords = torch.floor(points / 0.25)
+    first_voxel = torch.all(voxel_coords == voxel_coords[0], dim=-1)
+    first_idx = torch.searchsorted(keys, voxel_grid.get_keys(points[:1]))
+    assert torch.allclose(mean_points[first_idx], points[first_voxel].mean(dim=0), atol=1e-6)
+    assert torch.allclose(mean_colors[first_idx], colors[first_voxel].mean(dim=0), atol=1e-6)
+
+    neighbor_counts = voxel_grid.get_neighbor_counts(chunk_size=100)
+    # corners, edges, faces and the inside of the 8x8x8 block of voxels
+    assert sorted(neighbor_counts.unique().tolist()) == [7, 11, 17, 26]
+    assert int((neighbor_counts == 7).sum()) == 8 and int((neighbor_counts == 26).sum()) == 6**3
+
+
+def test_voxel_grid_range():
+    """Test that points outside of the range of the voxel keys are rejected"""
+    voxel_grid = VoxelGrid(voxel_size=1.0, num_attributes=0)
+    limit = 2 ** (VoxelGrid.KEY_BITS - 1)
+    # the outermost voxel on each side is kept free for the neighbours of the other voxels
+    points = torch.tensor(
+        [[limit - 1.5, 0.0, 0.0], [0.0, 0.0, 1.0 - limit], [0.0, limit - 0.5, 0.0], [0.0, 0.0, -limit], [torch.inf] * 3]
+    )
+    assert voxel_grid.contains(points).tolist() == [True, True, False, False, False]
+    voxel_grid.add(points[:2], torch.empty((2, 0)))
+    with pytest.raises(ValueError):
+        voxel_grid.add(points[2:3], torch.empty((1, 0)))
@@ -0,0 +1,103 @@
+"""
+Test the compressed splat format
+"""
+
+import math
+
+import torch
+
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.exporter.splat_compression import (
+    CHUNK_SIZE,
+    get_morton_order,
+    iter_compressed_splat,
+    load_gaussians,
+    read_compressed_splat,
+    read_ply,
+    write_compressed_splat,
+)
+from nerfstudio.models.splatfacto import SplatfactoModelConfig
+
+
+def test_morton_order():
+    """Test that the points of each octant are sorted before those of the next one"""
+    positions = torch.rand((1000, 3))
+    center = (positions.amin(dim=0) + positions.amax(dim=0)) / 2
+    octants = ((positions >= center).long() * torch.tensor([4, 2, 1])).sum(dim=-1)
+    assert torch.all(octants[get_morton_order(positions)].diff() >= 0)
+
+
+def test_compressed_splat_round_trip(tmp_path):
+    """Test that the decoded Gaussians match the written ones up to the quantization error"""
+    count = 3 * CHUNK_SIZE + 17
+    gaussians = {
+        "means": torch.randn((count, 3)) * 10.0,
+        "scales": torch.randn((count, 3)) - 4.0,
+        "quats": torch.randn((count, 4)),
+        "opacities": torch.randn((count, 1)),
+        "shs_0": torch.randn((count, 3)),
+        "shs_rest": torch.randn((count, 15, 3)) * 0.1,
+    }
+    filename = tmp_path / "splat.compressed.ply"
+    write_compressed_splat(filename, gaussians, chunks_per_block=2)
+
+    # 16 bytes and one byte per higher order coefficient per Gaussian, the chunk ranges and the header
+    assert filename.stat().st_size < count * (16 + 45) + 4 * 20 * 4 + 2000
+    elements = read_ply(filename)
+    assert len(elements["chunk"]) == 4 and len(elements["vertex"]) == count and len(elements["sh"]) == count
+
+    decoded = read_compressed_splat(filename)
+    blocks = list(iter_compressed_splat(filename, chunks_per_block=3))
+    assert [len(block["means"]) for block in blocks] == [3 * CHUNK_SIZE, 17]
+    assert torch.equal(torch.cat([block["means"] for block in blocks]), decoded["means"])
+
+    expected = {name: values[get_morton_order(gaussians["means"])] for name, values in gaussians.items()}
+    assert {name: values.shape for name, values in decoded.items()} == {
+        name: values.shape for name, values in expected.items()
+    }
+    # errors are bounded by half a quantization step of the range of each chunk
+    assert torch.allclose(decoded["means"], expected["means"], atol=60.0 / 2**10)
+    assert torch.allclose(decoded["scales"], expected["scales"], atol=10.0 / 2**10)
+    assert torch.allclose(decoded["shs_0"], expected["shs_0"], atol=10.0 / 2**8)
+    assert torch.allclose(decoded["shs_rest"], expected["shs_rest"], atol=1.0 / 2**8)
+    assert torch.allclose(torch.sigmoid(decoded["opacities"]), torch.sigmoid(expected["opacities"]), atol=1.0 / 2**8)
+    # quaternions are equal up to their sign
+    quats = torch.nn.functional.normalize(expected["quats"], dim=-1)
+    assert torch.all((decoded["quats"] * quats).sum(dim=-1).abs() > math.cos(0.01))
+
+
+def test_compressed_splat_load_gaussians(tmp_path):
+    """Test that a model loaded from a compressed file has the colors and opacities of the written one"""
+    count = 2 * CHUNK_SIZE + 5
+    for sh_degree in (0, 3):
+        config = SplatfactoModelConfig(random_init=True, num_random=count, sh_degree=sh_degree)
+        model = config.setup(
+            scene_box=SceneBox(aabb=torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])), num_train_data=1
+        )
+        with torch.no_grad():
+            model.features_dc.copy_(torch.randn_like(model.features_dc))
+            model.features_rest.copy_(torch.randn_like(model.features_rest) * 0.1)
+            model.opacities.copy_(torch.randn_like(model.opacities))
+            gaussians = {
+                "means": model.means,
+                "scales": model.scales,
+                "quats": model.quats,
+                "opacities": model.opacities,
+                "shs_0": model.shs_0,
+            }
+            if sh_degree > 0:
+                gaussians["shs_rest"] = model.shs_rest
+            order = get_morton_order(model.means)
+            expected = (model.colors.clamp(0.0, 1.0) * torch.sigmoid(model.opacities))[order]
+        filename = tmp_path / f"splat_{sh_degree}.compressed.ply"
+        write_compressed_splat(filename, gaussians)
+
+        load_gaussians(model, read_compressed_splat(filename))
+        assert model.num_points == count
+        assert model.features_rest.shape == (count, 15 if sh_degree > 0 else 0, 3)
+        with torch.no_grad():
+            colors = model.colors.clamp(0.0, 1.0) * torch.sigmoid(model.opacities)
+        # colors and opacities are off by at most half an 8 bit step of their chunk range, which is below 3 for the
+        # colors and 1 for the opacities
+        psnr = -10 * torch.log10(((colors - expected) ** 2).mean())
+        assert psnr > 20 * math.log10(2 * 255 / (3 + 1))
@@ -0,0 +1,78 @@
+"""
+Test the TSDF utils
+"""
+
+import math
+
+import torch
+
+from nerfstudio.cameras.camera_utils import viewmatrix
+from nerfstudio.exporter.tsdf_utils import SparseTSDF
+
+
+def _render_sphere_depth(num_views: int, size: int, radius: float):
+    """Returns cameras around a sphere at the origin and the distances along their rays to it"""
+    focal = size * 2.0
+    K = torch.tensor([[focal, 0.0, size / 2], [0.0, focal, size / 2], [0.0, 0.0, 1.0]]).expand(num_views, 3, 3)
+    v, u = torch.meshgrid(torch.arange(size) + 0.5, torch.arange(size) + 0.5, indexing="ij")
+    directions = torch.nn.functional.normalize(
+        torch.stack([(u - size / 2) / focal, -(v - size / 2) / focal, -torch.ones_like(u)], dim=-1), dim=-1
+    )
+    c2ws, depth_images = [], []
+    for i in range(num_views):
+        angle = 2 * math.pi * i / num_views
+        position = torch.tensor([3 * math.cos(angle), 3 * math.sin(angle), math.sin(3 * angle)])
+        c2w = torch.cat([viewmatrix(position, torch.tensor([0.0, 0.0, 1.0]), position), torch.eye(4)[3:]])
+        world_directions = directions @ c2w[:3, :3].T
+        b = world_directions @ position
+        discriminant = b**2 - position.dot(position) + radius**2
+        depth = torch.where(discriminant > 0, -b - discriminant.clamp(min=0).sqrt(), 0.0)
+        c2ws.append(c2w)
+        depth_images.append(depth[None])
+    return torch.stack(c2ws), K, torch.stack(depth_images)
+
+
+def test_sparse_tsdf():
+    """Test that only blocks near the surface are allocated and that the mesh lies on the surface"""
+    c2w, K, depth_images = _render_sphere_depth(num_views=8, size=48, radius=0.5)
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    tsdf = SparseTSDF.from_aabb(aabb, volume_dims=torch.tensor([64, 64, 64]), block_size=8)
+    tsdf.integrate_tsdf(c2w, K, depth_images, color_images=torch.ones((8, 3, 48, 48)))
+
+    num_blocks = tsdf.num_blocks
+    assert 0 < num_blocks < 8**3 // 2
+    # the blocks of the surface are already allocated
+    tsdf.integrate_tsdf(c2w[:2], K[:2], depth_images[:2])
+    assert tsdf.num_blocks == num_blocks
+    block_centers = tsdf.origin + (tsdf.block_coords + 0.5) * tsdf.voxel_size * tsdf.block_size
+    block_radius = math.sqrt(3) * 4 * tsdf.voxel_size[0]
+    assert torch.all((block_centers.norm(dim=-1) - 0.5).abs() < block_radius + math.sqrt(3) * tsdf.truncation)
+    assert torch.all(tsdf.find_blocks(tsdf.block_coords) == torch.arange(num_blocks))
+    assert torch.all(tsdf.find_blocks(torch.tensor([[0, 0, 0], [-1, 3, 3], [8, 3, 3]])) == -1)
+
+    mesh = tsdf.get_mesh(chunk_size=16)
+    assert len(mesh.faces) > 1000
+    # the depth images are sampled at about one pixel per voxel
+    assert torch.all((mesh.vertices.norm(dim=-1) - 0.5).abs() < 2 * tsdf.voxel_size[0])
+    assert mesh.colors is not None and torch.allclose(mesh.colors, torch.ones_like(mesh.colors))
+    # vertices shared by neighbouring blocks are merged and all of them are used
+    assert len(torch.unique(mesh.vertices, dim=0)) == len(mesh.vertices)
+    assert len(torch.unique(mesh.faces)) == len(mesh.vertices)
+
+
+def test_sparse_tsdf_batches():
+    """Test integrating batches that each allocate new blocks"""
+    c2w, K, depth_images = _render_sphere_depth(num_views=8, size=48, radius=0.5)
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    tsdf = SparseTSDF.from_aabb(aabb, volume_dims=torch.tensor([64, 64, 64]), block_size=8)
+    num_blocks = []
+    # opposite views see different sides of the sphere
+    for i in (0, 4, 2):
+        tsdf.integrate_tsdf(c2w[i : i + 1], K[i : i + 1], depth_images[i : i + 1], chunk_size=16)
+        num_blocks.append(tsdf.num_blocks)
+    assert num_blocks[0] < num_blocks[1] < num_blocks[2] < len(tsdf.values)
+    assert torch.all(tsdf.weights[tsdf.num_blocks :] == 0)
+
+    mesh = tsdf.get_mesh()
+    assert len(mesh.faces) > 0
+    assert torch.all((mesh.vertices.norm(dim=-1) - 0.5).abs() < 2 * tsdf.voxel_size[0])
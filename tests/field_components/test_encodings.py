@@ -169,6 +169,61 @@ def test_tensor_hash_encoder():
     assert encoded_tcnn.shape == (10, out_dim)
 
 
+def reference_hash_encoding(encoder, in_tensor):
+    """Per-corner hash encoding that the torch backend used to implement"""
+    in_tensor = in_tensor[..., None, :]
+    scaled = in_tensor * encoder.scalings.view(-1, 1)
+    scaled_c = torch.ceil(scaled).type(torch.int32)
+    scaled_f = torch.floor(scaled).type(torch.int32)
+    offset = scaled - scaled_f
+
+    def corner(x, y, z):
+        return encoder.hash_table[encoder.hash_fn(torch.cat([x[..., 0:1], y[..., 1:2], z[..., 2:3]], dim=-1))]
+
+    f_0 = corner(scaled_c, scaled_c, scaled_c)
+    f_1 = corner(scaled_c, scaled_f, scaled_c)
+    f_2 = corner(scaled_f, scaled_f, scaled_c)
+    f_3 = corner(scaled_f, scaled_c, scaled_c)
+    f_4 = corner(scaled_c, scaled_c, scaled_f)
+    f_5 = corner(scaled_c, scaled_f, scaled_f)
+    f_6 = corner(scaled_f, scaled_f, scaled_f)
+    f_7 = corner(scaled_f, scaled_c, scaled_f)
+
+    f_03 = f_0 * offset[..., 0:1] + f_3 * (1 - offset[..., 0:1])
+    f_12 = f_1 * offset[..., 0:1] + f_2 * (1 - offset[..., 0:1])
+    f_56 = f_5 * offset[..., 0:1] + f_6 * (1 - offset[..., 0:1])
+    f_47 = f_4 * offset[..., 0:1] + f_7 * (1 - offset[..., 0:1])
+    f0312 = f_03 * offset[..., 1:2] + f_12 * (1 - offset[..., 1:2])
+    f4756 = f_47 * offset[..., 1:2] + f_56 * (1 - offset[..., 1:2])
+    encoded_value = f0312 * offset[..., 2:3] + f4756 * (1 - offset[..., 2:3])
+    return torch.flatten(encoded_value, start_dim=-2, end_dim=-1)
+
+
+def test_torch_hash_encoder_matches_reference():
+    """Test that the fused torch hash encoding matches the per-corner implementation"""
+    encoder = encodings.HashEncoding(num_levels=8, max_res=512, log2_hashmap_size=12, implementation="torch")
+    in_tensor = torch.rand((4, 50, 3))
+    # include points on grid vertices, where floor and ceil coincide
+    in_tensor[0, :10] = torch.tensor([0.0, 0.5, 1.0])
+
+    encoded = encoder(in_tensor)
+    assert encoded.shape == (4, 50, encoder.get_out_dim())
+    encoded.square().sum().backward()
+    grad = encoder.hash_table.grad.clone()
+
+    encoder.hash_table.grad = None
+    reference = reference_hash_encoding(encoder, in_tensor)
+    reference.square().sum().backward()
+    assert torch.allclose(encoded, reference, atol=1e-6)
+    assert torch.allclose(grad, encoder.hash_table.grad, atol=1e-6)
+
+    # half precision tables are interpolated in full precision
+    encoder.hash_table.data = encoder.hash_table.data.half()
+    encoded_half = encoder(in_tensor)
+    assert encoded_half.dtype == torch.float32
+    assert torch.allclose(encoded_half, reference, atol=1e-5)
+
+
 def test_kplane_encoder():
     """Test K-Planes encoder"""
 
@@ -4,7 +4,8 @@ Test losses
 
 import torch
 
-from nerfstudio.model_components.losses import tv_loss
+from nerfstudio.cameras.rays import Frustums, RaySamples
+from nerfstudio.model_components.losses import lossfun_distortion, nerfstudio_distortion_loss, tv_loss
 
 
 def test_tv_loss():
@@ -24,5 +25,38 @@ def test_tv_loss():
     assert tv_loss(grids).item() == 4.0
 
 
+def test_distortion_loss_matches_quadratic():
+    """Test the prefix-sum distortion loss against the pairwise formulation"""
+    num_rays, num_samples = 8, 48
+    t = torch.sort(torch.rand((num_rays, num_samples + 1)), dim=-1).values
+    w = torch.rand((num_rays, num_samples), requires_grad=True)
+
+    ut = (t[..., 1:] + t[..., :-1]) / 2
+    dut = torch.abs(ut[..., :, None] - ut[..., None, :])
+    expected = torch.sum(w * torch.sum(w[..., None, :] * dut, dim=-1), dim=-1)
+    expected = expected + torch.sum(w**2 * (t[..., 1:] - t[..., :-1]), dim=-1) / 3
+    expected_grad = torch.autograd.grad(expected.sum(), w)[0]
+
+    loss = lossfun_distortion(t, w)
+    assert torch.allclose(loss, expected, atol=1e-5)
+    assert torch.allclose(torch.autograd.grad(loss.sum(), w)[0], expected_grad, atol=1e-5)
+
+    starts, ends = t[..., :-1, None], t[..., 1:, None]
+    ray_samples = RaySamples(
+        frustums=Frustums(
+            origins=torch.zeros((num_rays, num_samples, 3)),
+            directions=torch.ones((num_rays, num_samples, 3)),
+            starts=starts,
+            ends=ends,
+            pixel_area=torch.ones((num_rays, num_samples, 1)),
+        ),
+        spacing_starts=starts,
+        spacing_ends=ends,
+    )
+    loss = nerfstudio_distortion_loss(ray_samples, weights=w[..., None])
+    assert loss.shape == (num_rays, 1)
+    assert torch.allclose(loss[..., 0], expected, atol=1e-5)
+
+
 if __name__ == "__main__":
     test_tv_loss()
@@ -0,0 +1,70 @@
+"""
+Test occupancy grid
+"""
+
+import torch
+
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.model_components.occupancy_grid import OccupancyGrid
+from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler
+from nerfstudio.model_components.scene_colliders import NearFarCollider
+
+
+def sphere_density_fn(positions):
+    """Unit density inside a sphere of radius 0.5 at the origin"""
+    return (positions.norm(dim=-1, keepdim=True) < 0.5).float()
+
+
+def test_contraction_round_trip():
+    """Test that unnormalizing inverts the contraction used by the fields"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    grid = OccupancyGrid(aabb, resolution=8, spatial_distortion=SceneContraction(order=float("inf")))
+    positions = torch.randn((100, 3)) * 5
+    round_trip = grid.unnormalize_positions(grid.normalize_positions(positions))
+    assert torch.allclose(round_trip, positions, atol=1e-3, rtol=1e-3)
+
+
+def test_occupancy_update():
+    """Test that the grid marks empty space after an update"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    grid = OccupancyGrid(aabb, resolution=16)
+    assert grid.get_occupancy(torch.tensor([[0.9, 0.9, 0.9]])).all()
+
+    grid.update(sphere_density_fn)
+    assert grid.get_occupancy(torch.tensor([[0.0, 0.0, 0.0]])).all()
+    assert not grid.get_occupancy(torch.tensor([[0.9, 0.9, 0.9]])).any()
+    assert not grid.get_occupancy(torch.tensor([[2.0, 0.0, 0.0]])).any()
+    assert 0 < grid.occupancy_ratio < 0.5
+
+
+def test_proposal_sampler_skips_empty_space():
+    """Test that the proposal density functions are not queried in empty cells"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    grid = OccupancyGrid(aabb, resolution=16)
+    grid.update(sphere_density_fn)
+
+    num_queried = []
+
+    def density_fn(positions):
+        num_queried.append(positions.numel() // 3)
+        return sphere_density_fn(positions)
+
+    # parallel rays through the sphere and the partially occupied cells around its boundary
+    offsets = torch.linspace(-0.55, 0.55, 10)
+    origins = torch.stack(torch.meshgrid(torch.tensor([-3.0]), offsets, offsets, indexing="ij"), dim=-1).view(-1, 3)
+    directions = torch.zeros_like(origins)
+    directions[:, 0] = 1
+    ray_bundle = RayBundle(origins=origins, directions=directions, pixel_area=torch.ones((100, 1)))
+    ray_bundle = NearFarCollider(near_plane=1, far_plane=5)(ray_bundle)
+    sampler = ProposalNetworkSampler(
+        num_proposal_samples_per_ray=(32,), num_nerf_samples_per_ray=16, num_proposal_network_iterations=1
+    ).eval()
+    ray_samples, weights_list, _ = sampler(ray_bundle, density_fns=[density_fn], occupancy_grid=grid)
+    assert ray_samples.shape == (100, 16)
+    assert 0 < num_queried[0] < 100 * 32
+
+    # the grid is dilated, so skipping empty cells must not change the weights
+    _, dense_weights_list, _ = sampler(ray_bundle, density_fns=[density_fn])
+    assert num_queried[1] == 100 * 32
+    assert torch.allclose(weights_list[0], dense_weights_list[0])
@@ -11,6 +11,7 @@ from nerfstudio.model_components.ray_samplers import (
     PDFSampler,
     SqrtSampler,
     UniformSampler,
+    evaluate_front_to_back,
 )
 from nerfstudio.model_components.scene_colliders import NearFarCollider
 
@@ -108,6 +109,39 @@ def test_pdf_sampler():
     # TODO Tancik: Add more precise tests
 
 
+def test_evaluate_front_to_back():
+    """Test that early ray termination only changes weights by less than the threshold"""
+    num_samples = 64
+
+    origins = torch.zeros((10, 3))
+    origins[5:, 1] = 10
+    directions = torch.zeros_like(origins)
+    directions[:, 0] = 1
+    radius = torch.ones((10, 1))
+    ray_bundle = RayBundle(origins=origins, directions=directions, pixel_area=radius)
+    collider = NearFarCollider(near_plane=2, far_plane=4)
+    ray_bundle = collider(ray_bundle)
+    ray_samples = UniformSampler(num_samples=num_samples, train_stratified=False)(ray_bundle)
+
+    # half of the rays hit an opaque wall at x=3, the other half see empty space
+    num_evaluated = []
+
+    def eval_fn(samples):
+        num_evaluated.append(samples.size)
+        positions = samples.frustums.get_positions()
+        density = ((positions[..., :1] > 3) & (positions[..., 1:2] < 1)).float() * 100
+        return {"density": density, "rgb": torch.ones_like(positions)}
+
+    dense_outputs = eval_fn(ray_samples)
+    outputs = evaluate_front_to_back(
+        ray_samples, eval_fn, density_key="density", opacity_threshold=0.9999, segment_size=8
+    )
+    dense_weights = ray_samples.get_weights(dense_outputs["density"])
+    weights = ray_samples.get_weights(outputs["density"])
+    assert torch.allclose(weights, dense_weights, atol=1e-4)
+    assert sum(num_evaluated[1:]) < 10 * num_samples
+
+
 if __name__ == "__main__":
     test_uniform_sampler()
     test_pdf_sampler()
@@ -5,19 +5,25 @@ Test pipeline
 from pathlib import Path
 
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 from torch import nn
 
 from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.cameras.rays import RayBundle
 from nerfstudio.data.datamanagers.base_datamanager import VanillaDataManagerConfig
 from nerfstudio.data.datasets.base_dataset import DataparserOutputs, InputDataset
+from nerfstudio.models.nerfacto import NerfactoModelConfig
 from nerfstudio.pipelines.base_pipeline import Model, ModelConfig, VanillaPipeline, VanillaPipelineConfig
 
 
 class MockedDataManager:
     """Mocked data manager"""
 
+    num_images = 0
+
     def __init__(self, *args, **kwargs):
-        num_images = 0
+        num_images = self.num_images
         self.train_dataset = InputDataset(
             DataparserOutputs(
                 image_filenames=[Path("filename.png")] * num_images,
@@ -88,3 +94,135 @@ def test_load_state_dict():
     pipeline.load_pipeline(ddp_state_dict, 0)
     assert was_called
     assert getattr(pipeline.model, "param")[0].item() == 4
+
+
+class ScaleModel(Model):
+    """Model scaling the ray origins by a learned per-axis factor"""
+
+    def populate_modules(self):
+        super().populate_modules()
+        self.scale = nn.Parameter(torch.ones((3,)))
+
+    def get_outputs(self, ray_bundle):
+        return {"rgb": ray_bundle.origins * self.scale}
+
+    def get_loss_dict(self, outputs, batch, metrics_dict=None):
+        return {"rgb_loss": ((outputs["rgb"] - batch["image"]) ** 2).mean()}
+
+
+class RayDataManager(MockedDataManager):
+    """Mocked data manager returning a fixed batch of rays"""
+
+    def next_train(self, step):
+        """Mocked next_train"""
+        generator = torch.Generator().manual_seed(0)
+        origins = torch.rand((10, 3), generator=generator)
+        ray_bundle = RayBundle(origins=origins, directions=torch.ones_like(origins), pixel_area=torch.ones((10, 1)))
+        return ray_bundle, {"image": torch.rand((10, 3), generator=generator), "num_images": torch.tensor(1)}
+
+
+def test_micro_batches_match_full_batch():
+    """Test that the weighted micro-batch losses accumulate the gradients of the whole batch"""
+    config = VanillaPipelineConfig(
+        datamanager=VanillaDataManagerConfig(_target=RayDataManager), model=ModelConfig(_target=ScaleModel)
+    )
+    pipeline = VanillaPipeline(config, "cpu")
+    scale = getattr(pipeline.model, "scale")
+    _, loss_dict, _ = pipeline.get_train_loss_dict(0)
+    loss_dict["rgb_loss"].backward()
+    expected_grad = scale.grad.clone()
+
+    scale.grad = None
+    weights = []
+    for _, micro_loss_dict, _, weight in pipeline.get_train_micro_batch_loss_dicts(0, num_micro_batches=3):
+        (micro_loss_dict["rgb_loss"] * weight).backward()
+        weights.append(weight)
+    assert weights == [0.4, 0.4, 0.2]
+    assert torch.allclose(scale.grad, expected_grad)
+
+
+class NerfactoRayDataManager(MockedDataManager):
+    """Mocked data manager returning a fixed batch of rays of a single image"""
+
+    num_images = 1
+
+    def next_train(self, step):
+        """Mocked next_train"""
+        generator = torch.Generator().manual_seed(0)
+        directions = nn.functional.normalize(torch.rand((12, 3), generator=generator) - 0.5, dim=-1)
+        ray_bundle = RayBundle(
+            origins=torch.zeros_like(directions),
+            directions=directions,
+            pixel_area=torch.ones((12, 1)),
+            camera_indices=torch.zeros((12, 1), dtype=torch.long),
+        )
+        return ray_bundle, {"image": torch.rand((12, 3), generator=generator), "num_images": torch.tensor(1)}
+
+
+def test_micro_batches_match_full_batch_nerfacto():
+    """Test that micro-batches of a step all update the proposal networks of nerfacto, or none of them do"""
+    config = VanillaPipelineConfig(
+        datamanager=VanillaDataManagerConfig(_target=NerfactoRayDataManager),
+        model=NerfactoModelConfig(
+            num_proposal_samples_per_ray=(16, 8), num_nerf_samples_per_ray=8, log2_hashmap_size=10
+        ),
+    )
+    pipeline = VanillaPipeline(config, "cpu")
+    model = pipeline.model
+    proposal_sampler = getattr(model, "proposal_sampler")
+    # fixed samples so that both passes see the same points
+    proposal_sampler.initial_sampler.train_stratified = False
+    proposal_sampler.pdf_sampler.train_stratified = False
+    proposal_params = list(getattr(model, "proposal_networks").parameters())
+    # the proposal distributions of the initial densities nest without a loss
+    torch.manual_seed(0)
+    with torch.no_grad():
+        for param in proposal_params:
+            param.uniform_(-1.0, 1.0)
+    field_params = list(getattr(model, "field").parameters())
+
+    def get_grads(num_micro_batches: int):
+        model.zero_grad(set_to_none=False)
+        if num_micro_batches == 1:
+            _, loss_dict, _ = pipeline.get_train_loss_dict(step)
+            sum(loss_dict.values()).backward()
+        else:
+            for _, loss_dict, _, weight in pipeline.get_train_micro_batch_loss_dicts(step, num_micro_batches):
+                (sum(loss_dict.values()) * weight).backward()
+        return [torch.zeros_like(p) if p.grad is None else p.grad.clone() for p in proposal_params + field_params]
+
+    # a step that skips the update and an update step
+    for step, updated in ((200, False), (201, True)):
+        proposal_sampler.step_cb(step)
+        assert proposal_sampler._is_update_step() == updated
+        expected_grads = get_grads(1)
+        grads = get_grads(3)
+        assert any(grad.abs().sum() > 0 for grad in expected_grads[: len(proposal_params)]) == updated
+        for grad, expected_grad in zip(grads, expected_grads):
+            assert torch.allclose(grad, expected_grad, atol=1e-6)
+
+
+def _ddp_worker(rank, world_size, init_method):
+    """Runs one backward pass on a gloo rank and checks that the gradients are averaged"""
+    dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    try:
+        config = VanillaPipelineConfig(
+            datamanager=VanillaDataManagerConfig(_target=MockedDataManager),
+            model=ModelConfig(_target=ScaleModel),
+            ddp_find_unused_parameters=False,
+        )
+        pipeline = VanillaPipeline(config, "cpu", world_size=world_size, local_rank=rank)
+        origins = torch.full((4, 3), float(rank + 1))
+        ray_bundle = RayBundle(origins=origins, directions=torch.ones_like(origins), pixel_area=torch.ones((4, 1)))
+        pipeline._model(ray_bundle)["rgb"].sum().backward()
+        scale = getattr(pipeline.model, "scale")
+        # the mean of the per-rank gradients 4 * (rank + 1)
+        assert torch.allclose(scale.grad, torch.full((3,), 4 * (world_size + 1) / 2))
+    finally:
+        dist.destroy_process_group()
+
+
+def test_cpu_data_parallel(tmp_path: Path):
+    """Test that gradients are all-reduced between gloo ranks on the CPU"""
+    world_size = 2
+    mp.spawn(_ddp_worker, args=(world_size, f"file://{tmp_path / 'init'}"), nprocs=world_size)
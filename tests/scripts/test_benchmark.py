@@ -0,0 +1,26 @@
+"""
+Test the benchmark regression check
+"""
+
+from nerfstudio.scripts.benchmarking.run_benchmark import compare_to_baseline
+
+
+def test_compare_to_baseline():
+    """Test that only metrics beyond the thresholds are reported, in the direction that is worse"""
+    baseline = {
+        "vanilla-nerf": {"steps_per_sec": 10.0, "peak_rss_mb": 1000.0, "startup_sec": 10.0},
+        "papr": {"steps_per_sec": 10.0},
+        "splatfacto": {"error": "AssertionError: cuda is not available"},
+    }
+    results = {
+        "vanilla-nerf": {"steps_per_sec": 7.0, "peak_rss_mb": 1100.0, "startup_sec": 3.0},
+        "papr": {"error": "RuntimeError: boom"},
+        "splatfacto": {"error": "AssertionError: cuda is not available"},
+    }
+    regressions = compare_to_baseline(
+        results, baseline, max_throughput_drop=0.2, max_memory_increase=0.2, max_startup_increase=0.5
+    )
+    assert regressions == [
+        "vanilla-nerf: steps_per_sec dropped from 10 to 7",
+        "papr: failed with RuntimeError: boom",
+    ]
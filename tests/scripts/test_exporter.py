@@ -18,6 +18,7 @@ from pathlib import Path
 import numpy as np
 import open3d as o3d
 import pytest
+import torch
 
 from nerfstudio.scripts.exporter import ExportGaussianSplat
 
@@ -76,7 +77,29 @@ def test_export_gaussian_splat_write_ply_mismatched_count(tmp_path: Path):
         ExportGaussianSplat.write_ply(filename, count, map_to_tensors)
 
 
+def test_export_gaussian_splat_write_ply_chunked_tensors(tmp_path: Path):
+    count = 10
+    map_to_tensors: OrderedDict[str, np.ndarray] = OrderedDict(
+        [
+            ("x", np.random.rand(count).astype(np.float64)),
+            ("red", np.random.randint(0, 255, size=(count,), dtype=np.uint8)),
+            ("opacity", np.random.rand(count, 1).astype(np.float32)),
+        ]
+    )
+    ExportGaussianSplat.write_ply(str(tmp_path / "arrays.ply"), count, map_to_tensors)
+
+    # tensors that require grad are written in chunks to the same bytes as the whole arrays
+    map_to_torch_tensors = OrderedDict(
+        (key, torch.from_numpy(tensor).requires_grad_(tensor.dtype.kind == "f"))
+        for key, tensor in map_to_tensors.items()
+    )
+    ExportGaussianSplat.write_ply(str(tmp_path / "tensors.ply"), count, map_to_torch_tensors, chunk_size=3)
+
+    assert (tmp_path / "arrays.ply").read_bytes() == (tmp_path / "tensors.ply").read_bytes()
+
+
 if __name__ == "__main__":
     # Run the test
     test_export_gaussian_splat_write_ply(Path("."))
     test_export_gaussian_splat_write_ply_mismatched_count(Path("."))
+    test_export_gaussian_splat_write_ply_chunked_tensors(Path("."))
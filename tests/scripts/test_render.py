@@ -0,0 +1,64 @@
+"""
+Test the frame selection of ns-render
+"""
+
+from pathlib import Path
+
+import pytest
+import torch
+import viser.transforms as tf
+
+from nerfstudio.scripts.render import NearestCameraIndex, SpiralRender
+
+
+def test_frame_selection():
+    """Test that shards split the frame range into contiguous ranges covering every frame once"""
+    render = SpiralRender(load_config=Path("config.yml"))
+    assert render.get_frame_indices(10) is None
+
+    render.frame_range = (2, 100)
+    assert render.get_frame_indices(10) == range(2, 10)
+
+    frames = []
+    for index in range(3):
+        render.shard = (index, 3)
+        shard_frames = render.get_frame_indices(10)
+        assert shard_frames is not None
+        frames.extend(shard_frames)
+    assert frames == list(range(2, 10))
+
+    render.shard = (3, 3)
+    with pytest.raises(ValueError):
+        render.get_frame_indices(10)
+
+
+def test_nearest_camera_index():
+    """Test the nearest camera against a per camera reference and that occluded cameras are skipped"""
+    torch.manual_seed(0)
+    rotations = torch.linalg.qr(torch.randn((50, 3, 3))).Q
+    rotations = rotations * torch.linalg.det(rotations)[:, None, None]
+    train_poses = torch.cat([rotations, torch.randn((50, 3, 1))], dim=-1)
+    pose = train_poses[7].clone()
+    pose[:, 3] += 0.05
+    index = NearestCameraIndex(train_poses, occlusion_chunk_size=8)
+
+    quat = tf.SO3.from_matrix(pose[:3, :3].numpy()).wxyz
+    reference = [
+        0.3 * (1 - float(tf.SO3.from_matrix(train_pose[:3, :3].numpy()).wxyz @ quat) ** 2)
+        + 0.7 * float(torch.norm(train_pose[:, 3] - pose[:, 3]))
+        for train_pose in train_poses
+    ]
+    assert torch.allclose(index.get_distances(pose), torch.tensor(reference), atol=1e-5)
+    assert index.get_nearest(pose) == 7
+
+    # every camera but the two farthest ones is hidden behind a wall close to the rendered camera
+    farthest = torch.argsort(index.get_distances(pose))[-2:]
+
+    def get_outputs(ray_bundle):
+        offsets = train_poses[farthest, :, 3] - pose[:, 3]
+        visible = (ray_bundle.directions @ (offsets / offsets.norm(dim=-1, keepdim=True)).T > 1 - 1e-5).any(dim=-1)
+        return {"depth": torch.where(visible, 1000.0, 0.01)[:, None]}
+
+    assert index.get_nearest(pose, get_outputs) == int(farthest[0])
+    # falls back to the nearest camera if all of them are hidden
+    assert index.get_nearest(pose, lambda ray_bundle: {"depth": torch.zeros((len(ray_bundle), 1))}) == 7
@@ -0,0 +1,13 @@
+"""
+Test batching of items
+"""
+
+from nerfstudio.utils.misc import batched
+
+
+def test_batched():
+    """Test that the size of every batch is decided from its first item"""
+    assert list(batched(range(7), lambda item: 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched(range(5), lambda item: item + 1)) == [[0], [1, 2], [3, 4]]
+    assert list(batched(range(2), lambda item: 0)) == [[0], [1]]
+    assert not list(batched([], lambda item: 2))
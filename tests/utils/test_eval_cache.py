@@ -0,0 +1,43 @@
+"""
+Test the evaluation cache
+"""
+
+import torch
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.engine.checkpoints import get_state_digest
+from nerfstudio.utils.eval_cache import EvalCache
+
+
+def test_eval_cache(tmp_path):
+    """Test that entries are keyed by weights, camera and ground truth and that images are cached"""
+    camera = Cameras(camera_to_worlds=torch.eye(4)[:3], fx=10.0, fy=10.0, cx=4.0, cy=4.0, width=8, height=8)
+    zoomed_camera = Cameras(camera_to_worlds=torch.eye(4)[:3], fx=20.0, fy=20.0, cx=4.0, cy=4.0, width=8, height=8)
+    batch = {"image": torch.rand((8, 8, 3)), "image_idx": 0}
+    model_digest = get_state_digest({"weight": torch.ones(3)})
+    assert model_digest == get_state_digest({"weight": torch.ones(3)})
+    cache = EvalCache(tmp_path / "cache")
+
+    key = cache.get_key(model_digest, camera, batch, "settings")
+    assert key == cache.get_key(model_digest, camera, dict(batch), "settings")
+    other_keys = [
+        cache.get_key(get_state_digest({"weight": torch.zeros(3)}), camera, batch, "settings"),
+        cache.get_key(model_digest, zoomed_camera, batch, "settings"),
+        cache.get_key(model_digest, camera, {**batch, "image": torch.rand((8, 8, 3))}, "settings"),
+        cache.get_key(model_digest, camera, batch, "other settings"),
+    ]
+    assert key not in other_keys
+
+    assert cache.load(key) is None
+    cache.save(key, {"psnr": torch.tensor(20.0)})
+    metrics, image_paths = cache.load(key)
+    assert metrics == {"psnr": 20.0} and image_paths == {}
+    # entries stored without images are rendered again when the images are needed
+    assert cache.load(key, with_images=True) is None
+
+    image_path = tmp_path / "img.png"
+    image_path.write_bytes(b"png")
+    cache.save(key, {"psnr": 21.0}, {"img": image_path})
+    metrics, image_paths = cache.load(key, with_images=True)
+    assert metrics == {"psnr": 21.0}
+    assert image_paths["img"].read_bytes() == b"png"
@@ -0,0 +1,68 @@
+"""
+Test memory helpers and automatic eval chunk sizing
+"""
+
+import pytest
+import torch
+
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.models.base_model import Model, ModelConfig
+from nerfstudio.utils.memory import get_available_memory, track_peak_memory
+
+
+def test_track_peak_memory():
+    """Test that the peak counts live tensors and not freed ones, and that it is not measured on CPU"""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    x = torch.ones((1000, 1000), device=device)
+    with track_peak_memory(device) as peak_memory:
+        y = x * 2
+        z = y + 1
+        del y
+        z.sum()
+        del z
+    if device.type == "cpu":
+        assert peak_memory.nbytes is None
+    else:
+        # the scalar sum may still be alive at the peak
+        assert peak_memory.nbytes is not None and 2 * x.nbytes <= peak_memory.nbytes < 2 * x.nbytes + 1024
+
+
+def test_get_available_memory():
+    """Test that available memory is only queried on CUDA"""
+    with pytest.raises(ValueError):
+        get_available_memory("cpu")
+
+
+class ChunkedModel(Model):
+    """Model allocating 1 KiB of float32 intermediates per ray"""
+
+    def get_outputs(self, ray_bundle: RayBundle):
+        hidden = ray_bundle.origins.new_ones((len(ray_bundle), 256))
+        return {"rgb": ray_bundle.origins * hidden.mean(dim=-1, keepdim=True)}
+
+
+def test_auto_eval_num_rays_per_chunk():
+    """Test that the chunk size is picked from the budget and cached per resolution"""
+    config = ModelConfig(
+        _target=ChunkedModel,
+        enable_collider=False,
+        eval_num_rays_per_chunk=64,
+        eval_num_rays_per_chunk_auto=True,
+        eval_memory_budget_gb=2**-10,
+    )
+    model = config.setup(scene_box=SceneBox(aabb=torch.ones((2, 3))), num_train_data=1)
+    origins = torch.rand((20, 30, 3))
+    ray_bundle = RayBundle(origins=origins, directions=origins, pixel_area=torch.ones((20, 30, 1)))
+
+    outputs = model.get_outputs_for_camera_ray_bundle(ray_bundle)
+    assert torch.allclose(outputs["rgb"], origins)
+    # peak memory is not measured on CPU, so the configured chunk size is kept
+    assert model.auto_eval_num_rays_per_chunk == {(20, 30): 64}
+    # a 1 MiB budget fits 1024 rays of 1 KiB
+    assert model.get_auto_eval_num_rays_per_chunk(1024.0) == 1024
+
+    model.auto_eval_num_rays_per_chunk[(20, 30)] = 7
+    outputs = model.get_outputs_for_camera_ray_bundle(ray_bundle)
+    assert torch.allclose(outputs["rgb"], origins)
+    assert model.auto_eval_num_rays_per_chunk == {(20, 30): 7}
@@ -0,0 +1,71 @@
+"""
+Test profiler statistics and exports
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from nerfstudio.configs.base_config import LoggingConfig
+from nerfstudio.utils.profiler import Profiler
+
+
+def test_profiler_stats_and_export(tmp_path: Path):
+    """Test percentiles of recorded durations and the exported stats and Chrome trace"""
+    profiler = Profiler(LoggingConfig(profiler_history_size=100), log_dir=tmp_path)
+    for i in range(200):
+        profiler.update_time("forward", start_time=i, end_time=i + (i % 100 + 1) / 100)
+    profiler.update_time("backward", start_time=0.0, end_time=2.0)
+
+    stats = profiler.get_stats()
+    assert stats["forward"]["count"] == 200
+    # only the 100 most recent durations, 0.01 to 1.0, are used for percentiles
+    assert stats["forward"]["p50"] == pytest.approx(0.505)
+    assert stats["forward"]["p99"] == pytest.approx(0.9901)
+    assert stats["backward"]["p95"] == pytest.approx(2.0)
+
+    profiler.export_profile("step-000000010")
+    assert json.loads((tmp_path / "profiler" / "stats_step-000000010.json").read_text()) == stats
+    trace = json.loads((tmp_path / "profiler" / "trace_step-000000010.json").read_text())
+    assert len(trace["traceEvents"]) == 201
+    assert trace["traceEvents"][-1]["name"] == "backward"
+    assert trace["traceEvents"][-1]["dur"] == pytest.approx(2e6)
+
+    # spans are only exported once
+    profiler.export_profile("final")
+    assert json.loads((tmp_path / "profiler" / "trace_final.json").read_text())["traceEvents"] == []
+
+
+def test_profiler_threads(tmp_path: Path):
+    """Test that durations recorded from several threads are all counted while stats are read and exported"""
+    profiler = Profiler(LoggingConfig(profiler_history_size=10), log_dir=tmp_path)
+    num_threads, num_calls = 4, 1000
+
+    def record(thread_idx: int):
+        for i in range(num_calls):
+            # a new function name every call changes the size of the dictionaries while they are read
+            profiler.update_time("step", 0.0, 1.0)
+            profiler.update_time(f"thread_{thread_idx}_{i % 100}", 0.0, 1.0)
+
+    threads = [threading.Thread(target=record, args=(thread_idx,)) for thread_idx in range(num_threads)]
+    # switch threads as often as possible, so that unguarded updates would interleave
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            profiler.get_stats()
+            profiler.export_profile("running")
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    stats = profiler.get_stats()
+    assert stats["step"]["count"] == num_threads * num_calls
+    assert stats["step"]["mean"] == pytest.approx(1.0)
+    assert len(stats) == 1 + num_threads * 100